@@ -1,13 +1,13 @@
 # agency/admin.py - Advanced allocation system with weekly/monthly grid
 from django.contrib import admin
-from django.db.models import Sum, Q
-from django.utils.html import format_html
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from django.template.response import TemplateResponse
 from django.urls import path
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.http import JsonResponse
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 import json
@@ -17,8 +17,12 @@ from datetime import date, datetime, timedelta
 # Import models
 from .models import (
     Company, UserProfile, Client, Project, 
-    ProjectAllocation, Expense, ContractorExpense
+    ProjectAllocation, Expense, ContractorExpense, ImportJob, ProfileReport, SlowQuery
 )
+from .importers import requeue_failed_jobs
+from .responses import FastJsonResponse
+from .rollups import refresh_project_rollups
+from .sqlite import write_transaction
 
 # Try to import optional models
 try:
@@ -56,6 +60,16 @@ class UserProfileAdmin(admin.ModelAdmin):
     def changelist_view(self, request, extra_context=None):
         self.request = request
         return super().changelist_view(request, extra_context)
+    
+    # Deleting a profile deletes its allocations; agency.rollups refreshes their
+    # projects from the delete signals, in the write lock taken here
+    def delete_model(self, request, obj):
+        with write_transaction():
+            super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        with write_transaction():
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(Client)
@@ -69,7 +83,7 @@ class ClientAdmin(admin.ModelAdmin):
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ['name', 'client', 'status', 'start_date', 'end_date', 
-                    'total_revenue_display', 'team_size', 'allocation_status']
+                    'total_revenue_display', 'team_display', 'allocation_status']
     list_filter = ['status', 'project_type', 'company']
     search_fields = ['name', 'client__name']
     date_hierarchy = 'start_date'
@@ -106,21 +120,20 @@ class ProjectAdmin(admin.ModelAdmin):
         return f"${int(obj.total_revenue):,}"
     total_revenue_display.short_description = "Revenue"
     
-    def team_size(self, obj):
-        # Count unique team members from allocations
-        team_count = obj.allocations.values('user_profile').distinct().count()
+    def team_display(self, obj):
+        # Stored rollup of the project's allocations
+        team_count = obj.team_size
         return f"{team_count} member{'s' if team_count != 1 else ''}"
-    team_size.short_description = "Team"
+    team_display.short_description = "Team"
+    team_display.admin_order_field = 'team_size'
     
     def allocation_status(self, obj):
         if not obj.total_hours:
             return mark_safe('<span style="color:#999;">—</span>')
             
-        allocated = obj.allocations.aggregate(total=Sum('allocated_hours'))['total'] or Decimal('0')
-        total = obj.total_hours
+        percentage = obj.allocation_percentage
         
-        if total > 0:
-            percentage = (float(allocated) / float(total)) * 100
+        if percentage is not None:
             color = '#22c55e' if percentage >= 80 else '#f97316' if percentage >= 50 else '#ef4444'
             
             width = min(int(percentage), 100)
@@ -133,6 +146,7 @@ class ProjectAdmin(admin.ModelAdmin):
             return mark_safe(html)
         return mark_safe('<span style="color:#999;">No hours</span>')
     allocation_status.short_description = "Allocated"
+    allocation_status.admin_order_field = 'allocated_hours'
     
     def change_view(self, request, object_id, form_url='', extra_context=None):
         extra_context = extra_context or {}
@@ -239,7 +253,7 @@ class ProjectAdmin(admin.ModelAdmin):
         try:
             project = self.get_object(request, object_id)
             if not project:
-                return JsonResponse({'error': 'Project not found'}, status=404)
+                return FastJsonResponse({'error': 'Project not found'}, status=404)
             
             # Get all team members who have allocations on this project
             allocated_member_ids = project.allocations.values_list('user_profile_id', flat=True).distinct()
@@ -250,38 +264,40 @@ class ProjectAdmin(admin.ModelAdmin):
                 Q(assigned_projects=project)
             ).distinct().select_related('user')
             
+            # Decimals, UUIDs and dates are serialized by FastJsonResponse as they are
             team_member_data = []
             for member in team_members:
                 team_member_data.append({
-                    'id': str(member.id),
+                    'id': member.id,
                     'name': member.user.get_full_name() or member.user.username,
                     'role': member.get_role_display(),
-                    'hourly_rate': float(member.hourly_rate),
-                    'weekly_capacity': float(member.weekly_capacity_hours),
-                    'monthly_capacity': float(member.monthly_capacity_hours)
+                    'hourly_rate': member.hourly_rate,
+                    'weekly_capacity': member.weekly_capacity_hours,
+                    'monthly_capacity': member.monthly_capacity_hours
                 })
             
             # Get existing allocations
-            allocations = {}
-            for alloc in project.allocations.all():
-                # Create keys for both weekly and monthly views
-                month_key = f"{alloc.user_profile_id}_{alloc.year}_{alloc.month}"
-                allocations[month_key] = float(alloc.allocated_hours)
+            allocations = {
+                f"{member_id}_{year}_{month}": hours
+                for member_id, year, month, hours in project.allocations.values_list(
+                    'user_profile_id', 'year', 'month', 'allocated_hours'
+                )
+            }
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'team_members': team_member_data,
                 'allocations': allocations,
                 'project_name': project.name,
-                'total_hours': float(project.total_hours) if project.total_hours else 0,
-                'start_date': project.start_date.isoformat() if project.start_date else None,
-                'end_date': project.end_date.isoformat() if project.end_date else None
-            })
+                'total_hours': project.total_hours or 0,
+                'start_date': project.start_date,
+                'end_date': project.end_date
+            }, request=request)
             
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+            return FastJsonResponse({'success': False, 'error': str(e)}, status=500)
     
     def get_available_members_view(self, request, object_id):
         """Get team members not yet allocated to this project"""
@@ -300,21 +316,21 @@ class ProjectAdmin(admin.ModelAdmin):
             members = []
             for member in available:
                 members.append({
-                    'id': str(member.id),
+                    'id': member.id,
                     'name': member.user.get_full_name() or member.user.username,
                     'role': member.get_role_display(),
-                    'hourly_rate': float(member.hourly_rate)
+                    'hourly_rate': member.hourly_rate
                 })
             
-            return JsonResponse({'success': True, 'members': members})
+            return FastJsonResponse({'success': True, 'members': members}, request=request)
             
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+            return FastJsonResponse({'success': False, 'error': str(e)}, status=500)
     
     def add_member_view(self, request, object_id):
         """Add a team member to the project"""
         if request.method != 'POST':
-            return JsonResponse({'error': 'Method not allowed'}, status=405)
+            return FastJsonResponse({'error': 'Method not allowed'}, status=405)
             
         try:
             project = self.get_object(request, object_id)
@@ -337,15 +353,15 @@ class ProjectAdmin(admin.ModelAdmin):
                 'monthly_capacity': float(member.monthly_capacity_hours)
             }
             
-            return JsonResponse({'success': True, 'member': member_data})
+            return FastJsonResponse({'success': True, 'member': member_data})
             
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+            return FastJsonResponse({'success': False, 'error': str(e)}, status=500)
     
     def remove_member_view(self, request, object_id):
         """Remove a team member from the project"""
         if request.method != 'POST':
-            return JsonResponse({'error': 'Method not allowed'}, status=405)
+            return FastJsonResponse({'error': 'Method not allowed'}, status=405)
             
         try:
             project = self.get_object(request, object_id)
@@ -353,34 +369,38 @@ class ProjectAdmin(admin.ModelAdmin):
             member_id = data.get('member_id')
             
             # Remove allocations
-            ProjectAllocation.objects.filter(
-                project=project,
-                user_profile_id=member_id
-            ).delete()
+            with write_transaction():
+                ProjectAllocation.objects.filter(
+                    project=project,
+                    user_profile_id=member_id
+                ).delete()
+                refresh_project_rollups([project.pk])
             
             # Remove from team_members if exists
             if hasattr(project, 'team_members'):
                 project.team_members.remove(member_id)
             
-            return JsonResponse({'success': True})
+            return FastJsonResponse({'success': True})
             
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+            return FastJsonResponse({'success': False, 'error': str(e)}, status=500)
     
     def auto_allocate_view(self, request, object_id):
         """Auto-allocate hours evenly across team and periods"""
         if request.method != 'POST':
-            return JsonResponse({'error': 'Method not allowed'}, status=405)
+            return FastJsonResponse({'error': 'Method not allowed'}, status=405)
             
         try:
             project = self.get_object(request, object_id)
             if not project.total_hours:
-                return JsonResponse({'error': 'Project has no total hours set'}, status=400)
+                return FastJsonResponse({'error': 'Project has no total hours set'}, status=400)
             
             # Get team members
             member_ids = json.loads(request.body).get('member_ids', [])
             if not member_ids:
-                return JsonResponse({'error': 'No team members selected'}, status=400)
+                return FastJsonResponse({'error': 'No team members selected'}, status=400)
+            if UserProfile.objects.filter(id__in=member_ids).count() != len(set(member_ids)):
+                return FastJsonResponse({'success': False, 'error': 'Team member not found'}, status=400)
             
             # Calculate periods
             periods = []
@@ -410,7 +430,6 @@ class ProjectAdmin(admin.ModelAdmin):
             
             allocations = []
             for member_id in member_ids:
-                member = UserProfile.objects.get(id=member_id)
                 for period in periods:
                     # Proportional allocation based on days in period
                     period_hours = hours_per_member * (period['days'] / total_days)
@@ -423,33 +442,42 @@ class ProjectAdmin(admin.ModelAdmin):
                             'hours': round(period_hours, 1)
                         })
             
-            return JsonResponse({'success': True, 'allocations': allocations})
+            return FastJsonResponse({'success': True, 'allocations': allocations}, request=request)
             
         except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+            return FastJsonResponse({'success': False, 'error': str(e)}, status=500)
     
     def save_allocations_view(self, request, object_id):
         """Save all allocations from the grid"""
         if request.method != 'POST':
-            return JsonResponse({'error': 'Method not allowed'}, status=405)
+            return FastJsonResponse({'error': 'Method not allowed'}, status=405)
             
         try:
             project = self.get_object(request, object_id)
             data = json.loads(request.body)
             allocations = data.get('allocations', [])
             
-            # Delete all existing allocations for this project
-            ProjectAllocation.objects.filter(project=project).delete()
-            
-            # Create new allocations
-            created = 0
+            # Fetch every member in the grid at once, ignoring malformed ids
+            member_ids = set()
+            for alloc in allocations:
+                try:
+                    member_ids.add(UserProfile._meta.pk.to_python(alloc['member_id']))
+                except (KeyError, TypeError, ValidationError):
+                    continue
+            member_ids.discard(None)
+            members = UserProfile.objects.filter(company_id=project.company_id).in_bulk(member_ids)
+            
+            # Build the new allocations, skipping cells that cannot be saved
+            # and repeats of a member/month already in the grid
+            new_allocations = {}
             for alloc in allocations:
                 try:
-                    member = UserProfile.objects.get(id=alloc['member_id'])
+                    member = members[UserProfile._meta.pk.to_python(alloc['member_id'])]
                     hours = Decimal(str(alloc['hours']))
                     
-                    if hours > 0:
-                        ProjectAllocation.objects.create(
+                    key = (member.pk, alloc['year'], alloc['month'])
+                    if hours > 0 and key not in new_allocations:
+                        new_allocations[key] = ProjectAllocation(
                             project=project,
                             user_profile=member,
                             year=alloc['year'],
@@ -457,17 +485,23 @@ class ProjectAdmin(admin.ModelAdmin):
                             allocated_hours=hours,
                             hourly_rate=member.hourly_rate
                         )
-                        created += 1
                 except Exception as e:
                     print(f"Error creating allocation: {e}")
             
+            # Replace all existing allocations for this project
+            with write_transaction():
+                ProjectAllocation.objects.filter(project=project).delete()
+                ProjectAllocation.objects.bulk_create(new_allocations.values())
+                refresh_project_rollups([project.pk])
+            created = len(new_allocations)
+            
             messages.success(request, f"Successfully saved {created} allocations")
-            return JsonResponse({'success': True, 'created': created})
+            return FastJsonResponse({'success': True, 'created': created})
             
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+            return FastJsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
 @admin.register(ProjectAllocation)
@@ -482,8 +516,29 @@ class ProjectAllocationAdmin(admin.ModelAdmin):
     month_year.short_description = "Period"
     
     def total_value(self, obj):
-        return f"${obj.total_revenue:,.2f}"
+        # Computed by the database on save
+        if obj.value is None:
+            return "-"
+        return f"${obj.value:,.2f}"
     total_value.short_description = "Value"
+    total_value.admin_order_field = 'value'
+    
+    # Keep the rollups on Project in step with single-row edits
+    def save_model(self, request, obj, form, change):
+        with write_transaction():
+            super().save_model(request, obj, form, change)
+            refresh_project_rollups({obj.project_id, form.initial.get('project', obj.project_id)})
+    
+    def delete_model(self, request, obj):
+        with write_transaction():
+            super().delete_model(request, obj)
+            refresh_project_rollups([obj.project_id])
+    
+    def delete_queryset(self, request, queryset):
+        with write_transaction():
+            project_ids = set(queryset.values_list('project_id', flat=True))
+            super().delete_queryset(request, queryset)
+            refresh_project_rollups(project_ids)
 
 
 # Register other models
@@ -513,6 +568,86 @@ if MONTHLY_REVENUE_EXISTS:
         list_filter = ['year', 'month', 'company']
 
 
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['original_name', 'status', 'rows_processed', 'rows_per_second', 'attempts', 'created_at']
+    list_filter = ['status', 'company']
+    readonly_fields = ['counts', 'errors', 'worker', 'started_at', 'finished_at']
+    actions = ['retry_failed']
+    
+    @admin.action(description='Retry selected failed imports')
+    def retry_failed(self, request, queryset):
+        requeued = requeue_failed_jobs(queryset)
+        self.message_user(request, f"{requeued} import(s) queued again; they resume from their last committed batch.")
+
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(admin.ModelAdmin):
+    list_display = ['path', 'view_name', 'status_code', 'total_ms', 'query_count', 'user', 'created_at']
+    list_filter = ['view_name']
+    search_fields = ['path']
+    fields = ['path', 'view_name', 'status_code', 'total_ms', 'query_count', 'user', 'created_at',
+              'sql_table', 'functions_table']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def sql_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((site['site'], site['count'], site['time_ms'], site['sql'][:300]) for site in obj.sql)
+        )
+        return format_html(
+            '<table><tr><th>Call site</th><th>Queries</th><th>ms</th><th>First statement</th></tr>{}</table>',
+            rows
+        )
+    sql_table.short_description = "SQL by call site"
+
+    def functions_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td><code>{}</code></td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((f['function'], f['calls'], f['own_ms'], f['cumulative_ms']) for f in obj.functions)
+        )
+        return format_html(
+            '<table><tr><th>Function</th><th>Calls</th><th>Own ms</th><th>Cumulative ms</th></tr>{}</table>',
+            rows
+        )
+    functions_table.short_description = "Top functions by cumulative time"
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ['short_sql', 'duration_ms', 'view_name', 'call_site', 'full_scan', 'created_at']
+    list_filter = ['view_name', 'analyzed']
+    search_fields = ['sql', 'call_site']
+    fields = ['duration_ms', 'view_name', 'call_site', 'created_at', 'fingerprint', 'sql', 'params',
+              'analyzed', 'plan_text']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def short_sql(self, obj):
+        return obj.sql[:120]
+    short_sql.short_description = "SQL"
+
+    def full_scan(self, obj):
+        return obj.has_full_scan
+    full_scan.boolean = True
+    full_scan.short_description = "Full scan"
+
+    def plan_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan)
+    plan_text.short_description = "Plan"
+
+
 admin.site.site_header = "Agency Management Admin"
 admin.site.site_title = "Agency Management"
 admin.site.index_title = "Welcome to Agency Management"
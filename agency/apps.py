@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, pre_delete
 
 
 class AgencyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agency'
+
+    def ready(self):
+        from .models import UserProfile
+        from .rollups import refresh_profile_projects, remember_profile_projects
+
+        pre_delete.connect(remember_profile_projects, sender=UserProfile, dispatch_uid='agency.rollups.pre_delete')
+        post_delete.connect(refresh_profile_projects, sender=UserProfile, dispatch_uid='agency.rollups.post_delete')
@@ -0,0 +1,111 @@
+# agency/async_views.py - Async versions of the analytics APIs, for ASGI deployments
+import asyncio
+from contextlib import ExitStack
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections, connections
+from django.db.models import Count, Sum
+
+from . import perf, querylog
+from .models import Project
+from .responses import FastJsonResponse
+from .views import (
+    EMPTY_REVENUE_CHART, calculate_period_capacity, calculate_period_costs, calculate_period_revenue,
+    dashboard_data_payload, revenue_chart_expenses, revenue_chart_payload, revenue_chart_revenue,
+)
+
+
+def in_thread_pool(func):
+    """func as a coroutine that runs in the shared thread pool, not the request's thread
+
+    Calls run side by side, each on its pool thread's own database
+    connection. That connection is closed or kept as CONN_MAX_AGE says
+    before and after every call, as a request's would be. Under
+    PerformanceMiddleware its statements count towards the request's
+    figures and query budget, and under SlowQueryMiddleware slow ones are
+    stored as the request's own would be - the middleware only sees the
+    request thread's connections.
+    """
+    def run(stats, view_name, *args):
+        close_old_connections()
+        try:
+            with ExitStack() as stack:
+                if view_name is not None:
+                    # Explained and stored on this thread, whose connection ran them
+                    stack.enter_context(querylog.capture_slow_queries(view_name))
+                if stats is not None:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(stats))
+                return func(*args)
+        finally:
+            close_old_connections()
+    run_in_pool = sync_to_async(run, thread_sensitive=False)
+
+    async def call(*args):
+        slow_queries = querylog.current_log()
+        view_name = slow_queries.current_view_name() if slow_queries is not None else None
+        request_stats = perf.current_stats()
+        if request_stats is None:
+            return await run_in_pool(None, view_name, *args)
+        stats = perf.RequestStats()
+        stats.view_name = request_stats.view_name
+        try:
+            return await run_in_pool(stats, view_name, *args)
+        finally:
+            # Added here, on the request's side, so concurrent calls do not race
+            request_stats.add_queries(stats)
+    return call
+
+
+@login_required
+async def dashboard_data_api(request):
+    """dashboard_data_api with revenue, costs, capacity and project value computed concurrently"""
+    try:
+        company = request.company
+        if not company:
+            return FastJsonResponse({'error': 'No company found'}, status=404)
+
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        aggregation = request.GET.get('aggregation', 'monthly')
+        if not start_date or not end_date:
+            return FastJsonResponse({'error': 'Missing date parameters'}, status=400)
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+        projects_in_period = Project.objects.filter(
+            company=company, start_date__lte=end_date, end_date__gte=start_date
+        )
+        revenue_data, costs_data, capacity_data, projects = await asyncio.gather(
+            in_thread_pool(calculate_period_revenue)(company, start_date, end_date),
+            in_thread_pool(calculate_period_costs)(company, start_date, end_date),
+            in_thread_pool(calculate_period_capacity)(company, start_date, end_date),
+            projects_in_period.aaggregate(total=Sum('total_revenue'), count=Count('id')),
+        )
+        avg_project_value = float(projects['total'] or 0) / projects['count'] if projects['count'] else 0
+
+        return FastJsonResponse(dashboard_data_payload(
+            start_date, end_date, aggregation, revenue_data, costs_data, capacity_data, avg_project_value
+        ), request=request)
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+async def revenue_chart_data(request):
+    """revenue_chart_data with the revenue and the twelve months of expenses computed concurrently"""
+    company = request.company
+    if not company:
+        return FastJsonResponse(EMPTY_REVENUE_CHART)
+
+    year = int(request.GET.get('year', datetime.now().year))
+    revenue, expenses = await asyncio.gather(
+        in_thread_pool(revenue_chart_revenue)(company, year),
+        in_thread_pool(revenue_chart_expenses)(company, year),
+    )
+    return FastJsonResponse(revenue_chart_payload(company, year, revenue, expenses), request=request)
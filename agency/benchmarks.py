@@ -0,0 +1,749 @@
+# agency/benchmarks.py - Wall time, query count and peak memory of the agency views at scale
+import calendar
+import csv
+import json
+import platform
+import statistics
+import multiprocessing
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.template.loader import render_to_string
+from django.test import Client as TestClient, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Company, UserProfile, Client, Project, ProjectAllocation, Cost
+from .sqlite import performance_options
+from .synthetic import SCALES, SyntheticDataGenerator
+from .views import dashboard_context
+
+DEFAULT_REPEAT = 5
+# A scenario regresses when its median wall time or peak memory grows by more than this
+DEFAULT_TOLERANCE = 0.25
+# ...and by at least this much, so timer and allocator noise on fast views is ignored
+MIN_WALL_DELTA_MS = 5
+MIN_MEMORY_DELTA_KB = 256
+BENCHMARK_USERNAME = 'benchmark.admin'
+
+
+class BenchmarkError(Exception):
+    """A scenario could not be measured, e.g. the view returned an error"""
+
+
+class QueryRecorder:
+    """Database execute wrapper that records every statement with its duration
+
+    Unlike connection.queries it does not depend on DEBUG and survives the
+    reset_queries() every test client request triggers.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'time_ms': (time.perf_counter() - started) * 1000,
+            })
+
+    def __len__(self):
+        return len(self.queries)
+
+
+def measure(run, repeat=DEFAULT_REPEAT):
+    """Time run() repeat times after a warm-up call, then count its queries and peak memory
+
+    Queries and memory are captured in separate calls so neither
+    instrumentation inflates the timings. Slow-query capture is off
+    throughout, since explaining a statement would be timed with it.
+    """
+    with override_settings(SLOW_QUERY_MS=None):
+        run()  # Warm-up: URL resolution, template loading, first-query caches
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        queries = QueryRecorder()
+        with connection.execute_wrapper(queries):
+            run()
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'wall_ms': {
+                'median': round(statistics.median(timings), 2),
+                'min': round(min(timings), 2),
+                'max': round(max(timings), 2),
+            },
+            'queries': len(queries),
+            'peak_memory_kb': peak // 1024,
+        }
+
+
+class BenchmarkSuite:
+    """Loads one synthetic dataset and measures every scenario against it
+
+    Expects an empty database - the benchmark command runs the suite
+    against a throwaway test database, one per scale.
+    """
+
+    def __init__(self, scale='small', seed=42, repeat=DEFAULT_REPEAT, log=None, sizes=None):
+        self.scale = scale
+        # Generator counts; the scale's preset unless given explicitly
+        self.sizes = sizes or SCALES[scale]
+        self.seed = seed
+        self.repeat = repeat
+        self.log = log or (lambda message: None)
+        # Data runs up to this year so the current-month paths of the views have rows
+        this_year = date.today().year
+        self.years = [this_year - 2, this_year - 1, this_year]
+
+    def load(self):
+        """Generate the dataset and pick the users and project the scenarios run as"""
+        generator = SyntheticDataGenerator(seed=self.seed, years=self.years, **self.sizes)
+        self.rows = sum(generator.generate().values())
+        self.log(f'  Loaded {self.rows:,} rows in {generator.elapsed:.1f}s')
+
+        # The dashboards read the first company, so every actor belongs to it
+        self.company = Company.objects.first()
+        self.admin = User.objects.create_superuser(BENCHMARK_USERNAME, f'{BENCHMARK_USERNAME}@example.com', None)
+        self.pm = User.objects.filter(
+            profile__company=self.company, profile__is_project_manager=True
+        ).annotate(project_count=Count('managed_projects')).order_by('-project_count', 'username').first()
+        self.employee = UserProfile.objects.filter(
+            company=self.company, is_project_manager=False
+        ).annotate(allocation_count=Count('project_allocations')).order_by(
+            '-allocation_count', 'user__username'
+        ).first().user
+        self.project = Project.objects.filter(company=self.company).annotate(
+            allocation_count=Count('allocations')
+        ).order_by('-allocation_count', 'name').first()
+
+        self.clients = {}
+        for name, user in (('admin', self.admin), ('pm', self.pm), ('employee', self.employee)):
+            self.clients[name] = TestClient()
+            self.clients[name].force_login(user)
+
+    def request(self, client, method, url, data=None):
+        def run():
+            if method == 'post':
+                response = self.clients[client].post(url, json.dumps(data), content_type='application/json')
+            else:
+                response = self.clients[client].get(url, data)
+            if response.status_code != 200:
+                raise BenchmarkError(f'{method.upper()} {url} returned {response.status_code}')
+            return response
+        return run
+
+    def scenarios(self, directory):
+        """(name, callable) pairs - the import runs last because it adds data
+
+        directory holds the files the import scenario reads.
+        """
+        project_id = self.project.pk
+        allocations = list(self.project.allocations.values('user_profile_id', 'year', 'month', 'allocated_hours'))
+        member_ids = sorted({str(allocation['user_profile_id']) for allocation in allocations})
+        grid = [
+            {
+                'member_id': str(allocation['user_profile_id']),
+                'year': allocation['year'],
+                'month': allocation['month'],
+                'hours': float(allocation['allocated_hours']),
+            }
+            for allocation in allocations
+        ]
+        this_year = self.years[-1]
+
+        def admin_url(name):
+            return reverse(f'admin:agency_project_{name}', args=[project_id])
+
+        return [
+            ('dashboard', self.request('admin', 'get', reverse('agency:dashboard'))),
+            # Before anything is cached: every figure computed, every fragment rendered
+            ('dashboard_cold', self.cold(self.request('admin', 'get', reverse('agency:dashboard')))),
+            ('dashboard_template', self.render_dashboard(fragments=False)),
+            ('dashboard_template_cached', self.render_dashboard(fragments=True)),
+            ('pm_dashboard', self.request('pm', 'get', reverse('agency:pm_dashboard'))),
+            ('employee_dashboard', self.request('employee', 'get', reverse('agency:employee_dashboard'))),
+            ('revenue_chart_data', self.request(
+                'admin', 'get', reverse('agency:revenue_chart_data'), {'year': this_year}
+            )),
+            ('dashboard_data_api', self.request(
+                'admin', 'get', reverse('agency:dashboard_data_api'),
+                {'start_date': f'{this_year}-01-01', 'end_date': f'{this_year}-12-31'}
+            )),
+            ('allocation_values', self.request(
+                'admin', 'get', reverse('agency:allocation_values'), {'group': 'client', 'year': this_year}
+            )),
+            # Every profile of the company, as the switcher shows before anything is typed
+            ('user_search', self.request('admin', 'get', reverse('agency:user_search'))),
+            ('admin_project_changelist', self.request('admin', 'get', reverse('admin:agency_project_changelist'))),
+            ('admin_get_allocation_data', self.request('admin', 'get', admin_url('get_allocation_data'))),
+            ('admin_available_members', self.request('admin', 'get', admin_url('available_members'))),
+            ('admin_auto_allocate', self.request(
+                'admin', 'post', admin_url('auto_allocate'), {'member_ids': member_ids}
+            )),
+            # Saves the grid the project already has, so repeated runs leave the data unchanged
+            ('admin_save_allocations', self.request(
+                'admin', 'post', admin_url('save_allocations'), {'allocations': grid}
+            )),
+            ('import_spreadsheet', self.import_spreadsheet(directory)),
+        ]
+
+    def cold(self, run):
+        def run_cold():
+            cache.clear()
+            return run()
+        return run_cold
+
+    def render_dashboard(self, fragments):
+        """Render dashboard.html alone, with its KPI fragments cached or rendered every time"""
+        request = RequestFactory().get(reverse('agency:dashboard'))
+        request.user = self.admin
+        request.session = {}
+        today = date.today()
+        context = dashboard_context(self.company, today.year, today.month)
+        if not fragments:
+            context['fragment_cache_seconds'] = 0
+
+        def run():
+            return render_to_string('dashboard.html', context, request)
+        return run
+
+    def import_spreadsheet(self, directory):
+        """Re-import a Revenue CSV with one row per client of the company"""
+        path = Path(directory) / 'revenue.csv'
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Client', '', 'Status'] + [f'M{month}' for month in range(1, 13)])
+            for number, name in enumerate(self.company.clients.order_by('name').values_list('name', flat=True)):
+                writer.writerow([name, '', 'Open'] + [1000 + (number * month) % 5000 for month in range(1, 13)])
+
+        def run():
+            call_command('import_spreadsheet', str(path), self.company.code, '--full', stdout=StringIO())
+        return run
+
+    def run(self, only=None):
+        """Load the dataset and measure each scenario; returns this scale's results"""
+        self.log(f'Scale {self.scale}:')
+        self.load()
+        results = {
+            'rows': self.rows,
+            'allocations': ProjectAllocation.objects.count(),
+            'scenarios': {},
+        }
+        with tempfile.TemporaryDirectory(prefix='agency-benchmark-') as directory:
+            for name, run in self.scenarios(directory):
+                if only and name not in only:
+                    continue
+                result = measure(run, self.repeat)
+                results['scenarios'][name] = result
+                self.log(
+                    f"  {name:<28} {result['wall_ms']['median']:>10.1f} ms "
+                    f"{result['queries']:>6} queries {result['peak_memory_kb']:>8,} KiB"
+                )
+        return results
+
+
+class IndexPlanBenchmark:
+    """Plans and timings of the hot date-range filters, with and without their composite indexes
+
+    Loads rows projects and rows costs (plus a client per ten projects and
+    a team member per hundred) spread over the last ten years and a few
+    companies, then explains and times the filters the dashboards run for
+    the current month, first without the indexes in INDEXES and then with
+    them. Expects an empty, throwaway database.
+    """
+
+    # (model, index fields) of the composite indexes on the hot filters
+    INDEXES = [
+        (Project, ['company', 'end_date', 'start_date']),
+        (Project, ['company', 'revenue_type', 'end_date', 'start_date']),
+        (Cost, ['company', 'start_date', 'end_date']),
+        (UserProfile, ['company', 'status', 'start_date', 'end_date']),
+        (Client, ['company', 'status']),
+    ]
+    COMPANIES = 4
+    YEARS = 10
+
+    def __init__(self, rows=1_000_000, seed=42, repeat=DEFAULT_REPEAT, log=None):
+        self.rows = rows
+        self.repeat = repeat
+        self.log = log or (lambda message: None)
+        self.generator = SyntheticDataGenerator(seed=seed)
+        self.rng = self.generator.rng
+        self.today = date.today()
+        self.first_day = date(self.today.year - self.YEARS, self.today.month, 1)
+
+    def load(self):
+        generator, rng = self.generator, self.rng
+        started = time.perf_counter()
+        self.companies = [
+            Company(id=generator.uuid(), code=f'IDX{number}', name=f'Index Agency {number + 1}')
+            for number in range(self.COMPANIES)
+        ]
+        generator.insert_objects(Company, self.companies)
+        now = timezone.now()
+        days = (self.today - self.first_day).days
+
+        def value(model, name, raw):
+            return generator.db_value(model._meta.get_field(name), raw)
+
+        def date_value(model, name, day):
+            return value(model, name, self.first_day + timedelta(days=day))
+
+        client_ids = []
+        zero_hours = value(Project, 'allocated_hours', Decimal('0'))
+        zero_value = value(Project, 'allocated_value', Decimal('0'))
+
+        def clients():
+            for number in range(max(self.rows // 10, 1)):
+                company = rng.choice(self.companies)
+                client_id = generator.db_uuid()
+                client_ids.append((client_id, value(Project, 'company', company.id)))
+                yield (client_id, f'Client {number}', value(Client, 'company', company.id),
+                       rng.choices(['active', 'inactive', 'prospect', 'churned'], weights=[7, 1, 1, 1])[0],
+                       value(Client, 'created_at', now))
+
+        def projects():
+            for number in range(self.rows):
+                client_id, company_id = rng.choice(client_ids)
+                start = rng.randrange(days)
+                yield (generator.db_uuid(), f'Project {number}', client_id, company_id,
+                       date_value(Project, 'start_date', start),
+                       date_value(Project, 'end_date', start + rng.randint(30, 365)),
+                       value(Project, 'total_revenue', Decimal(rng.randrange(1000, 200000, 500))),
+                       value(Project, 'total_hours', Decimal(rng.randrange(10, 2000, 10))),
+                       'project', 'booked' if rng.random() < 0.7 else 'forecast', 'active',
+                       # No allocations, so empty rollups
+                       zero_hours, zero_value, 0,
+                       value(Project, 'created_at', now), value(Project, 'updated_at', now))
+
+        def costs():
+            for number in range(self.rows):
+                company = rng.choice(self.companies)
+                start = rng.randrange(days)
+                # Recurring costs run open-ended; the rest for up to a year
+                end = None if rng.random() < 0.2 else date_value(Cost, 'end_date', start + rng.randint(0, 365))
+                yield (generator.db_uuid(), value(Cost, 'company', company.id), f'Cost {number}', 'other',
+                       '', value(Cost, 'amount', Decimal(rng.randrange(100, 20000, 100))), 'monthly',
+                       date_value(Cost, 'start_date', start), end, False, '', False,
+                       rng.random() < 0.8, value(Cost, 'created_at', now))
+
+        # As SyntheticDataGenerator.generate() loads: one transaction, no per-row FK checks
+        with connection.constraint_checks_disabled(), generator.load_cache(), transaction.atomic():
+            generator.insert_rows(Client, ['id', 'name', 'company', 'status', 'created_at'], clients())
+            generator.insert_rows(Project, [
+                'id', 'name', 'client', 'company', 'start_date', 'end_date', 'total_revenue', 'total_hours',
+                'project_type', 'revenue_type', 'status', 'allocated_hours', 'allocated_value', 'team_size',
+                'created_at', 'updated_at',
+            ], projects())
+            generator.insert_rows(Cost, [
+                'id', 'company', 'name', 'cost_type', 'description', 'amount', 'frequency', 'start_date',
+                'end_date', 'is_contractor', 'vendor', 'is_billable', 'is_active', 'created_at',
+            ], costs())
+
+        users = [User(username=f'index.{number}', password='!') for number in range(max(self.rows // 100, 1))]
+        User.objects.bulk_create(users, batch_size=generator.batch_size)
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user=user,
+                company=rng.choice(self.companies),
+                status=rng.choices(['full_time', 'part_time', 'contractor', 'inactive'], weights=[6, 1, 1, 2])[0],
+                start_date=self.first_day + timedelta(days=rng.randrange(days)),
+                end_date=None if rng.random() < 0.7 else self.today - timedelta(days=rng.randrange(days)),
+            )
+            for user in users
+        ], batch_size=generator.batch_size)
+        self.log(f'  Loaded {self.rows:,} projects and costs in {time.perf_counter() - started:.1f}s')
+
+    def queries(self):
+        """(name, queryset) for the filters views.py runs for the current month"""
+        company = self.companies[0]
+        month_start = self.today.replace(day=1)
+        month_end = month_start.replace(day=calendar.monthrange(month_start.year, month_start.month)[1])
+        started = Q(start_date__lte=month_start) | Q(start_date__isnull=True)
+        not_ended = Q(end_date__gte=month_start) | Q(end_date__isnull=True)
+        return [
+            ('projects_in_month', Project.objects.filter(
+                company=company, start_date__lte=month_end, end_date__gte=month_start
+            ).values_list('id', 'total_revenue')),
+            ('booked_projects_in_month', Project.objects.filter(
+                company=company, revenue_type='booked', start_date__lte=month_end, end_date__gte=month_start
+            ).values_list('id', 'total_revenue')),
+            ('active_costs_in_month', Cost.objects.filter(
+                company=company, start_date__lte=month_end, is_active=True
+            ).filter(Q(end_date__isnull=True) | Q(end_date__gte=month_start)).values_list('id', 'amount')),
+            ('team_in_month', UserProfile.objects.filter(
+                company=company, status__in=['full_time', 'part_time']
+            ).filter(started).filter(not_ended).values_list('id', 'annual_salary')),
+            ('active_clients', Client.objects.filter(company=company, status='active').values_list('id')),
+        ]
+
+    def measure_queries(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        results = {}
+        for name, queryset in self.queries():
+            result = measure(lambda: list(queryset.all()), self.repeat)
+            results[name] = {
+                'plan': queryset.explain(),
+                'wall_ms': result['wall_ms'],
+                'rows': queryset.count(),
+            }
+        return results
+
+    def composite_indexes(self):
+        return [
+            (model, index) for model, fields in self.INDEXES
+            for index in model._meta.indexes if index.fields == fields
+        ]
+
+    def run(self):
+        """Measure every filter without the indexes, then build them and measure again"""
+        self.log(f'Index plans at {self.rows:,} rows:')
+        indexes = self.composite_indexes()
+        # Loading without them is faster too; they are built once at the end
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        self.load()
+        results = {'rows': self.rows, 'without_indexes': self.measure_queries()}
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.add_index(model, index)
+        results['with_indexes'] = self.measure_queries()
+        return results
+
+
+class ConnectionReuseBenchmark:
+    """Request latency with a new database connection per request, a persistent one, and a pool
+
+    Requests go through a WSGIHandler, as under gunicorn, so Django opens
+    and closes connections exactly as it does in production (the test
+    client leaves connections open between requests). Needs PostgreSQL -
+    with SQLite a connection is a file open, and the test database never
+    closes. The pool mode needs psycopg 3 with psycopg_pool and is skipped
+    without it.
+    """
+
+    # settings_dict changes per mode, with health checks as settings_production has them;
+    # the pool is small, as one process sends every request
+    MODES = [
+        ('new_connection', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True}),
+        ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}),
+        ('pool', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {'pool': {'min_size': 1, 'max_size': 2}}}),
+    ]
+    WARM_UP = 10
+
+    def __init__(self, requests=200, seed=42, log=None):
+        self.requests = requests
+        self.seed = seed
+        self.log = log or (lambda message: None)
+
+    def load(self):
+        """The small benchmark dataset and a session cookie for its admin"""
+        self.suite = BenchmarkSuite(scale='small', seed=self.seed, log=self.log)
+        self.suite.load()
+        session = self.suite.clients['admin'].cookies[settings.SESSION_COOKIE_NAME]
+        this_year = self.suite.years[-1]
+        # Two cheap endpoints, so connection setup is a visible share of the request
+        self.urls = [
+            (reverse('agency:allocation_values'), {'group': 'client', 'year': this_year}),
+            (reverse('agency:dashboard_data_api'), {
+                'start_date': f'{this_year}-01-01', 'end_date': f'{this_year}-12-31'
+            }),
+        ]
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={session.value}'
+
+    def environ(self, path, query):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(query),
+            'HTTP_COOKIE': self.cookie,
+            # Production settings redirect plain HTTP
+            'wsgi.url_scheme': 'https',
+        }
+        setup_testing_defaults(environ)
+        return environ
+
+    def call(self, handler, environ):
+        response = handler(environ, lambda status, headers: None)
+        try:
+            if response.status_code != 200:
+                raise BenchmarkError(f"GET {environ['PATH_INFO']} returned {response.status_code}")
+            b''.join(response)
+        finally:
+            # Sends request_finished, which closes or keeps the connection
+            response.close()
+
+    def use(self, changes):
+        """Close the current connection and pool, then switch connection settings"""
+        connection.close()
+        connection.close_pool()
+        connection.settings_dict.update(changes)
+
+    def measure_mode(self, handler):
+        environs = [self.environ(path, query) for path, query in self.urls]
+        for number in range(self.WARM_UP):
+            self.call(handler, environs[number % len(environs)])
+        timings = []
+        for number in range(self.requests):
+            started = time.perf_counter()
+            self.call(handler, environs[number % len(environs)])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'median': round(statistics.median(timings), 2),
+            'p95': round(timings[int(len(timings) * 0.95) - 1], 2),
+            'max': round(timings[-1], 2),
+        }
+
+    def run(self):
+        """Load the dataset, then time the same requests under each connection mode"""
+        if connection.vendor != 'postgresql':
+            raise BenchmarkError(f'Connection reuse is measured against PostgreSQL, not {connection.vendor}')
+        self.log(f'Connection reuse over {self.requests} requests:')
+        self.load()
+        handler = WSGIHandler()
+        original = {**connection.settings_dict, 'OPTIONS': dict(connection.settings_dict.get('OPTIONS', {}))}
+        results = {'requests': self.requests, 'modes': {}}
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], SLOW_QUERY_MS=None):
+                for name, changes in self.MODES:
+                    if 'pool' in changes.get('OPTIONS', {}):
+                        try:
+                            import psycopg_pool  # noqa: F401
+                        except ImportError:
+                            self.log(f'  {name:<16} skipped - needs psycopg 3 with psycopg_pool')
+                            continue
+                    options = {key: value for key, value in original['OPTIONS'].items() if key != 'pool'}
+                    self.use({**changes, 'OPTIONS': {**options, **changes.get('OPTIONS', {})}})
+                    result = results['modes'][name] = self.measure_mode(handler)
+                    self.log(f"  {name:<16}{result['median']:>10.2f} ms median {result['p95']:>10.2f} ms p95")
+        finally:
+            connection.close()
+            connection.close_pool()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(original)
+        return results
+
+
+class SQLiteConcurrencyBenchmark:
+    """Read and write throughput of concurrent requests on a SQLite file, without and with performance mode
+
+    Reader processes fetch the allocation values API while writer
+    processes each save the allocation grid of a project through the
+    admin, for seconds per mode - forked like gunicorn workers, each with
+    its own connection. Failed requests ("database is locked") are
+    counted rather than raised. Expects the default connection to point
+    at a throwaway SQLite file (an in-memory database has no file locks).
+    """
+
+    # (name, DATABASES OPTIONS, SQLITE_PERFORMANCE_MODE); the default mode undoes a WAL file left by loading
+    MODES = [
+        ('default', {'init_command': 'PRAGMA journal_mode=DELETE'}, False),
+        ('performance', performance_options(), True),
+    ]
+
+    def __init__(self, readers=4, writers=2, seconds=5, seed=42, log=None):
+        self.readers = readers
+        self.writers = writers
+        self.seconds = seconds
+        self.seed = seed
+        self.log = log or (lambda message: None)
+
+    def load(self):
+        """The small benchmark dataset, the read request and one project grid per writer"""
+        self.suite = BenchmarkSuite(scale='small', seed=self.seed, log=self.log)
+        self.suite.load()
+        self.read_url = reverse('agency:allocation_values')
+        self.read_params = {'group': 'client', 'year': self.suite.years[-1]}
+        projects = Project.objects.filter(company=self.suite.company).annotate(
+            allocation_count=Count('allocations')
+        ).order_by('-allocation_count', 'name')[:self.writers]
+        # Saving the grid a project already has leaves the data unchanged
+        self.grids = [
+            (reverse('admin:agency_project_save_allocations', args=[project.pk]), {'allocations': [
+                {
+                    'member_id': str(allocation['user_profile_id']),
+                    'year': allocation['year'],
+                    'month': allocation['month'],
+                    'hours': float(allocation['allocated_hours']),
+                }
+                for allocation in project.allocations.values('user_profile_id', 'year', 'month', 'allocated_hours')
+            ]})
+            for project in projects
+        ]
+
+    def client(self):
+        # Failed requests come back as 500s instead of raising in the worker
+        client = TestClient(raise_request_exception=False)
+        client.force_login(self.suite.admin)
+        return client
+
+    def reader(self):
+        client = self.client()
+        return lambda: client.get(self.read_url, self.read_params).status_code == 200
+
+    def writer(self, url, grid):
+        client = self.client()
+
+        def run():
+            response = client.post(url, json.dumps(grid), content_type='application/json')
+            return response.status_code == 200 and response.json()['success']
+        return run
+
+    def work(self, kind, run, deadline, queue):
+        timings, failed = [], 0
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                if run():
+                    timings.append((time.perf_counter() - started) * 1000)
+                else:
+                    failed += 1
+        finally:
+            connection.close()
+            queue.put((kind, timings, failed))
+
+    def measure_mode(self):
+        # Logged in before the clock starts - logging in writes the session
+        runs = [('reads', self.reader()) for _ in range(self.readers)]
+        runs += [('writes', self.writer(*self.grids[number % len(self.grids)])) for number in range(self.writers)]
+        # Forked workers must not share the parent's connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        deadline = time.perf_counter() + self.seconds
+        workers = [context.Process(target=self.work, args=(kind, run, deadline, queue)) for kind, run in runs]
+        for worker in workers:
+            worker.start()
+        results = {kind: {'timings': [], 'failed': 0} for kind in ('reads', 'writes')}
+        for _ in workers:
+            kind, timings, failed = queue.get()
+            results[kind]['timings'] += timings
+            results[kind]['failed'] += failed
+        for worker in workers:
+            worker.join()
+
+        summary = {}
+        for kind, result in results.items():
+            timings = sorted(result['timings'])
+            summary[kind] = {
+                'completed': len(timings),
+                'per_second': round(len(timings) / self.seconds, 1),
+                'failed': result['failed'],
+                'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)], 2) if timings else None,
+            }
+        return summary
+
+    def run(self):
+        """Load the dataset, then run the same readers and writers in each mode"""
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise BenchmarkError('SQLite concurrency is measured against a SQLite file database')
+        self.log(f'SQLite concurrency, {self.readers} readers and {self.writers} writers for {self.seconds}s:')
+        self.load()
+        # Workers connect with the settings_dict they inherit when forked
+        original = connection.settings_dict['OPTIONS']
+        results = {'readers': self.readers, 'writers': self.writers, 'seconds': self.seconds, 'modes': {}}
+        try:
+            for name, options, enabled in self.MODES:
+                connection.close()
+                connection.settings_dict['OPTIONS'] = options
+                with override_settings(SQLITE_PERFORMANCE_MODE=enabled, SLOW_QUERY_MS=None):
+                    result = results['modes'][name] = self.measure_mode()
+                self.log(
+                    f"  {name:<12}{result['reads']['per_second']:>8.1f} reads/s "
+                    f"{result['writes']['per_second']:>8.1f} writes/s "
+                    f"{result['reads']['failed'] + result['writes']['failed']:>6} failed"
+                )
+        finally:
+            connection.close()
+            connection.settings_dict['OPTIONS'] = original
+        return results
+
+
+def explain(query):
+    """The database's plan for a query recorded by QueryRecorder, as text"""
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {query['sql']}", query['params'])
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def environment():
+    """Where the results came from - timings only compare on like-for-like machines"""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regression messages for results against a baseline of the same shape
+
+    Any growth in query count is a regression; wall time and peak memory
+    regress when they exceed the baseline by more than tolerance (and by
+    more than the noise floor).
+    """
+    regressions = []
+    for scale, scale_results in results['scales'].items():
+        baseline_scenarios = baseline.get('scales', {}).get(scale, {}).get('scenarios', {})
+        for name, result in scale_results['scenarios'].items():
+            previous = baseline_scenarios.get(name)
+            if not previous:
+                continue
+            label = f'{scale}/{name}'
+            if result['queries'] > previous['queries']:
+                regressions.append(f"{label}: {result['queries']} queries (baseline {previous['queries']})")
+            wall, previous_wall = result['wall_ms']['median'], previous['wall_ms']['median']
+            if wall > previous_wall * (1 + tolerance) and wall - previous_wall >= MIN_WALL_DELTA_MS:
+                regressions.append(f'{label}: {wall:.1f} ms median (baseline {previous_wall:.1f} ms)')
+            memory, previous_memory = result['peak_memory_kb'], previous['peak_memory_kb']
+            if memory > previous_memory * (1 + tolerance) and memory - previous_memory >= MIN_MEMORY_DELTA_KB:
+                regressions.append(f'{label}: {memory:,} KiB peak memory (baseline {previous_memory:,} KiB)')
+    return regressions
+
+
+def not_in_baseline(results, baseline):
+    """scale/scenario labels of results that compare() has nothing to compare with"""
+    missing = []
+    for scale, scale_results in results['scales'].items():
+        baseline_scenarios = baseline.get('scales', {}).get(scale, {}).get('scenarios', {})
+        missing.extend(f'{scale}/{name}' for name in scale_results['scenarios'] if name not in baseline_scenarios)
+    return missing
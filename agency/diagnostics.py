@@ -0,0 +1,258 @@
+# agency/diagnostics.py - What the perf_diagnose command reports about the live database
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction
+from django.db.models import Count
+from django.test import Client as TestClient, override_settings
+from django.urls import reverse
+
+from . import routers
+from .benchmarks import BenchmarkError, measure
+from .models import Project, UserProfile
+
+# Filters the views in agency/views.py run on every dashboard load: (model, fields, used by).
+# Equality fields come first and the range fields last, the order an index should have.
+HOT_FILTERS = [
+    ('agency.Project', ['company', 'end_date', 'start_date'], 'calculate_monthly_revenue, dashboard_data_api'),
+    ('agency.Project', ['company', 'revenue_type', 'end_date', 'start_date'], 'dashboard'),
+    ('agency.Project', ['project_manager', 'company'], 'pm_dashboard'),
+    ('agency.Cost', ['company', 'start_date', 'end_date'], 'calculate_monthly_operating_costs (active costs)'),
+    ('agency.UserProfile', ['company', 'status', 'start_date', 'end_date'], 'calculate_monthly_operating_costs'),
+    ('agency.Client', ['company', 'status'], 'dashboard'),
+    ('agency.MonthlyRevenue', ['company', 'year', 'month'], 'calculate_monthly_revenue'),
+    ('agency.MonthlyRevenue', ['company', 'year', 'revenue_type'], 'dashboard'),
+    ('agency.ProjectAllocation', ['project', 'year', 'month'], 'pm_dashboard, admin allocation grid'),
+    ('agency.ProjectAllocation', ['user_profile', 'year', 'month'], 'employee_dashboard'),
+]
+
+SQLITE_PRAGMAS = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'busy_timeout', 'temp_store', 'foreign_keys']
+POSTGRES_SETTINGS = [
+    'server_version', 'max_connections', 'shared_buffers', 'effective_cache_size', 'work_mem',
+    'random_page_cost', 'statement_timeout',
+]
+
+
+def _fetch(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def table_stats():
+    """Row count and on-disk bytes (table plus its indexes) of every agency and auth table
+
+    Size is None where the database cannot tell, e.g. SQLite built without dbstat.
+    """
+    models = [User] + list(apps.get_app_config('agency').get_models())
+    try:
+        if connection.vendor == 'postgresql':
+            sizes = dict(_fetch('SELECT relname, pg_total_relation_size(relid) FROM pg_stat_user_tables'))
+        elif connection.vendor == 'sqlite':
+            sizes = dict(_fetch(
+                'SELECT s.tbl_name, SUM(d.pgsize) FROM dbstat d '
+                'JOIN sqlite_schema s ON s.name = d.name GROUP BY s.tbl_name'
+            ))
+        else:
+            sizes = {}
+    except DatabaseError:
+        sizes = {}
+
+    stats = [
+        {'table': model._meta.db_table, 'rows': model.objects.count(), 'bytes': sizes.get(model._meta.db_table)}
+        for model in models
+    ]
+    return sorted(stats, key=lambda table: (table['bytes'] or 0, table['rows']), reverse=True)
+
+
+def _indexes(model):
+    """Column lists of the model table's indexes and unique constraints, by name"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {
+        name: constraint['columns']
+        for name, constraint in constraints.items()
+        if (constraint['index'] or constraint['unique']) and constraint['columns']
+    }
+
+
+def missing_indexes():
+    """HOT_FILTERS no index serves in full
+
+    A filter is served when an index starts with its columns, in any order.
+    Otherwise the entry names the index with the longest usable prefix, if
+    any, which the database narrows the rows with before filtering the rest.
+    """
+    missing = []
+    for label, fields, used_by in HOT_FILTERS:
+        model = apps.get_model(label)
+        columns = [model._meta.get_field(field).column for field in fields]
+        best_name, best_prefix = None, 0
+        for name, index_columns in _indexes(model).items():
+            prefix = 0
+            while prefix < len(index_columns) and index_columns[prefix] in columns:
+                prefix += 1
+            if prefix > best_prefix:
+                best_name, best_prefix = name, prefix
+        if best_prefix < len(columns):
+            missing.append({
+                'table': model._meta.db_table,
+                'columns': columns,
+                'used_by': used_by,
+                'partial': f'{best_name} ({best_prefix} of {len(columns)} columns)' if best_name else None,
+            })
+    return missing
+
+
+def index_usage():
+    """Scans per table and per index since the statistics were reset - PostgreSQL only
+
+    Returns None on other databases. Indexes with no scans are candidates
+    to drop; tables with many sequential scans need one of the indexes
+    missing_indexes() lists.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    tables = _fetch(
+        "SELECT relname, seq_scan, COALESCE(idx_scan, 0), n_live_tup FROM pg_stat_user_tables "
+        "WHERE relname LIKE 'agency\\_%%' ORDER BY seq_scan DESC"
+    )
+    indexes = _fetch(
+        "SELECT relname, indexrelname, idx_scan, pg_relation_size(indexrelid) FROM pg_stat_user_indexes "
+        "WHERE relname LIKE 'agency\\_%%' ORDER BY idx_scan, relname"
+    )
+    return {
+        'tables': [
+            {'table': table, 'seq_scans': seq, 'index_scans': idx, 'rows': rows}
+            for table, seq, idx, rows in tables
+        ],
+        'indexes': [
+            {'table': table, 'index': index, 'scans': scans, 'bytes': size}
+            for table, index, scans, size in indexes
+        ],
+    }
+
+
+def connection_settings():
+    """Connection options of the primary and replica plus the server settings that matter for speed"""
+    result = []
+    aliases = [DEFAULT_DB_ALIAS]
+    # Other aliases are never queried
+    if routers.replica_alias():
+        aliases.append(routers.replica_alias())
+    for alias in aliases:
+        db = connections[alias]
+        entry = {
+            'alias': alias,
+            'engine': db.settings_dict['ENGINE'],
+            'CONN_MAX_AGE': db.settings_dict.get('CONN_MAX_AGE'),
+            'CONN_HEALTH_CHECKS': db.settings_dict.get('CONN_HEALTH_CHECKS'),
+            'ATOMIC_REQUESTS': db.settings_dict.get('ATOMIC_REQUESTS'),
+            # Option names only - values can hold credentials
+            'OPTIONS': sorted(db.settings_dict.get('OPTIONS', {})),
+            'server': {},
+            'pool': None,
+        }
+        if db.vendor == 'postgresql' and db.settings_dict.get('OPTIONS', {}).get('pool'):
+            # psycopg_pool counters for this process: pool_size, pool_available, requests_waiting, ...
+            entry['pool'] = db.pool.get_stats()
+        try:
+            with db.cursor() as cursor:
+                if db.vendor == 'sqlite':
+                    for pragma in SQLITE_PRAGMAS:
+                        cursor.execute(f'PRAGMA {pragma}')
+                        row = cursor.fetchone()
+                        # In-memory databases have no mmap_size
+                        entry['server'][pragma] = row[0] if row else None
+                elif db.vendor == 'postgresql':
+                    for name in POSTGRES_SETTINGS:
+                        cursor.execute(f'SHOW {name}')
+                        entry['server'][name] = cursor.fetchone()[0]
+        except DatabaseError as e:
+            entry['server'] = {'error': str(e)}
+        result.append(entry)
+    return result
+
+
+def cache_settings():
+    """Backend, location and timeout of each cache, with one set/get round trip timed"""
+    result = []
+    for alias, config in settings.CACHES.items():
+        cache = caches[alias]
+        started = time.perf_counter()
+        try:
+            cache.set('agency:perf_diagnose', 1, 10)
+            working = cache.get('agency:perf_diagnose') == 1
+            cache.delete('agency:perf_diagnose')
+        except Exception:
+            working = False
+        result.append({
+            'alias': alias,
+            'backend': config['BACKEND'],
+            'location': config.get('LOCATION', ''),
+            'timeout': config.get('TIMEOUT', 300),
+            'working': working,
+            'round_trip_ms': round((time.perf_counter() - started) * 1000, 2),
+            # Every worker process has its own copy, so hit rates fall as workers are added
+            'per_process': config['BACKEND'].endswith('LocMemCache'),
+        })
+    return result
+
+
+def time_endpoints(user, repeat=3):
+    """Time the hot read endpoints against the current data
+
+    Runs as user (a superuser) plus the busiest project manager and
+    employee of the first company, inside a transaction that is rolled
+    back, so logins and anything the views write leave no trace. Returns
+    (name, measure() result or error message) pairs.
+    """
+    this_year = time.localtime().tm_year
+    results = []
+    # The test client's host name, whatever the deployment allows
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+        project = Project.objects.annotate(allocation_count=Count('allocations')).order_by(
+            '-allocation_count'
+        ).first()
+        pm = User.objects.filter(profile__is_project_manager=True).annotate(
+            project_count=Count('managed_projects')
+        ).order_by('-project_count').first()
+        employee = UserProfile.objects.filter(is_project_manager=False).annotate(
+            allocation_count=Count('project_allocations')
+        ).order_by('-allocation_count').first()
+
+        endpoints = [
+            ('dashboard', user, reverse('agency:dashboard'), None),
+            ('revenue_chart_data', user, reverse('agency:revenue_chart_data'), {'year': this_year}),
+            ('dashboard_data_api', user, reverse('agency:dashboard_data_api'),
+             {'start_date': f'{this_year}-01-01', 'end_date': f'{this_year}-12-31'}),
+            ('admin_project_changelist', user, reverse('admin:agency_project_changelist'), None),
+        ]
+        if project:
+            for name in ('get_allocation_data', 'available_members'):
+                endpoints.append((
+                    f'admin_{name}', user, reverse(f'admin:agency_project_{name}', args=[project.pk]), None
+                ))
+        if pm:
+            endpoints.append(('pm_dashboard', pm, reverse('agency:pm_dashboard'), None))
+        if employee:
+            endpoints.append(('employee_dashboard', employee.user, reverse('agency:employee_dashboard'), None))
+
+        for name, as_user, url, data in endpoints:
+            client = TestClient()
+            client.force_login(as_user)
+
+            def run():
+                response = client.get(url, data)
+                if response.status_code != 200:
+                    raise BenchmarkError(f'GET {url} returned {response.status_code}')
+
+            try:
+                results.append((name, measure(run, repeat)))
+            except BenchmarkError as e:
+                results.append((name, str(e)))
+        transaction.set_rollback(True)
+    return results
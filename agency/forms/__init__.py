@@ -1 +1,2 @@
 from .allocation_forms import *
+from .import_forms import *
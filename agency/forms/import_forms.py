@@ -0,0 +1,17 @@
+from django import forms
+from django.core.validators import FileExtensionValidator
+from agency.importers import SHEETS
+
+
+class ImportUploadForm(forms.Form):
+    """Spreadsheet upload queued for the background import worker"""
+
+    file = forms.FileField(
+        validators=[FileExtensionValidator(['xlsx', 'csv', 'parquet'])],
+        help_text='Excel workbook, or a CSV / Parquet export of one sheet'
+    )
+    sheet = forms.ChoiceField(
+        choices=[('', 'Infer from file name')] + [(sheet, sheet) for sheet in SHEETS],
+        required=False,
+        help_text='Sheet layout of a CSV or Parquet file'
+    )
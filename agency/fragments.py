@@ -0,0 +1,45 @@
+# agency/fragments.py - Versions of each company's data, for cached dashboard figures and fragments
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def cache_seconds():
+    """How long dashboard figures and fragments are cached; changes in the same cache clear them at once"""
+    return getattr(settings, 'DASHBOARD_CACHE_SECONDS', 300)
+
+
+def _version_key(company_id):
+    return f'agency:data_version:{company_id}'
+
+
+def data_version(company_id):
+    """Current version of a company's data, for cache keys
+
+    Stored in the default cache. A missing version (never set, or evicted)
+    is replaced with a new one, so keys built from an older version are
+    never used again.
+    """
+    key = _version_key(company_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(company_id):
+    """Give a company's data a new version once the current transaction commits
+
+    Saves and deletes of the models the dashboard reads call this (see
+    agency.models.CompanyDataMixin). Code that writes them without save()
+    (bulk or raw inserts, queryset updates) should call this itself.
+    Workers on a per-process cache see the change after cache_seconds().
+    """
+    transaction.on_commit(lambda: cache.set(_version_key(company_id), time.time_ns(), None))
+
+
+def month_key(year, month):
+    return f'{year}-{month:02d}'
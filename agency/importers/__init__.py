@@ -0,0 +1,5 @@
+from .sources import *
+from .hashing import *
+from .planner import *
+from .runner import *
+from .jobs import *
@@ -0,0 +1,117 @@
+# agency/importers/hashing.py - Content hashes for incremental re-imports
+import hashlib
+
+from ..models import ImportedRow
+
+__all__ = ['row_key', 'content_hash', 'RowHashIndex']
+
+# Rows per bulk write / IN clause, safely under SQLite's variable limit
+BATCH_SIZE = 500
+
+
+def row_key(sheet, record):
+    """Stable identity of a source row - the client or team member name"""
+    if sheet == 'Revenue':
+        return record.client_name
+    return record.full_name
+
+
+def content_hash(sheet, record):
+    """SHA-256 of the normalized values a row contributes to the import"""
+    if sheet == 'Revenue':
+        values = [record.client_name, record.status.lower()]
+        values.extend('' if amount is None else str(amount.normalize()) for amount in record.monthly)
+    else:
+        values = [record.full_name, str(record.annual_salary.normalize())]
+    return hashlib.sha256('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+
+class RowHashIndex:
+    """Hashes stored by the previous import of one sheet, with pending changes
+
+    classify() sorts each record into skipped / inserted / updated, and
+    flush() persists the new hashes a batch at a time. Keys that were
+    stored but never seen during the run are reported by missing_keys().
+    """
+
+    def __init__(self, company, sheet, full=False):
+        self.company = company
+        self.sheet = sheet
+        self.full = full
+        self.seen = set()
+        self.unconfirmed = set()
+        self.reload()
+
+    def checkpoint(self):
+        """Mark the keys seen so far as kept by a later reload()"""
+        self.unconfirmed = set()
+
+    def reload(self):
+        """Re-read stored hashes and drop pending ones, e.g. after a rolled back chunk
+
+        Keys first seen since the last checkpoint() are forgotten too, so a
+        rolled back row repeated later is inserted rather than re-applied.
+        """
+        self.seen -= self.unconfirmed
+        self.unconfirmed = set()
+        self.stored = {}
+        if not self.company._state.adding:  # Unsaved company on a dry run
+            self.stored = {
+                key: (pk, digest)
+                for pk, key, digest in ImportedRow.objects.filter(
+                    company=self.company, sheet=self.sheet
+                ).values_list('id', 'row_key', 'content_hash')
+            }
+        self.pending_create = {}
+        self.pending_update = {}
+
+    def classify(self, record):
+        """Return 'skipped', 'inserted' or 'updated' for a record"""
+        key = row_key(self.sheet, record)
+        digest = content_hash(self.sheet, record)
+        stored = self.stored.get(key)
+        # A key repeated within one source is re-applied, last row wins
+        repeated = key in self.seen
+        if not repeated:
+            self.seen.add(key)
+            self.unconfirmed.add(key)
+
+        if stored is None:
+            if repeated:
+                self.pending_create[key].content_hash = digest
+                return 'updated'
+            self.pending_create[key] = ImportedRow(
+                company=self.company, sheet=self.sheet, row_key=key, content_hash=digest
+            )
+            return 'inserted'
+        if stored[1] == digest and not repeated and not self.full:
+            return 'skipped'
+        self.pending_update[key] = ImportedRow(id=stored[0], content_hash=digest)
+        return 'updated'
+
+    def mark_seen(self, records):
+        """Record keys committed by an earlier run without classifying them again"""
+        self.seen.update(row_key(self.sheet, record) for record in records)
+
+    def flush(self):
+        """Write hashes for the records classified since the last flush"""
+        if self.pending_create:
+            ImportedRow.objects.bulk_create(self.pending_create.values(), batch_size=BATCH_SIZE)
+            # Later repeats of these keys must update, not insert again
+            for key, row in self.pending_create.items():
+                self.stored[key] = (row.id, row.content_hash)
+            self.pending_create = {}
+        if self.pending_update:
+            ImportedRow.objects.bulk_update(self.pending_update.values(), ['content_hash'], batch_size=BATCH_SIZE)
+            self.pending_update = {}
+
+    def missing_keys(self):
+        """Keys imported previously that no longer appear in the source"""
+        return [key for key in self.stored if key not in self.seen]
+
+    def forget(self, keys):
+        """Drop stored hashes for keys removed from the source"""
+        for start in range(0, len(keys), BATCH_SIZE):
+            ImportedRow.objects.filter(
+                company=self.company, sheet=self.sheet, row_key__in=keys[start:start + BATCH_SIZE]
+            ).delete()
@@ -0,0 +1,85 @@
+# agency/importers/jobs.py - Database-backed queue of uploaded imports
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..metrics import observe_import_job
+from ..models import ImportJob
+from .runner import ImportRunner
+
+__all__ = ['STALE_AFTER', 'claim_next_job', 'requeue_failed_jobs', 'run_job']
+
+# A running job whose progress has not moved for this long lost its worker
+STALE_AFTER = timedelta(minutes=30)
+
+
+def _claimable(stale_after):
+    return Q(status='queued') | Q(status='running', updated_at__lt=timezone.now() - stale_after)
+
+
+def claim_next_job(worker, stale_after=STALE_AFTER):
+    """Atomically take the oldest queued (or abandoned) job; returns None when idle
+
+    The conditional UPDATE is the lock - if another worker claimed the
+    row first it matches nothing and the next candidate is tried.
+    """
+    candidates = ImportJob.objects.filter(_claimable(stale_after)).order_by('created_at')
+    for pk in candidates.values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(_claimable(stale_after), pk=pk).update(
+            status='running',
+            worker=worker,
+            attempts=F('attempts') + 1,
+            rows_processed=0,
+            started_at=now,
+            finished_at=None,
+            updated_at=now,
+        )
+        if claimed:
+            return ImportJob.objects.select_related('company').get(pk=pk)
+    return None
+
+
+def requeue_failed_jobs(jobs):
+    """Queue the failed jobs among jobs again; returns how many
+
+    The next attempt resumes from the job's checkpoints, so only the
+    batches that failed or never ran are imported again.
+    """
+    return jobs.filter(status='failed').update(
+        status='queued', worker='', errors=[], finished_at=None, updated_at=timezone.now()
+    )
+
+
+def run_job(job, log=None):
+    """Import a claimed job's file, saving progress after every committed batch
+
+    Jobs run in parallel mode so each batch commits on its own and the
+    polling endpoint sees progress; a retried job resumes from its checkpoints.
+    """
+    def progress(rows):
+        job.rows_processed += rows
+        job.save(update_fields=['rows_processed', 'updated_at'])
+
+    runner = ImportRunner(
+        job.company,
+        parallel=True,
+        resume=job.attempts > 1,
+        log=log,
+        progress=progress,
+    )
+    try:
+        results = runner.run(job.file.path, sheet=job.sheet or None)
+    except Exception as e:
+        job.status = 'failed'
+        job.errors = [str(e)]
+    else:
+        job.counts = dict(results['counts'])
+        job.errors = results['errors'] + results['failed_chunks']
+        job.status = 'failed' if job.errors else 'completed'
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'counts', 'errors', 'finished_at', 'updated_at'])
+    observe_import_job(job)
+    return job
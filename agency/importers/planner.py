@@ -0,0 +1,331 @@
+# agency/importers/planner.py - Bulk-read change planning for spreadsheet imports
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..models import Client, MonthlyRevenue, Project, UserProfile
+
+__all__ = ['ChangeSet', 'ImportPlanner', 'split_name']
+
+# Rows per bulk write / IN clause, safely under SQLite's variable limit
+BATCH_SIZE = 500
+CENTS = Decimal('0.01')
+
+
+def split_name(full_name):
+    """Return (first_name, last_name, username) for a payroll name"""
+    name_parts = full_name.split()
+    first_name = name_parts[0] if name_parts else 'Unknown'
+    last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else ''
+
+    # Create username from name
+    username = f"{first_name.lower()}.{last_name.lower()}".replace(' ', '.').replace('-', '.')
+    return first_name, last_name, username
+
+
+def general_project_name(client_name):
+    return f"{client_name} - General Work"
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ChangeSet:
+    """Pending writes for one batch of records, with their old values
+
+    The same change set drives both --dry-run (describe()) and the real
+    import (apply()), so a preview shows exactly what an import would write.
+    """
+
+    def __init__(self):
+        self.clients_to_create = []
+        self.projects_to_create = []
+        self.projects_to_update = {}      # pk -> (project, old total_revenue)
+        self.revenue_to_create = {}       # (client name, month) -> MonthlyRevenue
+        self.revenue_to_update = {}       # pk -> (cell, old revenue)
+        self.revenue_to_delete = {}       # pk -> cell
+        self.users_to_create = []
+        self.profiles_to_create = []
+        self.profiles_to_update = {}      # pk -> (profile, old hourly_rate, old annual_salary)
+        self.profiles_to_deactivate = {}  # pk -> (profile, old status)
+
+    def counts(self):
+        return Counter({
+            'clients_created': len(self.clients_to_create),
+            'projects_created': len(self.projects_to_create),
+            'projects_updated': len(self.projects_to_update),
+            'revenue_created': len(self.revenue_to_create),
+            'revenue_updated': len(self.revenue_to_update),
+            'revenue_deleted': len(self.revenue_to_delete),
+            'users_created': len(self.users_to_create),
+            'profiles_created': len(self.profiles_to_create),
+            'profiles_updated': len(self.profiles_to_update) + len(self.profiles_to_deactivate),
+        })
+
+    def describe(self):
+        """Yield one human readable line per planned change"""
+        for client in self.clients_to_create:
+            yield f'+ client "{client.name}" (status: {client.status})'
+        for project in self.projects_to_create:
+            yield f'+ project "{project.name}" (total_revenue: {project.total_revenue})'
+        for project, old_total in self.projects_to_update.values():
+            yield f'~ project "{project.name}": total_revenue {old_total} -> {project.total_revenue}'
+        for cell in self.revenue_to_create.values():
+            yield f'+ revenue "{cell.client.name}" {cell.year}-{cell.month:02d} {cell.revenue_type}: {cell.revenue}'
+        for cell, old_revenue in self.revenue_to_update.values():
+            yield (f'~ revenue "{cell.client.name}" {cell.year}-{cell.month:02d} {cell.revenue_type}: '
+                   f'{old_revenue} -> {cell.revenue}')
+        for cell in self.revenue_to_delete.values():
+            yield f'- revenue "{cell.client.name}" {cell.year}-{cell.month:02d} {cell.revenue_type}: {cell.revenue}'
+        for user in self.users_to_create:
+            yield f'+ user "{user.username}" ({user.get_full_name()})'
+        for profile in self.profiles_to_create:
+            yield (f'+ profile "{profile.user.username}": hourly_rate {profile.hourly_rate}, '
+                   f'annual_salary {profile.annual_salary}')
+        for profile, old_rate, old_salary in self.profiles_to_update.values():
+            yield (f'~ profile "{profile.user.username}": hourly_rate {old_rate} -> {profile.hourly_rate}, '
+                   f'annual_salary {old_salary} -> {profile.annual_salary}')
+        for profile, old_status in self.profiles_to_deactivate.values():
+            yield f'~ profile "{profile.user.username}": status {old_status} -> {profile.status}'
+
+    def apply(self):
+        """Write the planned changes with bulk queries - call inside a transaction"""
+        Client.objects.bulk_create(self.clients_to_create, batch_size=BATCH_SIZE)
+        Project.objects.bulk_create(self.projects_to_create, batch_size=BATCH_SIZE)
+        if self.projects_to_update:
+            now = timezone.now()
+            projects = [project for project, _ in self.projects_to_update.values()]
+            for project in projects:
+                project.updated_at = now
+            Project.objects.bulk_update(projects, ['total_revenue', 'updated_at'], batch_size=BATCH_SIZE)
+
+        MonthlyRevenue.objects.bulk_create(self.revenue_to_create.values(), batch_size=BATCH_SIZE)
+        if self.revenue_to_update:
+            MonthlyRevenue.objects.bulk_update(
+                [cell for cell, _ in self.revenue_to_update.values()], ['revenue'], batch_size=BATCH_SIZE
+            )
+        for pks in _chunks(self.revenue_to_delete):
+            MonthlyRevenue.objects.filter(pk__in=pks).delete()
+
+        User.objects.bulk_create(self.users_to_create, batch_size=BATCH_SIZE)
+        UserProfile.objects.bulk_create(self.profiles_to_create, batch_size=BATCH_SIZE)
+        if self.profiles_to_update:
+            UserProfile.objects.bulk_update(
+                [profile for profile, _, _ in self.profiles_to_update.values()],
+                ['hourly_rate', 'annual_salary'], batch_size=BATCH_SIZE
+            )
+        for pks in _chunks(self.profiles_to_deactivate):
+            UserProfile.objects.filter(pk__in=pks).update(status='inactive')
+
+
+class ImportPlanner:
+    """Computes the ChangeSet for a batch of records using a few bulk reads
+
+    Each plan_* call reads the rows the batch touches (clients, projects,
+    revenue cells, users, profiles) in one query per table and diffs them
+    in memory - no writes are issued.
+    """
+
+    def __init__(self, company, year=2025):
+        self.company = company
+        self.year = year
+
+    # Revenue sheet
+
+    def _revenue_state(self, client_names):
+        clients = {}
+        if self.company._state.adding:  # Unsaved company on a dry run
+            return clients, {}, {}
+
+        for names in _chunks(client_names):
+            for client in Client.objects.filter(company=self.company, name__in=names):
+                clients.setdefault(client.name, client)
+
+        projects = {}
+        for names in _chunks(general_project_name(name) for name in client_names):
+            for project in Project.objects.filter(company=self.company, name__in=names):
+                projects.setdefault((project.client_id, project.name), project)
+
+        cells = {}
+        for batch in _chunks(clients.values()):
+            for cell in MonthlyRevenue.objects.filter(
+                company=self.company,
+                client__in=batch,
+                project__isnull=True,
+                year=self.year,
+                revenue_type='booked'
+            ).select_related('client'):
+                cells.setdefault((cell.client_id, cell.month), cell)
+
+        return clients, projects, cells
+
+    def plan_revenue(self, records, replaced=()):
+        """Plan a batch of RevenueRecords; rows whose key is in replaced drop cleared months"""
+        changes = ChangeSet()
+        clients, projects, cells = self._revenue_state({record.client_name for record in records})
+
+        for record in records:
+            client_status = 'active' if record.status.lower() == 'open' else 'inactive'
+
+            client = clients.get(record.client_name)
+            if client is None:
+                client = Client(name=record.client_name, company=self.company, status=client_status)
+                clients[record.client_name] = client
+                changes.clients_to_create.append(client)
+
+            project_name = general_project_name(record.client_name)
+            project = projects.get((client.pk, project_name))
+            if project is None:
+                project = Project(
+                    name=project_name,
+                    client=client,
+                    company=self.company,
+                    start_date=date(self.year, 1, 1),
+                    end_date=date(self.year, 12, 31),
+                    total_revenue=Decimal('0'),
+                    total_hours=Decimal('0'),
+                    status='active' if client_status == 'active' else 'completed'
+                )
+                projects[(client.pk, project_name)] = project
+                changes.projects_to_create.append(project)
+
+            amounts = {
+                month: amount
+                for month, amount in enumerate(record.monthly, start=1)
+                if amount is not None and amount > 0
+            }
+            for month, amount in amounts.items():
+                self._plan_cell(changes, cells, client, month, amount)
+
+            if record.client_name in replaced:
+                # Months cleared in the source since the last import
+                for month in range(1, 13):
+                    if month not in amounts:
+                        self._plan_cell(changes, cells, client, month, None)
+
+            total_revenue = sum(amounts.values(), Decimal('0'))
+            if (total_revenue > 0 or record.client_name in replaced) and project.total_revenue != total_revenue:
+                if not project._state.adding and project.pk not in changes.projects_to_update:
+                    changes.projects_to_update[project.pk] = (project, project.total_revenue)
+                project.total_revenue = total_revenue
+
+        return changes
+
+    def _plan_cell(self, changes, cells, client, month, amount):
+        cell = cells.get((client.pk, month))
+        if amount is None:
+            if cell is None:
+                return
+            del cells[(client.pk, month)]
+            if cell._state.adding:
+                changes.revenue_to_create.pop((client.name, month), None)
+            else:
+                changes.revenue_to_update.pop(cell.pk, None)
+                changes.revenue_to_delete[cell.pk] = cell
+            return
+
+        if cell is None:
+            cell = MonthlyRevenue(
+                client=client,
+                company=self.company,
+                year=self.year,
+                month=month,
+                revenue_type='booked',
+                revenue=amount
+            )
+            cells[(client.pk, month)] = cell
+            changes.revenue_to_create[(client.name, month)] = cell
+        elif cell.revenue != amount:
+            if not cell._state.adding and cell.pk not in changes.revenue_to_update:
+                changes.revenue_to_update[cell.pk] = (cell, cell.revenue)
+            cell.revenue = amount
+
+    def plan_revenue_removals(self, client_names):
+        """Plan deleting imported revenue for clients removed from the sheet"""
+        changes = ChangeSet()
+        clients, projects, cells = self._revenue_state(set(client_names))
+        for cell in cells.values():
+            changes.revenue_to_delete[cell.pk] = cell
+        for project in projects.values():
+            if project.total_revenue != 0:
+                changes.projects_to_update[project.pk] = (project, project.total_revenue)
+                project.total_revenue = Decimal('0')
+        return changes
+
+    # Payroll sheet
+
+    def _payroll_state(self, usernames):
+        users = {}
+        for names in _chunks(usernames):
+            users.update((user.username, user) for user in User.objects.filter(username__in=names))
+
+        profiles = {}
+        for names in _chunks(usernames):
+            for profile in UserProfile.objects.filter(user__username__in=names).select_related('user'):
+                profiles[profile.user_id] = profile
+
+        return users, profiles
+
+    def plan_payroll(self, records, replaced=()):
+        """Plan a batch of PayrollRecords"""
+        changes = ChangeSet()
+        names = {record.full_name: split_name(record.full_name) for record in records}
+        users, profiles = self._payroll_state({username for _, _, username in names.values()})
+        new_profiles = {}
+
+        for record in records:
+            first_name, last_name, username = names[record.full_name]
+            annual_salary = record.annual_salary.quantize(CENTS)
+
+            # Calculate hourly rate (assuming 2080 hours per year)
+            hourly_rate = (annual_salary / 2080).quantize(CENTS) if annual_salary > 0 else Decimal('75.00')
+            salary = annual_salary if annual_salary > 0 else None
+
+            user = users.get(username)
+            if user is None:
+                user = User(
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=f"{username}@{self.company.code.lower()}.com",
+                )
+                users[username] = user
+                changes.users_to_create.append(user)
+
+            profile = new_profiles.get(username) if user._state.adding else profiles.get(user.pk)
+            if profile is None:
+                profile = new_profiles[username] = UserProfile(
+                    user=user,
+                    company=self.company,
+                    role='tech',  # Default role
+                    hourly_rate=hourly_rate,
+                    annual_salary=salary,
+                    status='full_time',
+                    start_date=date(self.year, 1, 1),
+                    weekly_capacity_hours=Decimal('40'),
+                    utilization_target=Decimal('80')
+                )
+                changes.profiles_to_create.append(profile)
+            elif profile.hourly_rate != hourly_rate or profile.annual_salary != salary:
+                if not profile._state.adding and profile.pk not in changes.profiles_to_update:
+                    changes.profiles_to_update[profile.pk] = (profile, profile.hourly_rate, profile.annual_salary)
+                profile.hourly_rate = hourly_rate
+                profile.annual_salary = salary
+
+        return changes
+
+    def plan_payroll_removals(self, full_names):
+        """Plan marking team members removed from the sheet as inactive"""
+        changes = ChangeSet()
+        _, profiles = self._payroll_state({split_name(full_name)[2] for full_name in full_names})
+        for profile in profiles.values():
+            if profile.company_id == self.company.pk and profile.status != 'inactive':
+                changes.profiles_to_deactivate[profile.pk] = (profile, profile.status)
+                profile.status = 'inactive'
+        return changes
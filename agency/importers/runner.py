@@ -0,0 +1,243 @@
+# agency/importers/runner.py - Import orchestration: serial, dry-run and parallel chunked modes
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+
+from ..fragments import bump_data_version
+from ..models import ImportCheckpoint
+from ..sqlite import write_transaction
+from .hashing import RowHashIndex, row_key
+from .planner import ImportPlanner
+from .sources import SHEETS, DEFAULT_BATCH_SIZE, open_source, iter_record_batches
+
+__all__ = ['ImportRunner', 'source_digest']
+
+
+def source_digest(path, batch_size):
+    """Identify a source file and chunking so checkpoints only resume the same import"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(f':{batch_size}'.encode())
+    return digest.hexdigest()
+
+
+def _init_worker():
+    # Spawned workers (macOS, Windows) start without Django configured
+    import django
+    django.setup()
+
+
+def parse_sheet_to_chunks(path, sheet_arg, sheet, batch_size, directory):
+    """Worker process: parse one sheet and pickle each record batch to its own file"""
+    source = open_source(path, sheet=sheet_arg, batch_size=batch_size)
+    chunk_paths = []
+    try:
+        for index, batch in enumerate(iter_record_batches(source, sheet, batch_size)):
+            chunk_path = os.path.join(directory, f'{sheet}-{index:06d}.pickle')
+            with open(chunk_path, 'wb') as handle:
+                pickle.dump(batch, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            chunk_paths.append(chunk_path)
+    finally:
+        source.close()
+    return chunk_paths
+
+
+def iter_chunk_files(chunk_paths):
+    for chunk_path in chunk_paths:
+        with open(chunk_path, 'rb') as handle:
+            yield pickle.load(handle)
+
+
+class CheckpointStore:
+    """Completed and failed chunks of one source, persisted in ImportCheckpoint"""
+
+    def __init__(self, company, digest, resume=False):
+        self.company = company
+        self.digest = digest
+        checkpoints = ImportCheckpoint.objects.filter(company=company, source_digest=digest)
+        if not resume:
+            checkpoints.delete()
+        self.done = set(checkpoints.filter(status='done').values_list('sheet', 'chunk_index'))
+
+    def is_done(self, sheet, index):
+        return (sheet, index) in self.done
+
+    def mark(self, sheet, index, rows, status, error=''):
+        ImportCheckpoint.objects.update_or_create(
+            company=self.company,
+            source_digest=self.digest,
+            sheet=sheet,
+            chunk_index=index,
+            defaults={'status': status, 'rows': rows, 'error': error}
+        )
+        if status == 'done':
+            self.done.add((sheet, index))
+
+
+class ImportRunner:
+    """Runs an import of one source file for a company
+
+    By default every sheet is imported in a single transaction. With
+    parallel=True the sheets are parsed in worker processes and each
+    chunk of batch_size records commits in its own transaction, with a
+    checkpoint per chunk; resume=True skips chunks that already completed,
+    so only failed or unfinished chunks are retried.
+
+    Rows imported before that are missing from the source are only counted
+    (rows_missing) - one file need not hold every row of the company. With
+    prune=True they are removed: their revenue deleted, their profile
+    marked inactive.
+    """
+
+    def __init__(self, company, batch_size=DEFAULT_BATCH_SIZE, full=False, dry_run=False,
+                 parallel=False, resume=False, prune=False, log=None, verbosity=1, progress=None):
+        self.company = company
+        self.batch_size = batch_size
+        self.full = full
+        self.dry_run = dry_run
+        self.prune = prune
+        self.parallel = parallel
+        self.resume = resume
+        self.log = log or (lambda message: None)
+        self.verbosity = verbosity
+        self.progress = progress or (lambda rows: None)
+
+    def run(self, path, sheet=None):
+        """Import path; returns {'counts': Counter, 'errors': [...], 'failed_chunks': [...]}"""
+        results = {'counts': Counter(), 'errors': [], 'failed_chunks': []}
+
+        if self.parallel and not self.dry_run:
+            self.run_parallel(path, sheet, results)
+            return results
+
+        source = open_source(path, sheet=sheet, batch_size=self.batch_size)
+        try:
+            if self.dry_run:
+                self.run_serial(source, results)
+            else:
+                with write_transaction():
+                    self.run_serial(source, results)
+        finally:
+            source.close()
+        return results
+
+    def run_serial(self, source, results):
+        for sheet in SHEETS:
+            if sheet in source.sheets:
+                try:
+                    self.import_sheet(sheet, iter_record_batches(source, sheet, self.batch_size), results)
+                except Exception as e:
+                    results['errors'].append(f"{sheet} import error: {str(e)}")
+
+    def run_parallel(self, path, sheet_arg, results):
+        source = open_source(path, sheet=sheet_arg, batch_size=self.batch_size)
+        sheets = [sheet for sheet in SHEETS if sheet in source.sheets]
+        source.close()
+
+        checkpoints = CheckpointStore(self.company, source_digest(path, self.batch_size), resume=self.resume)
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with tempfile.TemporaryDirectory() as directory, \
+                ProcessPoolExecutor(max_workers=max(len(sheets), 1), initializer=_init_worker) as pool:
+            futures = {
+                sheet: pool.submit(parse_sheet_to_chunks, path, sheet_arg, sheet, self.batch_size, directory)
+                for sheet in sheets
+            }
+            # Commit sheets in order while later sheets are still being parsed
+            for sheet in sheets:
+                try:
+                    chunk_paths = futures[sheet].result()
+                except Exception as e:
+                    results['errors'].append(f"{sheet} parse error: {str(e)}")
+                    continue
+                self.import_sheet(sheet, iter_chunk_files(chunk_paths), results, checkpoints)
+
+    def import_sheet(self, sheet, batches, results, checkpoints=None):
+        """Plan and apply a sheet batch by batch, skipping rows whose content hash is unchanged"""
+        hashes = RowHashIndex(self.company, sheet, full=self.full)
+        planner = ImportPlanner(self.company)
+        if sheet == 'Revenue':
+            plan, plan_removals = planner.plan_revenue, planner.plan_revenue_removals
+        else:
+            plan, plan_removals = planner.plan_payroll, planner.plan_payroll_removals
+
+        failed = False
+        for index, batch in enumerate(batches):
+            if checkpoints is None:
+                results['counts'].update(self.import_batch(sheet, batch, hashes, plan))
+            elif checkpoints.is_done(sheet, index):
+                # Committed by an earlier run - only remember its keys
+                hashes.mark_seen(batch)
+                results['counts']['rows_resumed'] += len(batch)
+            else:
+                hashes.checkpoint()
+                try:
+                    with write_transaction():
+                        counts = self.import_batch(sheet, batch, hashes, plan)
+                        checkpoints.mark(sheet, index, len(batch), 'done')
+                except Exception as e:
+                    failed = True
+                    hashes.reload()
+                    checkpoints.mark(sheet, index, len(batch), 'failed', error=str(e))
+                    results['failed_chunks'].append(f"{sheet} chunk {index} "
+                                                    f"(rows {batch[0].row_num}-{batch[-1].row_num}): {e}")
+                    continue
+                results['counts'].update(counts)
+                if self.verbosity >= 2:
+                    self.log(f"  {sheet} chunk {index}: {len(batch)} rows committed")
+            self.progress(len(batch))
+
+        # Rows imported last time that have since been removed from the source.
+        # Skipped after a failed chunk - its rows may still be in the source.
+        missing = [] if failed else hashes.missing_keys()
+        if missing and not self.prune:
+            results['counts']['rows_missing'] += len(missing)
+            if self.dry_run or self.verbosity >= 2:
+                for key in missing:
+                    self.log(f'  ? {sheet} row "{key}" is not in the source (kept)')
+        elif missing:
+            with write_transaction():
+                changes = plan_removals(missing)
+                self.commit(changes, results['counts'])
+                if not self.dry_run:
+                    hashes.forget(missing)
+            results['counts']['rows_deleted'] += len(missing)
+
+    def import_batch(self, sheet, batch, hashes, plan):
+        counts = Counter()
+        changed = []
+        replaced = set()
+        for record in batch:
+            outcome = hashes.classify(record)
+            counts[f'rows_{outcome}'] += 1
+            if outcome == 'skipped':
+                continue
+            changed.append(record)
+            if outcome == 'updated':
+                replaced.add(row_key(sheet, record))
+            for warning in getattr(record, 'warnings', ()):
+                self.log(f"  Warning: {warning}")
+
+        self.commit(plan(changed, replaced), counts)
+        if not self.dry_run:
+            hashes.flush()
+        return counts
+
+    def commit(self, changes, counts):
+        """Apply a change set, or only describe it on a dry run"""
+        counts.update(changes.counts())
+        if self.dry_run or self.verbosity >= 2:
+            for line in changes.describe():
+                self.log(f'  {line}')
+        if not self.dry_run:
+            changes.apply()
+            # Bulk writes skip the models' save(), which would do this
+            bump_data_version(self.company.pk)
@@ -0,0 +1,181 @@
+# agency/importers/sources.py - Streaming record sources for spreadsheet imports
+import csv
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+import openpyxl
+
+# Parquet support is optional - pyarrow is a large dependency
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+__all__ = [
+    'DEFAULT_BATCH_SIZE', 'SHEETS', 'PARQUET_AVAILABLE',
+    'RevenueRecord', 'PayrollRecord',
+    'XlsxSource', 'CsvSource', 'ParquetSource',
+    'open_source', 'iter_record_batches',
+]
+
+DEFAULT_BATCH_SIZE = 5000
+SHEETS = ('Revenue', 'Payroll')
+
+# Revenue rows: client, (unused), status, Jan..Dec
+RevenueRecord = namedtuple('RevenueRecord', ['row_num', 'client_name', 'status', 'monthly', 'warnings'])
+# Payroll rows: full name, annual salary
+PayrollRecord = namedtuple('PayrollRecord', ['row_num', 'full_name', 'annual_salary'])
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _to_decimal(value):
+    return Decimal(str(value).strip().replace(',', ''))
+
+
+def revenue_record(row_num, row):
+    """Map a positional Revenue row onto a RevenueRecord (None for blank rows)"""
+    if not row or _is_blank(row[0]):
+        return None
+
+    client_name = str(row[0]).strip()
+    status = str(row[2]).strip() if len(row) > 2 and not _is_blank(row[2]) else 'Open'
+
+    monthly = []
+    warnings = []
+    for month in range(1, 13):
+        col_index = month + 2  # Columns D through O (3-14)
+        value = row[col_index] if col_index < len(row) else None
+        if _is_blank(value):
+            monthly.append(None)
+            continue
+        try:
+            monthly.append(_to_decimal(value))
+        except (InvalidOperation, ValueError, TypeError):
+            monthly.append(None)
+            warnings.append(f"Could not parse revenue for {client_name}, month {month}: {value!r}")
+
+    return RevenueRecord(row_num, client_name, status, tuple(monthly), tuple(warnings))
+
+
+def payroll_record(row_num, row):
+    """Map a positional Payroll row onto a PayrollRecord (None for blank rows)"""
+    if not row or _is_blank(row[0]):
+        return None
+
+    full_name = str(row[0]).strip()
+    annual_salary = Decimal('0')
+    if len(row) > 1 and not _is_blank(row[1]):
+        try:
+            annual_salary = _to_decimal(row[1])
+        except (InvalidOperation, ValueError, TypeError):
+            annual_salary = Decimal('0')
+
+    return PayrollRecord(row_num, full_name, annual_salary)
+
+
+RECORD_MAPPERS = {
+    'Revenue': revenue_record,
+    'Payroll': payroll_record,
+}
+
+
+class XlsxSource:
+    """Workbook source - streams rows from each sheet in read-only mode"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        self.sheets = list(self.workbook.sheetnames)
+
+    def iter_rows(self, sheet):
+        """Yield (row_num, values) for every data row, skipping the header"""
+        worksheet = self.workbook[sheet]
+        yield from enumerate(worksheet.iter_rows(min_row=2, values_only=True), start=2)
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvSource:
+    """Single-table CSV source laid out like one workbook sheet"""
+
+    def __init__(self, path, sheet):
+        self.path = str(path)
+        self.sheets = [sheet]
+
+    def iter_rows(self, sheet):
+        with open(self.path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.reader(handle)
+            next(reader, None)  # Header row
+            yield from enumerate(reader, start=2)
+
+    def close(self):
+        pass
+
+
+class ParquetSource:
+    """Single-table Parquet source, read one record batch at a time"""
+
+    def __init__(self, path, sheet, batch_size=DEFAULT_BATCH_SIZE):
+        if not PARQUET_AVAILABLE:
+            raise ImportError('Parquet imports require pyarrow (pip install pyarrow)')
+        self.path = str(path)
+        self.sheets = [sheet]
+        self.batch_size = batch_size
+        self.parquet_file = pq.ParquetFile(self.path)
+
+    def iter_rows(self, sheet):
+        # Parquet has no header row - columns are positional like the sheet
+        row_num = 1
+        for batch in self.parquet_file.iter_batches(batch_size=self.batch_size):
+            columns = [column.to_pylist() for column in batch.columns]
+            for row in zip(*columns):
+                yield row_num, row
+                row_num += 1
+
+    def close(self):
+        self.parquet_file.close()
+
+
+def infer_sheet(path):
+    """Guess the sheet schema of a single-table file from its name"""
+    return 'Payroll' if 'payroll' in Path(path).stem.lower() else 'Revenue'
+
+
+def open_source(path, sheet=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Open an XLSX, CSV or Parquet file as a record source"""
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(str(path))
+
+    suffix = path.suffix.lower()
+    if suffix in ('.csv', '.txt'):
+        return CsvSource(path, sheet or infer_sheet(path))
+    if suffix in ('.parquet', '.pq'):
+        return ParquetSource(path, sheet or infer_sheet(path), batch_size=batch_size)
+    return XlsxSource(path)
+
+
+def iter_records(source, sheet):
+    """Yield mapped records for a sheet, dropping blank rows"""
+    mapper = RECORD_MAPPERS[sheet]
+    for row_num, row in source.iter_rows(sheet):
+        record = mapper(row_num, row)
+        if record is not None:
+            yield record
+
+
+def iter_record_batches(source, sheet, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of at most batch_size records so memory stays constant"""
+    records = iter_records(source, sheet)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,253 @@
+import json
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from agency.benchmarks import (
+    DEFAULT_REPEAT, DEFAULT_TOLERANCE, BenchmarkError, BenchmarkSuite, ConnectionReuseBenchmark, IndexPlanBenchmark,
+    SQLiteConcurrencyBenchmark, compare, environment, not_in_baseline,
+)
+from agency.synthetic import SCALES
+
+class Command(BaseCommand):
+    help = 'Time the agency views and APIs against synthetic datasets and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            nargs='+',
+            choices=SCALES,
+            default=['small'],
+            help='Dataset sizes to benchmark (default: small)'
+        )
+        parser.add_argument(
+            '--scenario',
+            nargs='+',
+            help='Only run these scenarios, e.g. dashboard pm_dashboard'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help=f'Timed runs per scenario after a warm-up run (default: {DEFAULT_REPEAT})'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Synthetic data seed (default: 42)')
+        parser.add_argument(
+            '--output',
+            default='benchmarks/results.json',
+            help='Where to write the JSON results (default: benchmarks/results.json)'
+        )
+        parser.add_argument(
+            '--baseline',
+            default='benchmarks/baseline.json',
+            help='Results to compare against (default: benchmarks/baseline.json)'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Also write the results to the baseline file'
+        )
+        parser.add_argument(
+            '--no-compare',
+            action='store_true',
+            help='Only write the results, without comparing them with the baseline'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=DEFAULT_TOLERANCE,
+            help=f'Allowed wall time and memory growth over the baseline (default: {DEFAULT_TOLERANCE})'
+        )
+
+        parser.add_argument(
+            '--index-plans',
+            action='store_true',
+            help='Instead of the scenarios, explain and time the hot date-range filters with and '
+                 'without their composite indexes'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Projects and costs loaded for --index-plans (default: 1000000)'
+        )
+        parser.add_argument(
+            '--connection-reuse',
+            action='store_true',
+            help='Instead of the scenarios, compare request latency with a new connection per request, '
+                 'a persistent connection and a connection pool (PostgreSQL only)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Timed requests per connection mode for --connection-reuse (default: 200)'
+        )
+        parser.add_argument(
+            '--sqlite-concurrency',
+            action='store_true',
+            help='Instead of the scenarios, compare concurrent read and write throughput on a SQLite '
+                 'file with and without SQLITE_PERFORMANCE_MODE'
+        )
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads for --sqlite-concurrency (default: 4)')
+        parser.add_argument('--writers', type=int, default=2, help='Writer threads for --sqlite-concurrency (default: 2)')
+        parser.add_argument(
+            '--seconds',
+            type=int,
+            default=5,
+            help='How long each --sqlite-concurrency mode runs (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        if options['index_plans']:
+            self.index_plans(options)
+            return
+        if options['connection_reuse']:
+            self.connection_reuse(options)
+            return
+        if options['sqlite_concurrency']:
+            self.sqlite_concurrency(options)
+            return
+
+        results = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'environment': environment(),
+            'scales': {},
+        }
+
+        # Each scale gets its own throwaway test database - the real one is never touched
+        setup_test_environment(debug=False)
+        try:
+            for scale in options['scale']:
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    suite = BenchmarkSuite(
+                        scale=scale,
+                        seed=options['seed'],
+                        repeat=options['repeat'],
+                        log=self.stdout.write,
+                    )
+                    results['scales'][scale] = suite.run(only=options['scenario'])
+                except BenchmarkError as e:
+                    raise CommandError(f'{scale}: {e}')
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+
+        self.write(options['output'], results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options['save_baseline']:
+            self.write(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+        if options['no_compare']:
+            return
+
+        baseline_path = Path(options['baseline'])
+        if not baseline_path.exists():
+            raise CommandError(
+                f'No baseline at {baseline_path} to compare with - record one on this machine with '
+                '--save-baseline, or pass --no-compare'
+            )
+
+        baseline = json.loads(baseline_path.read_text())
+        missing = not_in_baseline(results, baseline)
+        if len(missing) == sum(len(scale['scenarios']) for scale in results['scales'].values()):
+            raise CommandError(
+                f'{baseline_path} has none of these scenarios - record it again with --save-baseline'
+            )
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f"Not in {baseline_path}, so not compared: {', '.join(missing)}"
+            ))
+
+        regressions = compare(results, baseline, options['tolerance'])
+        if regressions:
+            self.stdout.write(self.style.ERROR(f'REGRESSIONS against {baseline_path}:'))
+            for regression in regressions:
+                self.stdout.write(f'  {regression}')
+            raise CommandError(f'{len(regressions)} benchmark regression(s)')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
+
+    def index_plans(self, options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            benchmark = IndexPlanBenchmark(
+                rows=options['rows'], seed=options['seed'], repeat=options['repeat'], log=self.stdout.write
+            )
+            results = benchmark.run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name, indexed in results['with_indexes'].items():
+            scanned = results['without_indexes'][name]
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({indexed['rows']:,} rows)"))
+            for label, result in (('without indexes', scanned), ('with indexes', indexed)):
+                self.stdout.write(f"  {label:<16}{result['wall_ms']['median']:>10.1f} ms")
+                for line in result['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
+        results['environment'] = environment()
+        self.write(options['output'], results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def connection_reuse(self, options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                f'--connection-reuse needs PostgreSQL, not {connection.vendor} - '
+                'run it with DJANGO_SETTINGS_MODULE=agency_management.settings_production'
+            )
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            benchmark = ConnectionReuseBenchmark(
+                requests=options['requests'], seed=options['seed'], log=self.stdout.write
+            )
+            results = benchmark.run()
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results['environment'] = environment()
+        self.write(options['output'], results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def sqlite_concurrency(self, options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'--sqlite-concurrency needs SQLite, not {connection.vendor}')
+        # A test database file rather than the in-memory default, since locking is what is measured
+        test_settings = connection.settings_dict['TEST']
+        previous_name = test_settings['NAME']
+        setup_test_environment(debug=False)
+        try:
+            with tempfile.TemporaryDirectory(prefix='agency-sqlite-') as directory:
+                test_settings['NAME'] = str(Path(directory) / 'benchmark.sqlite3')
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    benchmark = SQLiteConcurrencyBenchmark(
+                        readers=options['readers'], writers=options['writers'], seconds=options['seconds'],
+                        seed=options['seed'], log=self.stdout.write,
+                    )
+                    results = benchmark.run()
+                except BenchmarkError as e:
+                    raise CommandError(str(e))
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            test_settings['NAME'] = previous_name
+            teardown_test_environment()
+
+        results['environment'] = environment()
+        self.write(options['output'], results)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def write(self, path, results):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + '\n')
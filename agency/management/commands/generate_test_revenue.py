@@ -1,12 +1,12 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import date, timedelta
-from decimal import Decimal
-import random
-from agency.models import Company, MonthlyRevenue, Project, Client, Cost, UserProfile
+from django.contrib.auth.models import User
+from agency.models import Company
+from agency.synthetic import (
+    SCALES, COMPANY_CODE_PREFIX, USERNAME_PREFIX, DEFAULT_BATCH_SIZE, SyntheticDataGenerator,
+)
 
 class Command(BaseCommand):
-    help = 'Generate test revenue data across multiple years'
+    help = 'Generate seeded synthetic companies, projects, allocations, revenue and costs'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,167 +18,65 @@ class Command(BaseCommand):
         parser.add_argument(
             '--clear',
             action='store_true',
-            help='Clear existing data before generating'
+            help='Delete previously generated synthetic companies and users first'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed - the same seed always generates the same data (default: 42)'
+        )
+        parser.add_argument(
+            '--scale',
+            choices=SCALES,
+            default='small',
+            help='Size preset for the counts below (default: small)'
+        )
+        parser.add_argument('--companies', type=int, help='Companies to generate')
+        parser.add_argument('--clients', type=int, help='Clients per company')
+        parser.add_argument('--projects-per-client', type=int, help='Projects per client')
+        parser.add_argument('--profiles', type=int, help='Team members per company')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per INSERT batch (default: {DEFAULT_BATCH_SIZE})'
         )
 
     def handle(self, *args, **options):
-        company = Company.objects.first()
-        if not company:
-            self.stdout.write(self.style.ERROR('No company found. Please create a company first.'))
-            return
-
-        years = [int(y.strip()) for y in options['years'].split(',')]
-        
         if options['clear']:
-            self.stdout.write('Clearing existing monthly revenue data...')
-            MonthlyRevenue.objects.filter(company=company).delete()
-            self.stdout.write(self.style.SUCCESS('Cleared existing data'))
+            self.stdout.write('Clearing synthetic data...')
+            Company.objects.filter(code__startswith=COMPANY_CODE_PREFIX).delete()
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS('Cleared existing synthetic data'))
 
-        self.stdout.write(f'Generating revenue data for years: {years}')
-
-        for year in years:
-            self.generate_year_data(company, year)
-
-        self.stdout.write(self.style.SUCCESS('Successfully generated test revenue data'))
-
-    def generate_year_data(self, company, year):
-        """Generate monthly revenue data for a specific year"""
-        
-        # Base values that grow over time
-        base_booked = 150000 + (year - 2023) * 50000
-        base_forecast = 50000 + (year - 2023) * 20000
-        
-        # Seasonal factors (higher in Q2 and Q4)
-        seasonal_factors = [
-            0.85, 0.90, 0.95,  # Q1
-            1.05, 1.10, 1.15,  # Q2
-            0.95, 0.90, 0.95,  # Q3
-            1.10, 1.15, 1.20   # Q4
-        ]
-        
-        for month in range(1, 13):
-            # Calculate revenue with some randomness
-            seasonal_factor = seasonal_factors[month - 1]
-            
-            booked_revenue = Decimal(
-                base_booked * seasonal_factor * (0.9 + random.random() * 0.2)
-            )
-            forecast_revenue = Decimal(
-                base_forecast * seasonal_factor * (0.8 + random.random() * 0.4)
-            )
-            
-            # Create or update monthly revenue records
-            MonthlyRevenue.objects.update_or_create(
-                company=company,
-                year=year,
-                month=month,
-                revenue_type='booked',
-                defaults={'revenue': booked_revenue}
-            )
-            
-            MonthlyRevenue.objects.update_or_create(
-                company=company,
-                year=year,
-                month=month,
-                revenue_type='forecast',
-                defaults={'revenue': forecast_revenue}
-            )
-            
-            self.stdout.write(
-                f'  {year}-{month:02d}: '
-                f'Booked ${booked_revenue:,.0f}, '
-                f'Forecast ${forecast_revenue:,.0f}'
-            )
-        
-        # Also generate some projects for this year
-        self.generate_projects(company, year)
-        
-        # Generate costs if they don't exist
-        self.generate_costs(company, year)
-
-    def generate_projects(self, company, year):
-        """Generate some test projects for the year"""
-        
-        # Get or create test clients
-        client_names = ['Acme Corp', 'TechStart Inc', 'Global Solutions', 'Digital Ventures']
-        clients = []
-        
-        for name in client_names:
-            client, _ = Client.objects.get_or_create(
-                company=company,
-                name=name,
-                defaults={
-                    'status': 'active'
-                }
-            )
-            clients.append(client)
-        
-        # Generate 3-5 projects per quarter
-        project_count = 0
-        for quarter in range(4):
-            num_projects = random.randint(3, 5)
-            
-            for _ in range(num_projects):
-                month = quarter * 3 + random.randint(1, 3)
-                start_date = date(year, month, 1)
-                
-                # Project duration 1-6 months
-                duration_months = random.randint(1, 6)
-                end_date = start_date + timedelta(days=duration_months * 30)
-                
-                # Revenue based on duration
-                base_monthly = random.randint(30000, 80000)
-                total_revenue = Decimal(base_monthly * duration_months)
-                total_hours = Decimal(duration_months * 160)  # Approx hours
-                
-                project_count += 1
-                project_name = f"{year} Project {project_count}"
-                
-                # 70% booked, 30% forecast
-                revenue_type = 'booked' if random.random() < 0.7 else 'forecast'
-                
-                Project.objects.create(
-                    company=company,
-                    name=project_name,
-                    client=random.choice(clients),
-                    start_date=start_date,
-                    end_date=end_date,
-                    total_revenue=total_revenue,
-                    total_hours=total_hours,
-                    revenue_type=revenue_type,
-                    status='active' if end_date >= timezone.now().date() else 'completed'
-                )
-        
-        self.stdout.write(f'  Created {project_count} projects for {year}')
+        sizes = dict(SCALES[options['scale']])
+        for name in sizes:
+            if options[name] is not None:
+                sizes[name] = options[name]
+        years = [int(y.strip()) for y in options['years'].split(',')]
 
-    def generate_costs(self, company, year):
-        """Generate operating costs if they don't exist"""
-        
-        # Check if we already have costs
-        existing_costs = Cost.objects.filter(company=company).exists()
-        if existing_costs:
+        self.stdout.write(
+            f"Generating {sizes['companies']} companies x {sizes['clients']} clients x "
+            f"{sizes['projects_per_client']} projects, {sizes['profiles']} profiles each, "
+            f"years {years} (seed {options['seed']})"
+        )
+        generator = SyntheticDataGenerator(
+            seed=options['seed'],
+            years=years,
+            batch_size=options['batch_size'],
+            log=self.stdout.write if options['verbosity'] >= 2 else None,
+            **sizes
+        )
+        try:
+            counts = generator.generate()
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(f'{e} (use --clear)'))
             return
-        
-        # Base costs
-        cost_items = [
-            ('Office Rent', 'rent', 15000),
-            ('Software Licenses', 'software', 5000),
-            ('Insurance', 'insurance', 3000),
-            ('Marketing', 'marketing', 8000),
-            ('Professional Services', 'professional', 4000),
-            ('Utilities', 'utilities', 2000),
-            ('Equipment', 'office', 3000),
-        ]
-        
-        for name, cost_type, amount in cost_items:
-            Cost.objects.create(
-                company=company,
-                name=name,
-                cost_type=cost_type,
-                amount=Decimal(amount),
-                frequency='monthly',
-                start_date=date(2023, 1, 1),
-                is_active=True
-            )
-        
-        self.stdout.write(f'  Created {len(cost_items)} cost items')
+
+        for model_name, count in sorted(counts.items()):
+            self.stdout.write(f'  {model_name}: {count:,}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(counts.values()):,} rows in {generator.elapsed:.1f}s '
+            f'({generator.rows_per_second:,} rows/s)'
+        ))
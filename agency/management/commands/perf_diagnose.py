@@ -0,0 +1,112 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from agency import diagnostics
+
+class Command(BaseCommand):
+    help = ('Report table sizes, missing and unused indexes, connection and cache settings, '
+            'and the timed cost of the hot endpoints against the current data')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-endpoints',
+            action='store_true',
+            help='Only inspect the database and settings; do not time the endpoints'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timed runs per endpoint after a warm-up run (default: 3)'
+        )
+        parser.add_argument('--user', help='Superuser to request the endpoints as (default: the first one)')
+
+    def handle(self, *args, **options):
+        self.section(f'Tables ({connection.vendor})')
+        for table in diagnostics.table_stats():
+            size = f"{table['bytes'] / 1024:>10,.0f} KiB" if table['bytes'] is not None else f"{'?':>14}"
+            self.stdout.write(f"  {table['table']:<32} {table['rows']:>10,} rows {size}")
+
+        self.section('Missing indexes for the view filters')
+        missing = diagnostics.missing_indexes()
+        for index in missing:
+            self.stdout.write(self.style.WARNING(
+                f"  {index['table']} ({', '.join(index['columns'])}) - used by {index['used_by']}"
+            ))
+            self.stdout.write(f"      best available: {index['partial'] or 'none, full table scan'}")
+        if not missing:
+            self.stdout.write(self.style.SUCCESS('  Every hot filter has an index'))
+
+        self.section('Index usage')
+        usage = diagnostics.index_usage()
+        if usage is None:
+            self.stdout.write(f'  Not tracked by {connection.vendor}; available on PostgreSQL')
+        else:
+            for table in usage['tables']:
+                self.stdout.write(
+                    f"  {table['table']:<32} {table['seq_scans']:>10,} seq scans "
+                    f"{table['index_scans']:>10,} index scans {table['rows']:>10,} rows"
+                )
+            unused = [index for index in usage['indexes'] if index['scans'] == 0]
+            for index in unused:
+                self.stdout.write(self.style.WARNING(
+                    f"  Unused index {index['index']} on {index['table']} ({index['bytes'] / 1024:,.0f} KiB)"
+                ))
+
+        self.section('Connections')
+        for db in diagnostics.connection_settings():
+            self.stdout.write(f"  {db['alias']}: {db['engine']}")
+            for name in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'ATOMIC_REQUESTS', 'OPTIONS'):
+                self.stdout.write(f'      {name} = {db[name]}')
+            for name, value in db['server'].items():
+                self.stdout.write(f'      {name} = {value}')
+            if db['pool'] is not None:
+                for name, value in sorted(db['pool'].items()):
+                    self.stdout.write(f'      pool {name} = {value}')
+            elif not db['CONN_MAX_AGE']:
+                self.stdout.write(self.style.WARNING('      A new connection is opened for every request'))
+
+        self.section('Caches')
+        for cache in diagnostics.cache_settings():
+            status = self.style.SUCCESS('ok') if cache['working'] else self.style.ERROR('not working')
+            self.stdout.write(
+                f"  {cache['alias']}: {cache['backend']} {cache['location']} "
+                f"timeout={cache['timeout']} round trip {cache['round_trip_ms']} ms {status}"
+            )
+            if cache['per_process']:
+                self.stdout.write('      Local memory: every worker process keeps its own copy')
+
+        if options['skip_endpoints']:
+            return
+        self.section('Endpoints (median of runs, rolled back)')
+        user = self.get_user(options['user'])
+        # Keep the per-request log lines and budget warnings out of the report
+        perf_logger = logging.getLogger('agency.perf')
+        level = perf_logger.level
+        perf_logger.setLevel(logging.ERROR)
+        try:
+            for name, result in diagnostics.time_endpoints(user, options['repeat']):
+                if isinstance(result, str):
+                    self.stdout.write(self.style.ERROR(f'  {name:<28} {result}'))
+                    continue
+                self.stdout.write(
+                    f"  {name:<28} {result['wall_ms']['median']:>10.1f} ms "
+                    f"{result['queries']:>6} queries {result['peak_memory_kb']:>8,} KiB"
+                )
+        finally:
+            perf_logger.setLevel(level)
+
+    def section(self, title):
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+
+    def get_user(self, username):
+        users = User.objects.filter(is_superuser=True, is_active=True).order_by('pk')
+        if username:
+            users = users.filter(username=username)
+        user = users.first()
+        if user is None:
+            raise CommandError('No active superuser to request the endpoints as; create one or use --skip-endpoints')
+        return user
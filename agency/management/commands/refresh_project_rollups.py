@@ -0,0 +1,42 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from agency.rollups import DEFAULT_BATCH_SIZE, refresh_project_rollups
+
+class Command(BaseCommand):
+    help = 'Recompute the allocation rollups stored on each project from its allocations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('projects', nargs='*', help='Project ids to refresh (default: every project)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report how many projects are out of date; exit with an error if any are'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Projects recomputed per query (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        project_ids = options['projects'] or None
+
+        if options['check']:
+            stale = self.refresh(project_ids, options['batch_size'], dry_run=True)
+            if stale:
+                raise CommandError(f'{stale} projects have out of date rollups')
+            self.stdout.write(self.style.SUCCESS('Every project rollup is up to date'))
+            return
+
+        # No transaction around the whole run, so a large table is not locked until the end
+        stale = self.refresh(project_ids, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {stale} projects'))
+
+    def refresh(self, project_ids, batch_size, dry_run=False):
+        try:
+            return refresh_project_rollups(project_ids, batch_size, dry_run=dry_run)
+        except ValidationError as e:
+            raise CommandError(f'Invalid project id: {e.messages[0]}')
@@ -0,0 +1,58 @@
+# agency/management/commands/run_import_jobs.py
+import os
+import socket
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from ...importers import STALE_AFTER, claim_next_job, run_job
+from ...querylog import capture_slow_queries
+
+class Command(BaseCommand):
+    help = 'Process spreadsheet imports uploaded through the web, one job at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling for new jobs',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between queue checks when idle (default: 5)',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=int(STALE_AFTER.total_seconds() // 60),
+            help='Minutes without progress before a running job is retried by another worker',
+        )
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        stale_after = timedelta(minutes=options['stale_after'])
+        self.stdout.write(f'Import worker {worker} started')
+
+        try:
+            while True:
+                job = claim_next_job(worker, stale_after=stale_after)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'Running import {job.pk} ({job.original_name}, attempt {job.attempts})')
+                with capture_slow_queries('run_import_jobs'):
+                    run_job(job, log=self.stdout.write)
+                message = (f'Import {job.pk} {job.status}: {job.rows_processed} rows '
+                           f'at {job.rows_per_second} rows/s')
+                if job.status == 'completed':
+                    self.stdout.write(self.style.SUCCESS(message))
+                else:
+                    self.stdout.write(self.style.ERROR(message))
+                    for error in job.errors:
+                        self.stdout.write(f'  - {error}')
+        except KeyboardInterrupt:
+            self.stdout.write('Import worker stopped')
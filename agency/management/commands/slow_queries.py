@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+from agency.models import SlowQuery
+
+class Command(BaseCommand):
+    help = 'List captured slow queries grouped by statement, or show one with its EXPLAIN plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', help='Show the full SQL, parameters and plan of one capture')
+        parser.add_argument(
+            '--since',
+            type=float,
+            default=24,
+            help='Only captures from the last N hours (default: 24)'
+        )
+        parser.add_argument('--view', help='Only captures from this URL name, e.g. agency:dashboard')
+        parser.add_argument(
+            '--scans',
+            action='store_true',
+            help='Only statements whose plan reads a whole table (SCAN / Seq Scan)'
+        )
+        parser.add_argument('--limit', type=int, default=20, help='Statements to list (default: 20)')
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete the matching captures instead of listing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['id']:
+            self.show(options['id'])
+            return
+
+        captures = SlowQuery.objects.filter(
+            created_at__gte=timezone.now() - timedelta(hours=options['since'])
+        )
+        if options['view']:
+            captures = captures.filter(view_name=options['view'])
+
+        if options['clear']:
+            deleted, _ = captures.delete()
+            self.stdout.write(f'Deleted {deleted} slow queries')
+            return
+
+        groups = (captures.values('fingerprint')
+                  .annotate(count=Count('id'), max_ms=Max('duration_ms'), avg_ms=Avg('duration_ms'))
+                  .order_by('-max_ms'))
+        shown = 0
+        for group in groups:
+            # Newest capture of each statement stands for the group
+            latest = captures.filter(fingerprint=group['fingerprint']).first()
+            if options['scans'] and not latest.has_full_scan:
+                continue
+            flag = self.style.WARNING(' FULL SCAN') if latest.has_full_scan else ''
+            self.stdout.write(
+                f"{group['count']:>5}x  max {group['max_ms']:8.1f} ms  avg {group['avg_ms']:8.1f} ms"
+                f"  {latest.view_name or '-'}  {latest.call_site}{flag}"
+            )
+            self.stdout.write(f"       {' '.join(latest.sql.split())[:160]}")
+            self.stdout.write(f'       --id {latest.pk}')
+            shown += 1
+            if shown >= options['limit']:
+                break
+
+        if not shown:
+            self.stdout.write('No slow queries captured')
+
+    def show(self, pk):
+        try:
+            query = SlowQuery.objects.get(pk=pk)
+        except (SlowQuery.DoesNotExist, ValidationError):
+            raise CommandError(f'No slow query {pk}')
+
+        self.stdout.write(f'{query.duration_ms:.1f} ms at {query.created_at:%Y-%m-%d %H:%M:%S}')
+        self.stdout.write(f'View:      {query.view_name or "-"}')
+        self.stdout.write(f'Call site: {query.call_site}')
+        self.stdout.write(f'Params:    {query.params}')
+        self.stdout.write('')
+        self.stdout.write(query.sql)
+        self.stdout.write('')
+        self.stdout.write('EXPLAIN ANALYZE:' if query.analyzed else 'EXPLAIN:')
+        self.stdout.write(query.plan or '(no plan - executemany statements are not explained)')
@@ -0,0 +1,299 @@
+# agency/metrics.py - In-process metrics registry rendered in the Prometheus text format
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+# Request latency buckets in seconds, query count buckets in queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+IMPORT_DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MemoryStore:
+    """Sample values of this process only - fine for runserver and a single worker"""
+
+    def __init__(self):
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] += amount
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class _ProcessFile:
+    """One process's samples in an mmap'd file
+
+    Layout: a 4-byte count of used bytes, then entries of a 4-byte key
+    length, the UTF-8 key padded to 8 bytes and an 8-byte float. Only the
+    owning process writes, and it bumps the used count after an entry is
+    complete, so readers never see a partial entry.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.handle = open(path, 'a+b')
+        if os.fstat(self.handle.fileno()).st_size == 0:
+            self.handle.truncate(self.INITIAL_SIZE)
+        self.size = os.fstat(self.handle.fileno()).st_size
+        self.map = mmap.mmap(self.handle.fileno(), self.size)
+        self.used = struct.unpack_from('i', self.map, 0)[0] or 8
+        self.positions = {key: position for key, _, position in _read_entries(self.map, self.used)}
+
+    def inc(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value = struct.unpack_from('d', self.map, position)[0]
+        struct.pack_into('d', self.map, position, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padding = -(4 + len(encoded)) % 8
+        entry = struct.pack(f'i{len(encoded)}s{padding}xd', len(encoded), encoded, 0.0)
+        while self.used + len(entry) > self.size:
+            self.size *= 2
+            self.map.close()
+            self.handle.truncate(self.size)
+            self.map = mmap.mmap(self.handle.fileno(), self.size)
+        self.map[self.used:self.used + len(entry)] = entry
+        position = self.used + len(entry) - 8
+        self.used += len(entry)
+        struct.pack_into('i', self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+
+def _read_entries(data, used=None):
+    """(key, value, value position) of every entry in a process file's bytes"""
+    if used is None:
+        used = struct.unpack_from('i', data, 0)[0]
+    position = 8
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+        position += 4 + length + (-(4 + length) % 8)
+        yield key, struct.unpack_from('d', data, position)[0], position
+        position += 8
+
+
+class FileStore:
+    """Samples shared by every process through per-process files in one directory
+
+    Each process (gunicorn worker, import worker) writes its own file, so
+    writes need no cross-process locking; rendering sums all files.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.file = None
+
+    def inc(self, key, amount):
+        with self.lock:
+            # Re-open after a fork - the parent's file is not ours to write
+            if self.pid != os.getpid():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.pid = os.getpid()
+                self.file = _ProcessFile(self.directory / f'{self.pid}.db')
+            self.file.inc(key, amount)
+
+    def items(self):
+        values = defaultdict(float)
+        for path in self.directory.glob('*.db'):
+            for key, value, _ in _read_entries(path.read_bytes()):
+                values[key] += value
+        return list(values.items())
+
+    def mark_process_dead(self, pid):
+        """Fold an exited process's file into archive.db so files do not pile up"""
+        path = self.directory / f'{pid}.db'
+        if not path.exists():
+            return
+        archive = _ProcessFile(self.directory / 'archive.db')
+        for key, value, _ in _read_entries(path.read_bytes()):
+            archive.inc(key, value)
+        archive.map.close()
+        archive.handle.close()
+        path.unlink()
+
+
+@lru_cache(maxsize=4096)
+def _key(name, suffix, labels):
+    """Store key of one sample; labels is a sorted tuple of (name, value) pairs"""
+    return json.dumps([name, suffix, labels])
+
+
+class Counter:
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        self.registry.store.inc(_key(self.name, '_total', tuple(sorted(labels.items()))), amount)
+
+
+class Histogram:
+    def __init__(self, registry, name, documentation, buckets, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        # Buckets are stored non-cumulative (one write); rendering accumulates them
+        store = self.registry.store
+        bucket = next((bound for bound in self.buckets if value <= bound), math.inf)
+        labels = tuple(sorted(labels.items()))
+        store.inc(_key(self.name, '_bucket', tuple(sorted(labels + (('le', _format(bucket)),)))), 1)
+        store.inc(_key(self.name, '_sum', labels), value)
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Registry:
+    """Metric definitions plus the store holding their samples
+
+    The store is chosen on first use: a FileStore when METRICS_DIR is set
+    (required with several gunicorn workers), otherwise a MemoryStore.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._store = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    @property
+    def store(self):
+        if self._store is None:
+            directory = getattr(settings, 'METRICS_DIR', None)
+            self._store = FileStore(directory) if directory else MemoryStore()
+        return self._store
+
+    def render(self, extra=()):
+        """Prometheus text exposition of every metric, plus extra pre-built families"""
+        samples = defaultdict(lambda: defaultdict(float))
+        for key, value in self.store.items():
+            name, suffix, labels = json.loads(key)
+            samples[name][(suffix, tuple(tuple(label) for label in labels))] += value
+
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (suffix, labels), value in sorted(samples[name].items()):
+                    lines.append(f'{name}{suffix}{_labels(labels)} {_format(value)}')
+            else:
+                lines.extend(self._render_histogram(metric, samples[name]))
+
+        for name, kind, documentation, family in extra:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in family:
+                lines.append(f'{name}{_labels(sorted(labels.items()))} {_format(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, metric, samples):
+        series = defaultdict(lambda: {'buckets': defaultdict(float), 'sum': 0.0})
+        for (suffix, labels), value in samples.items():
+            if suffix == '_bucket':
+                le = dict(labels)['le']
+                base = tuple(label for label in labels if label[0] != 'le')
+                series[base]['buckets'][le] += value
+            else:
+                series[labels]['sum'] += value
+
+        lines = []
+        bounds = [_format(bound) for bound in metric.buckets] + ['+Inf']
+        for labels, data in sorted(series.items()):
+            cumulative = 0
+            for bound in bounds:
+                cumulative += data['buckets'].get(bound, 0)
+                lines.append(f'{metric.name}_bucket{_labels(labels + (("le", bound),))} {_format(cumulative)}')
+            lines.append(f'{metric.name}_sum{_labels(labels)} {_format(data["sum"])}')
+            lines.append(f'{metric.name}_count{_labels(labels)} {_format(cumulative)}')
+        return lines
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = Histogram(
+    REGISTRY, 'agency_request_duration_seconds', 'Request latency by URL name.',
+    LATENCY_BUCKETS, ['view'],
+)
+REQUEST_QUERIES = Histogram(
+    REGISTRY, 'agency_request_queries', 'Database queries per request by URL name.',
+    QUERY_BUCKETS, ['view'],
+)
+CACHE_REQUESTS = Counter(
+    REGISTRY, 'agency_cache_requests', 'Cache lookups by result (hit or miss).', ['result'],
+)
+IMPORT_JOBS = Counter(
+    REGISTRY, 'agency_import_jobs', 'Finished import jobs by status.', ['status'],
+)
+IMPORT_ROWS = Counter(
+    REGISTRY, 'agency_import_rows', 'Rows processed by import jobs.',
+)
+IMPORT_DURATION = Histogram(
+    REGISTRY, 'agency_import_job_duration_seconds', 'Wall time of finished import jobs.',
+    IMPORT_DURATION_BUCKETS,
+)
+
+
+def observe_request(stats):
+    """Record a finished request's RequestStats"""
+    view = stats.view_name or 'unresolved'
+    REQUEST_LATENCY.observe(stats.total_ms / 1000, view=view)
+    REQUEST_QUERIES.observe(stats.queries, view=view)
+    if stats.cache_hits:
+        CACHE_REQUESTS.inc(stats.cache_hits, result='hit')
+    if stats.cache_misses:
+        CACHE_REQUESTS.inc(stats.cache_misses, result='miss')
+
+
+def observe_import_job(job):
+    """Record a finished ImportJob"""
+    IMPORT_JOBS.inc(status=job.status)
+    IMPORT_ROWS.inc(job.rows_processed)
+    if job.started_at and job.finished_at:
+        IMPORT_DURATION.observe((job.finished_at - job.started_at).total_seconds())
@@ -0,0 +1,183 @@
+# agency/middleware.py - Request-level middleware for the agency app
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+
+from . import metrics, perf, querylog, routers, tenancy
+from .models import ProfileReport
+from .profiling import profile
+
+logger = logging.getLogger('agency.perf')
+
+
+class SlowQueryMiddleware:
+    """Stores the statements of a request slower than SLOW_QUERY_MS - see agency.querylog
+
+    Their plans are explained and stored once the response is built. Comes
+    before PerformanceMiddleware so that work is not counted in the
+    request's figures; SLOW_QUERY_MS = None removes it from the stack.
+    """
+
+    def __init__(self, get_response):
+        if querylog.threshold_ms() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_queries = querylog.SlowQueryLog(
+            querylog.threshold_ms(), lambda: request.resolver_match and request.resolver_match.view_name
+        )
+        token = querylog.start_request(slow_queries)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(slow_queries))
+                return self.get_response(request)
+        finally:
+            querylog.end_request(token)
+            if slow_queries.captured:
+                slow_queries.save()
+
+
+class PerformanceMiddleware:
+    """Records query count, DB, template, cache and view time of every request
+
+    The figures go out as a Server-Timing header, one JSON log line on the
+    agency.perf logger and the request metrics in agency.metrics; a view that runs more queries than its entry in
+    PERF_QUERY_BUDGETS also logs a warning. With PERF_INSTRUMENTATION off
+    the middleware removes itself from the stack.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.query_budgets = getattr(settings, 'PERF_QUERY_BUDGETS', {})
+
+    def __call__(self, request):
+        stats, token = perf.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            perf.end_request(token)
+        stats.finish()
+
+        if stats.view_name is None and request.resolver_match:
+            stats.view_name = request.resolver_match.view_name
+        response['Server-Timing'] = stats.server_timing()
+        self.log(request, response, stats)
+        metrics.observe_request(stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = perf.current_stats()
+        stats.view_name = request.resolver_match.view_name
+        stats.view_started = time.perf_counter()
+
+    def log(self, request, response, stats):
+        budget = self.query_budgets.get(stats.view_name)
+        over_budget = budget is not None and stats.queries > budget
+        if not (over_budget or logger.isEnabledFor(logging.INFO)):
+            return
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **stats.as_dict(),
+        }
+        logger.info(json.dumps(record))
+        if over_budget:
+            logger.warning(json.dumps({'event': 'query_budget_exceeded', 'budget': budget, **record}))
+
+
+class CompanyMiddleware:
+    """Sets request.company to the company the request works in - see agency.tenancy
+
+    Views scope every query to it rather than looking a company up
+    themselves. Must come after SessionMiddleware and AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.company = tenancy.resolve_company(request)
+        return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """Lets the GET requests of the REPLICA_VIEWS read from REPLICA_DATABASE - see agency.routers
+
+    A request that writes pins its session to the primary for
+    REPLICA_PIN_SECONDS, so the user sees their own changes while the
+    replica catches up. Must come after SessionMiddleware; without
+    REPLICA_DATABASE the middleware removes itself from the stack.
+    """
+
+    def __init__(self, get_response):
+        if routers.replica_alias() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'REPLICA_VIEWS', []))
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+
+    def __call__(self, request):
+        token = routers.start_request()
+        try:
+            response = self.get_response(request)
+            wrote = routers.current().wrote
+        finally:
+            routers.end_request(token)
+        if wrote:
+            request.session[routers.PIN_KEY] = time.time() + self.pin_seconds
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in self.views
+            and request.session.get(routers.PIN_KEY, 0) <= time.time()
+        ):
+            routers.current().use_replica = True
+
+
+class ProfilingMiddleware:
+    """Runs a staff request under cProfile when it asks with ?_profile=1 or X-Profile: 1
+
+    The report - top functions by cumulative time and SQL grouped by the
+    line of agency code that ran it - is saved as a ProfileReport, and the
+    response carries its admin URL in X-Profile-Report. Must come after
+    AuthenticationMiddleware; PROFILING_ENABLED = False removes it.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wanted = request.GET.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+        if not (wanted and request.user.is_staff):
+            return self.get_response(request)
+
+        response, report = profile(lambda: self.get_response(request))
+        saved = ProfileReport.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path(),
+            view_name=request.resolver_match.view_name if request.resolver_match else '',
+            status_code=response.status_code,
+            **report,
+        )
+        response['X-Profile-Report'] = reverse('admin:agency_profilereport_change', args=[saved.pk])
+        return response
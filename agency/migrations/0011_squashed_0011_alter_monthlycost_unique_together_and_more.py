@@ -0,0 +1,75 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('agency', '0011_alter_monthlycost_unique_together_and_more'),
+    ]
+
+    dependencies = [
+        ('agency', '0010_add_is_project_manager'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='monthlycost',
+            unique_together=None,
+        ),
+        # SQLite rebuilds the table without the column, so the index on it has
+        # to go first. Databases that already applied 0011 skip this migration.
+        migrations.RemoveIndex(
+            model_name='monthlycost',
+            name='agency_mont_company_2ac7f7_idx',
+        ),
+        migrations.RemoveField(
+            model_name='monthlycost',
+            name='company',
+        ),
+        migrations.RemoveField(
+            model_name='monthlycost',
+            name='project',
+        ),
+        migrations.RemoveField(
+            model_name='recurringcost',
+            name='company',
+        ),
+        migrations.RemoveIndex(
+            model_name='contractorexpense',
+            name='agency_cont_company_dfe127_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='cost',
+            new_name='agency_cost_company_d15a4a_idx',
+            old_name='agency_cost_company_start_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='cost',
+            new_name='agency_cost_cost_ty_ef4917_idx',
+            old_name='agency_cost_type_contractor_idx',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='billable_rate',
+        ),
+        migrations.RemoveField(
+            model_name='project',
+            name='calculated_hours',
+        ),
+        migrations.RemoveField(
+            model_name='projectallocation',
+            name='billable_rate_override',
+        ),
+        migrations.RemoveField(
+            model_name='projectallocation',
+            name='notes',
+        ),
+        migrations.DeleteModel(
+            name='MonthlyCost',
+        ),
+        migrations.DeleteModel(
+            name='RecurringCost',
+        ),
+    ]
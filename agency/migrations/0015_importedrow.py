@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:23
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0014_alter_projectallocation_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRow',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sheet', models.CharField(max_length=20)),
+                ('row_key', models.CharField(help_text='Client or team member name from the source row', max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imported_rows', to='agency.company')),
+            ],
+            options={
+                'unique_together': {('company', 'sheet', 'row_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:33
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0015_importedrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source_digest', models.CharField(help_text='SHA-256 of the source file and batch size', max_length=64)),
+                ('sheet', models.CharField(max_length=20)),
+                ('chunk_index', models.IntegerField()),
+                ('status', models.CharField(choices=[('done', 'Done'), ('failed', 'Failed')], max_length=10)),
+                ('rows', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_checkpoints', to='agency.company')),
+            ],
+            options={
+                'ordering': ['sheet', 'chunk_index'],
+                'unique_together': {('company', 'source_digest', 'sheet', 'chunk_index')},
+            },
+        ),
+    ]
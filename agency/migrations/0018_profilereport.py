@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0017_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileReport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.TextField(help_text='Path and query string')),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('status_code', models.IntegerField()),
+                ('total_ms', models.FloatField()),
+                ('query_count', models.IntegerField()),
+                ('functions', models.JSONField(default=list, help_text='Top functions by cumulative time')),
+                ('sql', models.JSONField(default=list, help_text='Queries grouped by calling line')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
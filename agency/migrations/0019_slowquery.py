@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:01
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0018_profilereport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('fingerprint', models.CharField(db_index=True, help_text='Same statement, any parameters', max_length=40)),
+                ('duration_ms', models.FloatField()),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('call_site', models.CharField(blank=True, max_length=300)),
+                ('plan', models.TextField(blank=True)),
+                ('analyzed', models.BooleanField(default=False, help_text='Plan is from EXPLAIN ANALYZE')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Slow queries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0019_slowquery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['company', 'status'], name='agency_clie_company_f31e7a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cost',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['company', 'start_date', 'end_date'], name='agency_cost_active_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['company', 'end_date', 'start_date'], name='agency_proj_company_d8bb66_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['company', 'revenue_type', 'end_date', 'start_date'], name='agency_proj_company_ef737f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['company', 'status', 'start_date', 'end_date'], name='agency_user_company_fc697c_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:26
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0020_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectallocation',
+            name='value',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('allocated_hours'), '*', models.F('hourly_rate')), output_field=models.DecimalField(decimal_places=3, max_digits=14)),
+        ),
+    ]
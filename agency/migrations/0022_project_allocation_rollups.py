@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:28
+
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def fill_rollups(apps, schema_editor):
+    # A frozen copy of agency.rollups.refresh_project_rollups for the existing rows
+    Project = apps.get_model('agency', 'Project')
+    ProjectAllocation = apps.get_model('agency', 'ProjectAllocation')
+    period = F('year') * 12 + F('month') - 1
+    rows = ProjectAllocation.objects.values('project_id').annotate(
+        hours=Sum('allocated_hours'),
+        total_value=Sum('value'),
+        members=Count('user_profile', distinct=True),
+        first=Min(period),
+        last=Max(period),
+    ).order_by()
+    projects = [
+        Project(
+            pk=row['project_id'],
+            allocated_hours=row['hours'],
+            allocated_value=row['total_value'],
+            team_size=row['members'],
+            first_allocated_month=date(row['first'] // 12, row['first'] % 12 + 1, 1),
+            last_allocated_month=date(row['last'] // 12, row['last'] % 12 + 1, 1),
+        )
+        for row in rows
+    ]
+    Project.objects.bulk_update(projects, [
+        'allocated_hours', 'allocated_value', 'team_size', 'first_allocated_month', 'last_allocated_month',
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0021_allocation_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='allocated_hours',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='allocated_value',
+            field=models.DecimalField(decimal_places=3, default=0, editable=False, max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='first_allocated_month',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='last_allocated_month',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='team_size',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Members with allocations'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
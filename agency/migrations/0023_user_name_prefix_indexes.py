@@ -0,0 +1,22 @@
+# Expression indexes on auth_user for the user switcher's prefix search (views.user_search).
+# auth_user belongs to django.contrib.auth, so they are created with plain SQL.
+
+from django.db import migrations
+
+COLUMNS = ['first_name', 'last_name', 'username']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0022_project_allocation_rollups'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX agency_user_{column}_lower ON auth_user (LOWER({column}))',
+            f'DROP INDEX agency_user_{column}_lower',
+        )
+        for column in COLUMNS
+    ]
@@ -1,10 +1,32 @@
 # agency/models.py - Migration-safe version
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 import uuid
 
+from .fragments import bump_data_version
+
+
+def _clear_company_cache():
+    # agency.tenancy imports this module, so it is imported here
+    from .tenancy import clear_cache
+    clear_cache()
+
+
+class CompanyDataMixin:
+    """Saves and deletes give the company's data a new version - see agency.fragments"""
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_data_version(self.company_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_data_version(self.company_id)
+        return result
+
 class Company(models.Model):
     """Company entity - supports multi-company setup"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -17,8 +39,18 @@ class Company(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.code})"
+    
+    # Requests find their company through agency.tenancy's per-worker cache
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _clear_company_cache()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        _clear_company_cache()
+        return result
 
-class UserProfile(models.Model):
+class UserProfile(CompanyDataMixin, models.Model):
     """Extended profile for users"""
     ROLE_CHOICES = [
         ('account', 'Account Management'),
@@ -48,10 +80,25 @@ class UserProfile(models.Model):
     utilization_target = models.DecimalField(max_digits=4, decimal_places=1, default=80)
     is_project_manager = models.BooleanField(default=False, help_text="Can manage projects and see PM dashboard")
     
+    class Meta:
+        indexes = [
+            # Team members employed in a month (payroll and capacity)
+            models.Index(fields=['company', 'status', 'start_date', 'end_date']),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.role})"
     
+    # A profile's company decides the company of its user's requests
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        _clear_company_cache()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        _clear_company_cache()
+        return result
+    
     @property
     def monthly_capacity_hours(self):
         return (self.weekly_capacity_hours * Decimal('4.33'))
@@ -62,7 +109,7 @@ class UserProfile(models.Model):
             return self.annual_salary / 12
         return self.hourly_rate * self.weekly_capacity_hours * Decimal('4.33')
 
-class Client(models.Model):
+class Client(CompanyDataMixin, models.Model):
     """Client organizations"""
     STATUS_CHOICES = [
         ('active', 'Active'),
@@ -79,10 +126,15 @@ class Client(models.Model):
                                       related_name='managed_clients')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'status']),
+        ]
+    
     def __str__(self):
         return self.name
 
-class Project(models.Model):
+class Project(CompanyDataMixin, models.Model):
     """Projects for clients"""
     STATUS_CHOICES = [
         ('planning', 'Planning'),
@@ -120,6 +172,15 @@ class Project(models.Model):
     project_manager = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
                                       related_name='managed_projects')
     
+    # Rollup of the project's allocations, kept current by the allocation
+    # write paths - see agency.rollups
+    ROLLUP_FIELDS = ['allocated_hours', 'allocated_value', 'team_size', 'first_allocated_month', 'last_allocated_month']
+    allocated_hours = models.DecimalField(max_digits=10, decimal_places=1, default=0, editable=False)
+    allocated_value = models.DecimalField(max_digits=16, decimal_places=3, default=0, editable=False)
+    team_size = models.PositiveIntegerField(default=0, editable=False, help_text="Members with allocations")
+    first_allocated_month = models.DateField(null=True, blank=True, editable=False)
+    last_allocated_month = models.DateField(null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -130,8 +191,36 @@ class Project(models.Model):
         help_text='Team members assigned to this project'
     )
 
+    class Meta:
+        indexes = [
+            # Projects running in a period. end_date leads the range: the dashboards
+            # ask about recent periods, which few projects end after
+            models.Index(fields=['company', 'end_date', 'start_date']),
+            models.Index(fields=['company', 'revenue_type', 'end_date', 'start_date']),
+        ]
+
     def __str__(self):
         return f"{self.client.name} - {self.name}"
+    
+    # Only agency.rollups writes the rollups, so a save from an instance loaded
+    # before an allocation changed does not put their old values back
+    def save(self, *args, **kwargs):
+        # A copy saved to another database may need inserting there, so it is left alone
+        ordinary = not (self._state.adding or args or kwargs.get('force_insert'))
+        if ordinary and kwargs.get('update_fields') is None and kwargs.get('using') in (None, self._state.db):
+            skipped = set(self.ROLLUP_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+    
+    @property
+    def allocation_percentage(self):
+        """Allocated hours as a percentage of total_hours, None when there is no total"""
+        if not self.total_hours:
+            return None
+        return float(self.allocated_hours) / float(self.total_hours) * 100
 
 class ProjectAllocation(models.Model):
     """Monthly allocation of users to projects"""
@@ -144,6 +233,12 @@ class ProjectAllocation(models.Model):
     allocated_hours = models.DecimalField(max_digits=6, decimal_places=1, 
                                         validators=[MinValueValidator(Decimal('0.1'))])
     hourly_rate = models.DecimalField(max_digits=8, decimal_places=2)
+    # Computed and stored by the database, so value totals aggregate in SQL
+    value = models.GeneratedField(
+        expression=models.F('allocated_hours') * models.F('hourly_rate'),
+        output_field=models.DecimalField(max_digits=14, decimal_places=3),
+        db_persist=True,
+    )
     
     class Meta:
         unique_together = ['project', 'user_profile', 'year', 'month']
@@ -158,9 +253,10 @@ class ProjectAllocation(models.Model):
     
     @property
     def total_revenue(self):
+        # value is only read back from the database, so unsaved rows compute it here
         return self.allocated_hours * self.hourly_rate
 
-class MonthlyRevenue(models.Model):
+class MonthlyRevenue(CompanyDataMixin, models.Model):
     """Monthly revenue tracking"""
     REVENUE_TYPE_CHOICES = [
         ('booked', 'Booked'),
@@ -189,7 +285,7 @@ class MonthlyRevenue(models.Model):
         project_name = self.project.name if self.project else "General"
         return f"{self.client.name} - {project_name} ({self.year}/{self.month:02d}) - ${self.revenue}"
 
-class Cost(models.Model):
+class Cost(CompanyDataMixin, models.Model):
     """Unified cost model - NEW"""
     COST_TYPE_CHOICES = [
         ('contractor', 'Contractor'),
@@ -238,6 +334,9 @@ class Cost(models.Model):
         indexes = [
             models.Index(fields=['company', 'start_date']),
             models.Index(fields=['cost_type', 'is_contractor']),
+            # Costs active in a month; the reports never read inactive ones
+            models.Index(fields=['company', 'start_date', 'end_date'], condition=models.Q(is_active=True),
+                         name='agency_cost_active_dates_idx'),
         ]
     
     def __str__(self):
@@ -276,8 +375,136 @@ class CapacitySnapshot(models.Model):
     def __str__(self):
         return f"{self.company.name} Capacity ({self.year}/{self.month:02d}) - {self.utilization_rate}%"
 
+class ImportedRow(models.Model):
+    """Content hash of a source row from the last spreadsheet import"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='imported_rows')
+    sheet = models.CharField(max_length=20)
+    row_key = models.CharField(max_length=255, help_text="Client or team member name from the source row")
+    content_hash = models.CharField(max_length=64)
+    imported_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['company', 'sheet', 'row_key']
+    
+    def __str__(self):
+        return f"{self.sheet}: {self.row_key}"
+
+class ImportCheckpoint(models.Model):
+    """Outcome of one chunk of a parallel import, so failed chunks can be resumed"""
+    STATUS_CHOICES = [
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='import_checkpoints')
+    source_digest = models.CharField(max_length=64, help_text="SHA-256 of the source file and batch size")
+    sheet = models.CharField(max_length=20)
+    chunk_index = models.IntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    rows = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['company', 'source_digest', 'sheet', 'chunk_index']
+        ordering = ['sheet', 'chunk_index']
+
+    def __str__(self):
+        return f"{self.sheet} chunk {self.chunk_index}: {self.status}"
+
+class ImportJob(models.Model):
+    """Uploaded spreadsheet waiting for, or processed by, the run_import_jobs worker"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='import_jobs')
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    file = models.FileField(upload_to='imports/%Y/%m/')
+    original_name = models.CharField(max_length=255)
+    sheet = models.CharField(max_length=20, blank=True, help_text="Sheet layout of a CSV or Parquet file")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    rows_processed = models.IntegerField(default=0)
+    counts = models.JSONField(default=dict, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.original_name} ({self.get_status_display()})"
+
+    @property
+    def rows_per_second(self):
+        """Import throughput since the job started"""
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0
+
+class ProfileReport(models.Model):
+    """Profile of one staff request run with ?_profile=1 (see ProfilingMiddleware)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.TextField(help_text="Path and query string")
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.IntegerField()
+    total_ms = models.FloatField()
+    query_count = models.IntegerField()
+    functions = models.JSONField(default=list, help_text="Top functions by cumulative time")
+    sql = models.JSONField(default=list, help_text="Queries grouped by calling line")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.total_ms:.0f} ms)"
+
+class SlowQuery(models.Model):
+    """Statement that ran longer than SLOW_QUERY_MS, with its plan (see agency.querylog)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    fingerprint = models.CharField(max_length=40, db_index=True, help_text="Same statement, any parameters")
+    duration_ms = models.FloatField()
+    view_name = models.CharField(max_length=200, blank=True)
+    call_site = models.CharField(max_length=300, blank=True)
+    plan = models.TextField(blank=True)
+    analyzed = models.BooleanField(default=False, help_text="Plan is from EXPLAIN ANALYZE")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Slow queries'
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms at {self.call_site}"
+
+    @property
+    def has_full_scan(self):
+        """Plan reads a whole table (SQLite SCAN, Postgres Seq Scan)"""
+        from .querylog import FULL_SCAN
+        return any(FULL_SCAN.search(line) for line in self.plan.splitlines())
+
 # Keep legacy models for compatibility during migration
-class Expense(models.Model):
+class Expense(CompanyDataMixin, models.Model):
     """Legacy expense model"""
     CATEGORY_CHOICES = [
         ('rent', 'Rent'),
@@ -302,7 +529,7 @@ class Expense(models.Model):
     def __str__(self):
         return f"{self.name} - ${self.monthly_amount}/month"
 
-class ContractorExpense(models.Model):
+class ContractorExpense(CompanyDataMixin, models.Model):
     """Legacy contractor expense model"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=200)
@@ -0,0 +1,142 @@
+# agency/perf.py - Per-request performance figures: DB, templates, cache and view time
+import time
+from contextvars import ContextVar
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.backends.django import DjangoTemplates, Template
+
+# Figures of the request being served; None outside PerformanceMiddleware,
+# so the hooks below cost one lookup when instrumentation is off
+_current = ContextVar('agency_request_stats', default=None)
+
+_MISSING = object()
+
+
+class RequestStats:
+    """What one request spent its time on"""
+
+    __slots__ = (
+        'started', 'view_started', 'view_name', 'queries', 'db_ms',
+        'template_ms', 'cache_hits', 'cache_misses', 'view_ms', 'total_ms',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_name = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.view_ms = 0.0
+        self.total_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper: count and time every statement
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+
+    def add_queries(self, other):
+        """Count the statements other recorded for this request, e.g. on a pool thread's connection"""
+        self.queries += other.queries
+        self.db_ms += other.db_ms
+
+    def finish(self):
+        finished = time.perf_counter()
+        if self.view_started is not None:
+            self.view_ms = (finished - self.view_started) * 1000
+        self.total_ms = (finished - self.started) * 1000
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+            f'view;dur={self.view_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'template_ms': round(self.template_ms, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'view_ms': round(self.view_ms, 2),
+            'total_ms': round(self.total_ms, 2),
+        }
+
+
+def current_stats():
+    """RequestStats of the request in progress, or None"""
+    return _current.get()
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_cache(hits, misses):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds each render's time to the request's stats
+
+    Only the outermost render is timed - includes and extends happen
+    inside it.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class CacheStatsMixin:
+    """Counts cache hits and misses against the request
+
+    Hooks get(), which the base get_many(), get_or_set() and the {% cache %}
+    tag go through.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+
+class InstrumentedLocMemCache(CacheStatsMixin, LocMemCache):
+    pass
@@ -0,0 +1,104 @@
+# agency/profiling.py - Profile one request: hot functions plus SQL by calling line
+import cProfile
+import pstats
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.db import connections
+
+# Functions kept in a report, by cumulative time
+TOP_FUNCTIONS = 40
+# SQL is attributed to the innermost frame in this file, else in the app
+VIEWS_FILE = str(Path(__file__).with_name('views.py'))
+APP_DIR = str(Path(__file__).parent)
+# App modules that only instrument or drive requests - never a query's call site
+_INSTRUMENTATION = tuple(
+    str(Path(__file__).with_name(name))
+    for name in ('profiling.py', 'perf.py', 'middleware.py', 'metrics.py', 'querylog.py',
+                 'benchmarks.py', 'diagnostics.py')
+)
+
+
+def call_site():
+    """'views.py:123 in dashboard' for the code that issued the current query"""
+    app_frame = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename == VIEWS_FILE:
+            return f'views.py:{frame.f_lineno} in {frame.f_code.co_name}'
+        if app_frame is None and filename.startswith(APP_DIR) and not filename.startswith(_INSTRUMENTATION):
+            app_frame = frame
+        frame = frame.f_back
+    if app_frame is not None:
+        relative = Path(app_frame.f_code.co_filename).relative_to(APP_DIR)
+        return f'{relative}:{app_frame.f_lineno} in {app_frame.f_code.co_name}'
+    return 'django'
+
+
+class SqlByCallSite:
+    """Execute wrapper grouping queries by the line of app code that ran them"""
+
+    def __init__(self):
+        self.sites = defaultdict(lambda: {'count': 0, 'time_ms': 0.0, 'sql': ''})
+
+    def __call__(self, execute, sql, params, many, context):
+        site = self.sites[call_site()]
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            site['time_ms'] += (time.perf_counter() - started) * 1000
+            site['count'] += 1
+            site['sql'] = site['sql'] or sql
+
+    def as_list(self):
+        """Sites with their query count, time and first statement, slowest first"""
+        return sorted(
+            ({'site': site, **data, 'time_ms': round(data['time_ms'], 2)} for site, data in self.sites.items()),
+            key=lambda data: data['time_ms'],
+            reverse=True,
+        )
+
+
+def profile(call):
+    """Run call() under cProfile; returns its result and the report fields
+
+    The report has the top functions by cumulative time and the SQL of
+    every call site - see ProfileReport.
+    """
+    profiler = cProfile.Profile()
+    sql = SqlByCallSite()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sql))
+        profiler.enable()
+        try:
+            result = call()
+        finally:
+            profiler.disable()
+    total_ms = (time.perf_counter() - started) * 1000
+
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in sorted(
+        stats.stats.items(), key=lambda item: item[1][3], reverse=True
+    )[:TOP_FUNCTIONS]:
+        functions.append({
+            'function': f'{filename}:{line}({name})' if line else name,
+            'calls': calls,
+            'own_ms': round(own * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2),
+        })
+
+    sites = sql.as_list()
+    return result, {
+        'total_ms': round(total_ms, 2),
+        'query_count': sum(site['count'] for site in sites),
+        'functions': functions,
+        'sql': sites,
+    }
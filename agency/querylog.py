@@ -0,0 +1,133 @@
+# agency/querylog.py - Capture statements over a time threshold with their EXPLAIN plan
+import hashlib
+import logging
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .profiling import call_site
+
+logger = logging.getLogger('agency.perf')
+
+_current = ContextVar('agency_slow_query_log', default=None)
+
+# Plan lines that mean a whole table is read
+FULL_SCAN = re.compile(r'\bSCAN (?!.*USING (COVERING )?INDEX)|Seq Scan')
+
+
+def fingerprint(sql):
+    """Groups executions of one statement - parameters are placeholders already"""
+    return hashlib.sha1(' '.join(sql.split()).encode()).hexdigest()
+
+
+def explain(connection, sql, params, analyze=False):
+    """The plan text of a statement, with EXPLAIN ANALYZE where the backend has it"""
+    options = {'analyze': True} if analyze else {}
+    prefix = connection.ops.explain_query_prefix(**options)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+class SlowQueryLog:
+    """Execute wrapper remembering statements slower than threshold_ms
+
+    Nothing extra runs while the request executes; save() explains and
+    stores what was captured once the caller is done. view_name is read
+    when a statement is captured, so it can be a callable.
+    """
+
+    def __init__(self, threshold_ms, view_name=''):
+        self.threshold_ms = threshold_ms
+        self.view_name = view_name
+        self.captured = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.captured.append({
+                    'connection': context['connection'],
+                    'sql': sql,
+                    'params': params,
+                    'many': many,
+                    'duration_ms': duration_ms,
+                    'view_name': self.current_view_name(),
+                    'call_site': call_site(),
+                })
+
+    def current_view_name(self):
+        view_name = self.view_name() if callable(self.view_name) else self.view_name
+        return view_name or ''
+
+    def save(self):
+        """Store each captured statement with its plan; returns the SlowQuery rows"""
+        from .models import SlowQuery
+
+        analyze_allowed = getattr(settings, 'SLOW_QUERY_ANALYZE', False)
+        saved = []
+        captured, self.captured = self.captured, []
+        for query in captured:
+            connection, sql = query['connection'], query['sql']
+            # ANALYZE executes the statement again - only ever for reads, and only on Postgres
+            analyze = (analyze_allowed and connection.vendor == 'postgresql'
+                       and sql.lstrip().upper().startswith('SELECT'))
+            plan = ''
+            if not query['many']:
+                try:
+                    plan = explain(connection, sql, query['params'], analyze)
+                except Exception as e:
+                    plan = f'EXPLAIN failed: {e}'
+            saved.append(SlowQuery.objects.create(
+                sql=sql,
+                params=repr(query['params'])[:2000],
+                fingerprint=fingerprint(sql),
+                duration_ms=round(query['duration_ms'], 2),
+                view_name=query['view_name'][:200],
+                call_site=query['call_site'][:300],
+                plan=plan,
+                analyzed=analyze and not plan.startswith('EXPLAIN failed'),
+            ))
+            logger.warning('Slow query (%.0f ms) at %s: %s', query['duration_ms'], query['call_site'], sql[:200])
+        return saved
+
+
+def threshold_ms():
+    """SLOW_QUERY_MS, or None when capture is off"""
+    return getattr(settings, 'SLOW_QUERY_MS', None)
+
+
+def current_log():
+    """SlowQueryLog of the request in progress, or None"""
+    return _current.get()
+
+
+def start_request(log):
+    return _current.set(log)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def capture_slow_queries(view_name=''):
+    """Capture and store slow statements run inside the block, e.g. in a management command"""
+    if threshold_ms() is None:
+        yield None
+        return
+    log = SlowQueryLog(threshold_ms(), view_name)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            yield log
+    finally:
+        log.save()
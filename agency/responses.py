@@ -0,0 +1,76 @@
+# agency/responses.py - JSON responses for the agency APIs and the admin allocation grid
+import json
+import re
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+# Optional: several times faster than the json module, and serializes NumPy arrays itself
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def _default(obj):
+    # Decimals go out as JSON numbers, as the views' float() conversions did
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if numpy is not None and isinstance(obj, (numpy.ndarray, numpy.generic)):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class _Encoder(json.JSONEncoder):
+    """Without orjson: the types orjson handles natively, then _default()"""
+
+    def default(self, obj):
+        if isinstance(obj, (datetime, date, time)):
+            return obj.isoformat()
+        if isinstance(obj, UUID):
+            return str(obj)
+        return _default(obj)
+
+
+def dumps(data):
+    """data as UTF-8 JSON bytes; Decimal, date, datetime, UUID and NumPy values included"""
+    if orjson is not None:
+        # NON_STR_KEYS: integer keys become strings, as with the json module
+        return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=_Encoder, separators=(',', ':')).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse serialized with dumps(), gzipped when large
+
+    Given the request, a body of JSON_GZIP_MIN_BYTES or more is sent
+    gzip-encoded to clients that accept it. Smaller bodies are not worth
+    the CPU time.
+    """
+
+    def __init__(self, data, request=None, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+        if request is not None:
+            self.compress(request)
+
+    def compress(self, request):
+        if len(self.content) < getattr(settings, 'JSON_GZIP_MIN_BYTES', 8192):
+            return
+        patch_vary_headers(self, ('Accept-Encoding',))
+        if not ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+            return
+        self.content = compress_string(self.content)
+        self['Content-Encoding'] = 'gzip'
@@ -0,0 +1,83 @@
+# agency/rollups.py - Allocation totals stored on Project, so listings need no aggregate queries
+from datetime import date
+from itertools import islice
+
+from django.db.models import Count, F, Max, Min, Sum
+
+from .models import Project, ProjectAllocation
+
+ROLLUP_FIELDS = Project.ROLLUP_FIELDS
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _month(period):
+    """First day of a month numbered year * 12 + month - 1"""
+    return date(period // 12, period % 12 + 1, 1) if period is not None else None
+
+
+def compute_rollups(project_ids):
+    """Rollup field values of each project, from its allocations in one grouped query"""
+    period = F('year') * 12 + F('month') - 1
+    rows = ProjectAllocation.objects.filter(project_id__in=project_ids).values('project_id').annotate(
+        hours=Sum('allocated_hours'),
+        total_value=Sum('value'),
+        members=Count('user_profile', distinct=True),
+        first=Min(period),
+        last=Max(period),
+    ).order_by()
+    rollups = {pk: dict(zip(ROLLUP_FIELDS, (0, 0, 0, None, None))) for pk in project_ids}
+    for row in rows:
+        rollups[row['project_id']] = dict(zip(ROLLUP_FIELDS, (
+            row['hours'], row['total_value'], row['members'], _month(row['first']), _month(row['last'])
+        )))
+    return rollups
+
+
+def _all_project_ids(batch_size):
+    """Every project key, a page at a time - the loop below writes to the table it pages through"""
+    last = None
+    while True:
+        page = Project.objects.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        ids = list(page.values_list('pk', flat=True)[:batch_size])
+        yield from ids
+        if len(ids) < batch_size:
+            return
+        last = ids[-1]
+
+
+def refresh_project_rollups(project_ids=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Recompute the rollup fields of project_ids, or of every project when None
+
+    Only projects whose stored values are out of date are written; returns
+    how many there were. Code that writes ProjectAllocation rows calls this
+    for the projects it touched, inside the same transaction.
+    """
+    project_ids = iter(_all_project_ids(batch_size) if project_ids is None else project_ids)
+    stale = 0
+    to_python = Project._meta.pk.to_python
+    while batch := [to_python(pk) for pk in islice(project_ids, batch_size)]:
+        rollups = compute_rollups(batch)
+        changed = [
+            Project(pk=pk, **rollups[pk])
+            for pk, *stored in Project.objects.filter(pk__in=batch).values_list('pk', *ROLLUP_FIELDS)
+            if stored != list(rollups[pk].values())
+        ]
+        if changed and not dry_run:
+            Project.objects.bulk_update(changed, ROLLUP_FIELDS)
+        stale += len(changed)
+    return stale
+
+
+# Deleting a profile - also through its user - deletes its allocations without
+# the allocation write paths knowing. Connected in AgencyConfig.ready().
+
+def remember_profile_projects(sender, instance, **kwargs):
+    """pre_delete of UserProfile: note the projects the profile is allocated to"""
+    instance._allocated_project_ids = set(instance.project_allocations.values_list('project_id', flat=True))
+
+
+def refresh_profile_projects(sender, instance, **kwargs):
+    """post_delete of UserProfile: its allocations are gone, so refresh those projects"""
+    refresh_project_rollups(getattr(instance, '_allocated_project_ids', ()))
@@ -0,0 +1,71 @@
+# agency/routers.py - Sends the reads of the analytic views to a read replica
+import contextvars
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Session key: until this timestamp the session reads from the primary
+PIN_KEY = 'replica_pinned_until'
+
+
+class RequestRouting:
+    """What ReplicaMiddleware decided for the current request"""
+
+    def __init__(self):
+        self.use_replica = False
+        # Set by the first write; from then on the request reads from the primary too
+        self.wrote = False
+
+
+_routing = contextvars.ContextVar('agency_replica_routing', default=None)
+
+
+def replica_alias():
+    """The alias of the replica, or None when reads all go to the primary"""
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+def start_request():
+    """Route the current request's queries; returns a token for end_request()"""
+    return _routing.set(RequestRouting())
+
+
+def end_request(token):
+    _routing.reset(token)
+
+
+def current():
+    """The current request's RequestRouting, or None outside ReplicaMiddleware"""
+    return _routing.get()
+
+
+class ReplicaRouter:
+    """Reads of the REPLICA_VIEWS go to REPLICA_DATABASE; writes and all other reads to the primary
+
+    The middleware marks which requests may use the replica; queries
+    outside a request (commands, the import worker) always use the
+    primary. Without REPLICA_DATABASE the router leaves every decision
+    to Django.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current()
+        if routing is not None and routing.use_replica and not routing.wrote:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if replica_alias() is None:
+            return None
+        routing = current()
+        if routing is not None:
+            routing.wrote = True
+        # Explicitly, or rows read from the replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
@@ -0,0 +1,56 @@
+# agency/sqlite.py - Opt-in SQLite tuning for single-node deployments (SQLITE_PERFORMANCE_MODE)
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+
+def performance_options(mmap_size=256 * 1024 * 1024, cache_kib=64 * 1024, busy_timeout_ms=20000):
+    """DATABASES OPTIONS that tune every new connection to a SQLite file
+
+    WAL lets requests keep reading while another connection writes, and
+    synchronous=NORMAL then only syncs the disk at checkpoints: a power
+    cut can lose the last commits, a crashed process cannot. mmap_size
+    and cache_size (in KiB when negative) keep hot pages in memory, and
+    busy_timeout makes a connection wait that long for a lock before
+    failing with "database is locked".
+    """
+    return {
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            f'PRAGMA mmap_size={mmap_size}',
+            f'PRAGMA cache_size=-{cache_kib}',
+            f'PRAGMA busy_timeout={busy_timeout_ms}',
+        ]),
+    }
+
+
+@contextmanager
+def write_transaction(using=None):
+    """transaction.atomic() for paths that write, taking SQLite's write lock as it begins
+
+    A deferred SQLite transaction that reads before it writes cannot wait
+    for a concurrent writer - upgrading its lock fails at once, busy
+    timeout or not. BEGIN IMMEDIATE queues for the write lock up front
+    instead. Only in SQLITE_PERFORMANCE_MODE; on other databases, and
+    nested in another atomic block, this is plain atomic().
+    """
+    connection = transaction.get_connection(using)
+    immediate = (
+        getattr(settings, 'SQLITE_PERFORMANCE_MODE', False)
+        and connection.vendor == 'sqlite'
+        and not connection.in_atomic_block
+    )
+    with ExitStack() as stack:
+        if immediate:
+            # transaction_mode is read from the settings on connect
+            connection.ensure_connection()
+            mode, connection.transaction_mode = connection.transaction_mode, 'IMMEDIATE'
+            try:
+                stack.enter_context(transaction.atomic(using=using))
+            finally:
+                connection.transaction_mode = mode
+        else:
+            stack.enter_context(transaction.atomic(using=using))
+        yield
@@ -0,0 +1,407 @@
+# agency/synthetic.py - Seeded synthetic data for load testing and benchmarks
+import calendar
+import random
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+from . import tenancy
+from .models import Company, UserProfile, Client, Project, ProjectAllocation, MonthlyRevenue, Cost
+
+# Size presets; allocation rows grow with projects x months x team size
+SCALES = {
+    'small': {'companies': 1, 'clients': 20, 'projects_per_client': 3, 'profiles': 25},
+    'medium': {'companies': 2, 'clients': 500, 'projects_per_client': 4, 'profiles': 200},
+    'large': {'companies': 3, 'clients': 2000, 'projects_per_client': 5, 'profiles': 500},
+}
+
+# Generated companies and users are recognised by these prefixes, e.g. by --clear
+COMPANY_CODE_PREFIX = 'SYN'
+USERNAME_PREFIX = 'synthetic.'
+
+DEFAULT_BATCH_SIZE = 5000
+# Projects planned, inserted and allocated together - bounds memory use
+PROJECT_CHUNK = 500
+# SQLite page cache used while loading, in KiB
+SQLITE_LOAD_CACHE_KB = 256 * 1024
+
+FIRST_NAMES = ['Ava', 'Ben', 'Chloe', 'Dev', 'Elena', 'Finn', 'Grace', 'Hiro', 'Isla', 'Jon',
+               'Kara', 'Liam', 'Maya', 'Noah', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tara']
+LAST_NAMES = ['Adams', 'Brooks', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito',
+              'Jensen', 'Khan', 'Lopez', 'Miller', 'Novak', 'Okafor', 'Patel', 'Reyes', 'Smith']
+CLIENT_WORDS = ['Acme', 'Summit', 'Blue', 'Harbor', 'Nova', 'Pioneer', 'Crest', 'Atlas', 'Vertex',
+                'Maple', 'Orbit', 'Silver', 'Union', 'Beacon', 'Cedar', 'Delta']
+CLIENT_SUFFIXES = ['Corp', 'Labs', 'Group', 'Foods', 'Health', 'Media', 'Partners', 'Retail']
+PROJECT_KINDS = ['Website Redesign', 'Brand Campaign', 'Mobile App', 'SEO Retainer', 'Media Buy',
+                 'Analytics Setup', 'Content Strategy', 'Product Launch']
+OPERATING_COSTS = [
+    ('Office Rent', 'rent', 15000),
+    ('Software Licenses', 'software', 5000),
+    ('Insurance', 'insurance', 3000),
+    ('Marketing', 'marketing', 8000),
+    ('Professional Services', 'professional', 4000),
+    ('Utilities', 'utilities', 2000),
+    ('Equipment', 'office', 3000),
+]
+
+HOURS = [Decimal(hours) for hours in range(10, 85, 5)]
+RATES = [Decimal(rate) for rate in range(40, 205, 5)]
+CENTS = Decimal('0.01')
+
+
+# Version 4 / RFC 4122 variant bits, as uuid.UUID(int=..., version=4) sets them
+_UUID4_CLEAR = ~((0xf000 << 64) | (0xc000 << 48))
+_UUID4_SET = (0x4000 << 64) | (0x8000 << 48)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class SyntheticDataGenerator:
+    """Generates companies with clients, projects, team, allocations, revenue and costs
+
+    The same seed always produces the same rows (primary keys included).
+    Users and profiles, which need their auto-increment keys back, go
+    through bulk_create. Every other table is written with batched
+    executemany INSERTs of values already in database form - the
+    allocation and revenue rows that make up nearly all of the data are
+    built that way directly, skipping the per-instance SQL compilation of
+    bulk_create. Secondary indexes of those two tables are dropped for the
+    load and rebuilt once at the end.
+    """
+
+    # Tables whose secondary indexes are rebuilt after the load
+    DEFERRED_INDEX_MODELS = (ProjectAllocation, MonthlyRevenue)
+
+    def __init__(self, seed=42, companies=1, clients=20, projects_per_client=3, profiles=25,
+                 years=(2023, 2024, 2025), batch_size=DEFAULT_BATCH_SIZE, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.companies = companies
+        self.clients = clients
+        self.projects_per_client = projects_per_client
+        self.profiles = profiles
+        self.years = sorted(years)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        # Fixed "today" so project statuses do not depend on when the data was made
+        self.reference_date = date(self.years[-1], 7, 1)
+        self.counts = Counter()
+        self.elapsed = 0.0
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        self.native_uuid = self.connection.features.has_native_uuid_field
+        self._db_values = {}
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128) & _UUID4_CLEAR | _UUID4_SET)
+
+    def db_uuid(self):
+        """Next UUID in the form the database stores - same sequence as uuid()"""
+        bits = self.rng.getrandbits(128) & _UUID4_CLEAR | _UUID4_SET
+        return uuid.UUID(int=bits) if self.native_uuid else f'{bits:032x}'
+
+    def db_value(self, field, value):
+        """field's database value for a repeated value (key, rate, hours), converted once"""
+        cache = self._db_values.setdefault(field, {})
+        if value not in cache:
+            cache[value] = field.get_db_prep_save(value, self.connection)
+        return cache[value]
+
+    def generate(self):
+        """Create every company; returns a Counter of rows written per model"""
+        codes = [f'{COMPANY_CODE_PREFIX}{index:03d}' for index in range(self.companies)]
+        existing = Company.objects.filter(code__in=codes).values_list('code', flat=True).first()
+        if existing:
+            raise ValueError(f'Company {existing} already exists - clear synthetic data first')
+
+        started = time.perf_counter()
+        # Schema changes are not possible inside a caller's transaction on SQLite
+        defer_indexes = not self.connection.in_atomic_block
+        if defer_indexes:
+            self.drop_indexes()
+        try:
+            # Rows reference only what was inserted before them - skip per-row FK lookups
+            with self.connection.constraint_checks_disabled(), self.load_cache():
+                for index, code in enumerate(codes):
+                    with transaction.atomic():
+                        self.generate_company(index, code)
+                    self._db_values = {}
+        finally:
+            if defer_indexes:
+                self.log('  Rebuilding indexes')
+                self.create_indexes()
+        # Companies and profiles went in without save()
+        tenancy.clear_cache()
+        self.elapsed = time.perf_counter() - started
+        return self.counts
+
+    @contextmanager
+    def load_cache(self):
+        """Give SQLite a large page cache for the load - random UUID keys touch pages all over the index"""
+        if self.connection.vendor != 'sqlite':
+            yield
+            return
+        with self.connection.cursor() as cursor:
+            cache_size = cursor.execute('PRAGMA cache_size').fetchone()[0]
+            cursor.execute(f'PRAGMA cache_size = {-SQLITE_LOAD_CACHE_KB}')
+        try:
+            yield
+        finally:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = {cache_size}')
+
+    def drop_indexes(self):
+        """Drop the non-unique indexes of the bulk-loaded tables, remembering them for create_indexes()"""
+        self.deferred_indexes = []
+        with self.connection.cursor() as cursor:
+            for model in self.DEFERRED_INDEX_MODELS:
+                field_names = {field.column: field.name for field in model._meta.concrete_fields}
+                constraints = self.connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for name, info in constraints.items():
+                    columns = info['columns'] or []
+                    if (info['index'] and not info['unique'] and not info['primary_key']
+                            and columns and all(column in field_names for column in columns)):
+                        index = models.Index(fields=[field_names[column] for column in columns], name=name)
+                        self.deferred_indexes.append((model, index))
+        with self.connection.schema_editor() as editor:
+            for model, index in self.deferred_indexes:
+                editor.remove_index(model, index)
+
+    def create_indexes(self):
+        with self.connection.schema_editor() as editor:
+            for model, index in self.deferred_indexes:
+                editor.add_index(model, index)
+
+    @property
+    def rows_per_second(self):
+        return int(sum(self.counts.values()) / self.elapsed) if self.elapsed else 0
+
+    def generate_company(self, index, code):
+        company = Company(id=self.uuid(), code=code, name=f'Synthetic Agency {index + 1}')
+        self.insert_objects(Company, [company])
+        profiles = self.generate_profiles(company, index)
+        clients = self.generate_clients(company)
+        self.generate_costs(company)
+
+        managers = [profile.user for profile in profiles if profile.is_project_manager] or [None]
+        hours_field = ProjectAllocation._meta.get_field('allocated_hours')
+        self.hour_values = [(hours, self.db_value(hours_field, hours)) for hours in HOURS]
+        projects = (
+            self.make_project(company, client, number, profiles, managers)
+            for client in clients
+            for number in range(self.projects_per_client)
+        )
+        for chunk in _batches(projects, PROJECT_CHUNK):
+            self.insert_chunk(company, chunk)
+
+    def insert_chunk(self, company, chunk):
+        self.insert_objects(Project, [project for project, _, _ in chunk])
+        self.insert_rows(
+            ProjectAllocation,
+            ['id', 'project', 'user_profile', 'year', 'month', 'allocated_hours', 'hourly_rate'],
+            (row for _, allocations, _ in chunk for row in allocations),
+        )
+        self.insert_rows(
+            MonthlyRevenue,
+            ['id', 'client', 'project', 'company', 'year', 'month', 'revenue', 'revenue_type'],
+            (row for _, _, revenue in chunk for row in revenue),
+        )
+        self.log(f'  {company.code}: {self.counts["Project"]} projects, '
+                 f'{self.counts["ProjectAllocation"]} allocations')
+
+    def generate_profiles(self, company, company_index):
+        rng = self.rng
+        users = []
+        for number in range(self.profiles):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            username = f'{USERNAME_PREFIX}{company_index}.{first_name}.{last_name}.{number}'.lower()
+            users.append(User(
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                email=f'{username}@example.com',
+                password=f'!{rng.getrandbits(160):040x}',  # Unusable password, no hashing cost
+            ))
+        self.bulk_create(User, users)
+
+        roles = [role for role, _ in UserProfile.ROLE_CHOICES]
+        profiles = []
+        for user in users:
+            hourly_rate = rng.choice(RATES)
+            profiles.append(UserProfile(
+                user=user,
+                company=company,
+                role=rng.choice(roles),
+                hourly_rate=hourly_rate,
+                annual_salary=(hourly_rate * 2080 * Decimal('0.6')).quantize(CENTS),
+                status=rng.choices(['full_time', 'part_time', 'contractor'], weights=[8, 1, 1])[0],
+                start_date=date(self.years[0], rng.randint(1, 12), 1),
+                weekly_capacity_hours=Decimal('40'),
+                utilization_target=Decimal('80'),
+                is_project_manager=rng.random() < 0.1,
+            ))
+        self.bulk_create(UserProfile, profiles)
+        return profiles
+
+    def generate_clients(self, company):
+        rng = self.rng
+        clients = [
+            Client(
+                id=self.uuid(),
+                name=f'{rng.choice(CLIENT_WORDS)} {rng.choice(CLIENT_SUFFIXES)} {number + 1}',
+                company=company,
+                status=rng.choices(['active', 'inactive', 'prospect', 'churned'], weights=[7, 1, 1, 1])[0],
+            )
+            for number in range(self.clients)
+        ]
+        self.insert_objects(Client, clients)
+        return clients
+
+    def generate_costs(self, company):
+        costs = []
+        for year in self.years:
+            growth = Decimal(100 + (year - self.years[0]) * 5) / 100
+            for name, cost_type, amount in OPERATING_COSTS:
+                costs.append(Cost(
+                    id=self.uuid(),
+                    company=company,
+                    name=name,
+                    cost_type=cost_type,
+                    amount=(amount * growth).quantize(CENTS),
+                    frequency='monthly',
+                    start_date=date(year, 1, 1),
+                    end_date=date(year, 12, 31),
+                ))
+            for quarter in range(4):
+                costs.append(Cost(
+                    id=self.uuid(),
+                    company=company,
+                    name=f'Contractor Q{quarter + 1} {year}',
+                    cost_type='contractor',
+                    amount=Decimal(self.rng.randrange(5000, 40000, 500)),
+                    frequency='one_time',
+                    start_date=date(year, quarter * 3 + 1, 1),
+                    is_contractor=True,
+                ))
+        self.insert_objects(Cost, costs)
+
+    def make_project(self, company, client, number, profiles, managers):
+        """Build an unsaved project plus its allocation and revenue rows in database form"""
+        rng = self.rng
+        first_month = rng.randrange(len(self.years) * 12)
+        duration = min(rng.randint(1, 12), len(self.years) * 12 - first_month)
+        months = [(self.years[0] + (first_month + offset) // 12, (first_month + offset) % 12 + 1)
+                  for offset in range(duration)]
+        start_date = date(months[0][0], months[0][1], 1)
+        end_year, end_month = months[-1]
+        end_date = date(end_year, end_month, calendar.monthrange(end_year, end_month)[1])
+
+        if start_date > self.reference_date:
+            status = 'planning'
+        elif end_date < self.reference_date:
+            status = 'completed'
+        else:
+            status = 'active'
+
+        project = Project(
+            id=self.uuid(),
+            name=f'{rng.choice(PROJECT_KINDS)} {number + 1}',
+            client=client,
+            company=company,
+            start_date=start_date,
+            end_date=end_date,
+            project_type=rng.choice(['retainer', 'project', 'hourly']),
+            revenue_type='booked' if rng.random() < 0.7 else 'forecast',
+            status=status,
+            project_manager=rng.choice(managers),
+        )
+
+        db_value = self.db_value
+        allocation_field = ProjectAllocation._meta.get_field
+        revenue_field = MonthlyRevenue._meta.get_field
+        project_id = db_value(allocation_field('project'), project.id)
+        client_id = db_value(revenue_field('client'), client.id)
+        company_id = db_value(revenue_field('company'), company.id)
+        hour_values = self.hour_values
+        revenue_value = revenue_field('revenue').get_db_prep_save
+
+        team = [
+            (profile.hourly_rate,
+             db_value(allocation_field('user_profile'), profile.pk),
+             db_value(allocation_field('hourly_rate'), profile.hourly_rate))
+            for profile in rng.sample(profiles, min(len(profiles), rng.randint(2, 6)))
+        ]
+        markup = Decimal(rng.randint(100, 150)) / 100
+        allocations = []
+        revenue = []
+        total_hours = Decimal('0')
+        total_value = Decimal('0')
+        total_revenue = Decimal('0')
+        # Hot loop - one iteration per allocation row
+        choice, db_uuid, append = rng.choice, self.db_uuid, allocations.append
+        for year, month in months:
+            month_value = Decimal('0')
+            for rate, profile_id, db_rate in team:
+                hours, db_hours = choice(hour_values)
+                append((db_uuid(), project_id, profile_id, year, month, db_hours, db_rate))
+                total_hours += hours
+                month_value += hours * rate
+            total_value += month_value
+            month_revenue = (month_value * markup).quantize(CENTS)
+            revenue.append((db_uuid(), client_id, project_id, company_id, year, month,
+                            revenue_value(month_revenue, self.connection), project.revenue_type))
+            total_revenue += month_revenue
+
+        project.total_hours = total_hours
+        project.total_revenue = total_revenue
+        # The rows go in raw, so the rollups are set here rather than refreshed
+        project.allocated_hours = total_hours
+        project.allocated_value = total_value
+        project.team_size = len(team)
+        project.first_allocated_month = start_date
+        project.last_allocated_month = date(end_year, end_month, 1)
+        return project, allocations, revenue
+
+    def bulk_create(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.counts[model.__name__] += len(objs)
+
+    def insert_objects(self, model, objs):
+        """Insert unsaved instances with explicit primary keys, converting fields like save() does"""
+        fields = model._meta.concrete_fields
+        # Foreign keys repeat across rows - convert each one once
+        converters = [
+            (lambda value, field=field: self.db_value(field, value)) if field.is_relation
+            else (lambda value, field=field: field.get_db_prep_save(value, self.connection))
+            for field in fields
+        ]
+        self.insert_rows(model, [field.name for field in fields], (
+            [convert(field.pre_save(obj, True)) for field, convert in zip(fields, converters)]
+            for obj in objs
+        ))
+
+    def insert_rows(self, model, field_names, rows):
+        """INSERT rows of database values with batched executemany"""
+        qn = self.connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in field_names]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            qn(model._meta.db_table),
+            ', '.join(qn(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        written = 0
+        with self.connection.cursor() as cursor:
+            for batch in _batches(rows, self.batch_size):
+                cursor.executemany(sql, batch)
+                written += len(batch)
+        self.counts[model.__name__] += written
@@ -0,0 +1,141 @@
+# agency/tenancy.py - The company a request works in, resolved once and cached per worker
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from .models import Company, UserProfile
+
+# Session key holding the id of the user a superuser is viewing as
+VIEWING_AS_KEY = 'viewing_as_user'
+
+# Cache entries by key: ('company', pk), ('user', pk) or ('default',) -> (value, expires at).
+# Only found values are kept: a user without a profile may be given one at any time
+_cache = {}
+_lock = threading.Lock()
+
+
+def cache_seconds():
+    """How long a worker trusts its cached companies; writes in the same process clear them at once"""
+    return getattr(settings, 'COMPANY_CACHE_SECONDS', 300)
+
+
+def clear_cache():
+    """Forget every cached company - Company and UserProfile saves and deletes call this
+
+    Other worker processes keep their copy for up to COMPANY_CACHE_SECONDS.
+    Code that writes companies or profiles without save() (bulk or raw
+    inserts, queryset updates) should call this itself.
+    """
+    with _lock:
+        _cache.clear()
+
+
+def _cached(key, load):
+    """load()'s value, kept for cache_seconds() - None is not kept, so it is loaded again next time"""
+    entry = _cache.get(key)
+    now = time.monotonic()
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    value = load()
+    if value is not None:
+        with _lock:
+            _cache[key] = (value, now + cache_seconds())
+    return value
+
+
+def get_company(pk):
+    """The company with primary key pk, or None
+
+    Each call gets its own copy of the cached instance, so a request that
+    changes or annotates its company does not change another's.
+    """
+    company = _cached(('company', pk), lambda: Company.objects.filter(pk=pk).first())
+    return copy.copy(company)
+
+
+def _user_company_id(user_id):
+    def load():
+        try:
+            return UserProfile.objects.filter(user_id=user_id).values_list('company_id', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+    return _cached(('user', str(user_id)), load)
+
+
+def _default_company_id():
+    # The company the views used before tenancy: the first one
+    return _cached(('default',), lambda: Company.objects.order_by('pk').values_list('pk', flat=True).first())
+
+
+def resolve_company(request):
+    """Company of the user the request shows data for, or None
+
+    That is the user a superuser is viewing as (viewing_as_user in the
+    session), else the signed-in user. Superusers without a profile work
+    in the first company; other users without one have no company.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    company_id = None
+    if user.is_superuser and VIEWING_AS_KEY in request.session:
+        company_id = _user_company_id(request.session[VIEWING_AS_KEY])
+    if company_id is None:
+        company_id = _user_company_id(user.pk)
+    if company_id is None and user.is_superuser:
+        company_id = _default_company_id()
+    return get_company(company_id) if company_id is not None else None
+
+
+def _load_profile(user):
+    """Load user.profile with its company in one query, unless it is loaded already"""
+    related = User.profile.related
+    if related.is_cached(user):
+        return
+    profile = UserProfile.objects.select_related('company').filter(user=user).first()
+    if profile is None:
+        # Remembered too, so user.profile raises without querying again
+        related.set_cached_value(user, None)
+    else:
+        user.profile = profile
+
+
+def get_viewing_user(request):
+    """The user the request shows data for, with .profile and .profile.company loaded
+
+    A superuser viewing as someone else gets that user, loaded with their
+    profile and company in one query; anyone else gets request.user.
+    The result is kept on the request until the user viewed as changes -
+    see set_viewing_as().
+    """
+    user = request.user
+    viewed_id = request.session.get(VIEWING_AS_KEY) if user.is_superuser else None
+    memo = getattr(request, '_viewing_user', None)
+    if memo is not None and memo[0] == viewed_id:
+        return memo[1]
+
+    viewing_user = None
+    if viewed_id is not None:
+        try:
+            viewing_user = User.objects.select_related('profile__company').get(pk=viewed_id)
+        except (User.DoesNotExist, TypeError, ValueError):
+            pass
+    if viewing_user is None:
+        viewing_user = user
+        if user.is_authenticated:
+            _load_profile(user)
+    request._viewing_user = (viewed_id, viewing_user)
+    return viewing_user
+
+
+def set_viewing_as(request, user_id):
+    """Start viewing as user_id, or stop when None, and re-resolve request.company"""
+    if user_id is None:
+        request.session.pop(VIEWING_AS_KEY, None)
+    else:
+        request.session[VIEWING_AS_KEY] = user_id
+    request.__dict__.pop('_viewing_user', None)
+    request.company = resolve_company(request)
@@ -0,0 +1,4 @@
+import logging
+
+# One agency.perf line per test client request would drown the test output
+logging.getLogger('agency.perf').setLevel(logging.WARNING)
@@ -0,0 +1,56 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from agency.models import Client, Company, Project, ProjectAllocation, UserProfile
+
+
+class AllocationValueTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Agency', code='AG')
+        self.client_a = Client.objects.create(name='Acme', company=self.company)
+        self.client_b = Client.objects.create(name='Blue', company=self.company)
+        self.profile = UserProfile.objects.create(
+            user=User.objects.create_user('value.member'), company=self.company
+        )
+        for number, client in enumerate([self.client_a, self.client_a, self.client_b]):
+            project = Project.objects.create(
+                name=f'Project {number}', client=client, company=self.company,
+                start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+                total_revenue=Decimal('10000'), total_hours=Decimal('100'),
+            )
+            for month in (1, 2):
+                ProjectAllocation.objects.create(
+                    project=project, user_profile=self.profile, year=2025, month=month,
+                    allocated_hours=Decimal('7.5'), hourly_rate=Decimal('45.55'),
+                )
+
+    def test_value_is_stored_by_the_database(self):
+        allocation = ProjectAllocation.objects.first()
+
+        self.assertEqual(allocation.value, Decimal('341.625'))
+        self.assertEqual(allocation.value, allocation.total_revenue)
+
+        ProjectAllocation.objects.filter(pk=allocation.pk).update(allocated_hours=Decimal('10'))
+        allocation.refresh_from_db()
+        self.assertEqual(allocation.value, Decimal('455.500'))
+
+    def test_totals_per_client_in_one_query(self):
+        self.client.force_login(User.objects.create_superuser('value.admin', 'value@example.com', None))
+
+        response = self.client.get('/agency/api/allocation-values/', {'group': 'client', 'year': 2025})
+
+        self.assertEqual(response.status_code, 200)
+        rows = {row['project__client__name']: row for row in response.json()['rows']}
+        self.assertEqual(rows['Acme']['hours'], 30.0)
+        self.assertEqual(rows['Acme']['value'], 1366.5)
+        self.assertEqual(rows['Blue']['value'], 683.25)
+
+    def test_unknown_group(self):
+        self.client.force_login(User.objects.create_superuser('value.admin', 'value@example.com', None))
+
+        response = self.client.get('/agency/api/allocation-values/', {'group': 'team'})
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,109 @@
+import re
+import threading
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from agency import async_views
+from agency.benchmarks import QueryRecorder
+from agency.models import Client, Company, Cost, Project, ProjectAllocation, SlowQuery, UserProfile
+from agency.views import calculate_period_capacity, calculate_period_costs, calculate_period_revenue
+
+
+# The calculations run on connections of their own, so the data has to be committed
+class AsyncAnalyticsTests(TransactionTestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Agency', code='AG')
+        client = Client.objects.create(name='Acme', company=company)
+        project = Project.objects.create(
+            name='Website', client=client, company=company,
+            start_date=date(2025, 1, 1), end_date=date(2025, 6, 30),
+            total_revenue=Decimal('60000'), total_hours=Decimal('600'), revenue_type='booked',
+        )
+        user = User.objects.create_superuser('async.admin', 'async@example.com', None)
+        profile = UserProfile.objects.create(
+            user=user, company=company, status='full_time', hourly_rate=Decimal('50'),
+            annual_salary=Decimal('60000'), start_date=date(2024, 1, 1),
+        )
+        ProjectAllocation.objects.create(
+            project=project, user_profile=profile, year=2025, month=2,
+            allocated_hours=Decimal('80'), hourly_rate=Decimal('50'),
+        )
+        Cost.objects.create(
+            company=company, name='Office', cost_type='other', amount=Decimal('2000'),
+            frequency='monthly', start_date=date(2024, 1, 1),
+        )
+        self.client.force_login(user)
+
+    def get(self, path, params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_same_payloads_as_the_sync_apis(self):
+        params = {'start_date': '2025-01-01', 'end_date': '2025-03-31'}
+        self.assertEqual(
+            self.get('/agency/api/async/dashboard-data/', params),
+            self.get('/agency/api/dashboard-data/', params),
+        )
+        self.assertEqual(
+            self.get('/agency/api/async/revenue-chart/', {'year': 2025}),
+            self.get('/agency/api/revenue-chart/', {'year': 2025}),
+        )
+
+    def test_calculations_run_concurrently(self):
+        # Each calculation waits for the other two - run one after another, they would time out
+        barrier = threading.Barrier(3, timeout=5)
+
+        def waiting(func):
+            def run(*args):
+                barrier.wait()
+                return func(*args)
+            return run
+
+        with mock.patch.multiple(
+            async_views,
+            calculate_period_revenue=waiting(async_views.calculate_period_revenue),
+            calculate_period_costs=waiting(async_views.calculate_period_costs),
+            calculate_period_capacity=waiting(async_views.calculate_period_capacity),
+        ):
+            data = self.get('/agency/api/async/dashboard-data/', {'start_date': '2025-01-01', 'end_date': '2025-03-31'})
+
+        # 90 of the project's 181 days
+        self.assertAlmostEqual(data['revenue'], 60000 * 90 / 181, places=2)
+        self.assertEqual(data['allocated_hours'], 80)
+
+    def server_timing_queries(self, path, params):
+        response = self.client.get(path, params)
+        return int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+    def test_pool_queries_count_towards_the_request(self):
+        params = {'start_date': '2025-01-01', 'end_date': '2025-03-31'}
+        self.get('/agency/api/async/dashboard-data/', params)  # Caches the company
+        company = Company.objects.get()
+        calculations = QueryRecorder()
+        with connection.execute_wrapper(calculations):
+            for calculate in (calculate_period_revenue, calculate_period_costs, calculate_period_capacity):
+                calculate(company, date(2025, 1, 1), date(2025, 3, 31))
+
+        counted = self.server_timing_queries('/agency/api/async/dashboard-data/', params)
+        # As the pool threads ran before: on connections the middleware does not see
+        uninstrumented = lambda func: sync_to_async(func, thread_sensitive=False)
+        with mock.patch.object(async_views, 'in_thread_pool', uninstrumented):
+            request_thread_only = self.server_timing_queries('/agency/api/async/dashboard-data/', params)
+        self.assertEqual(counted - request_thread_only, len(calculations))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_pool_queries_are_captured(self):
+        with self.assertLogs('agency.perf', 'WARNING'):
+            self.get('/agency/api/async/dashboard-data/', {'start_date': '2025-01-01', 'end_date': '2025-03-31'})
+
+        captured = SlowQuery.objects.filter(view_name='agency:dashboard_data_api_async')
+        self.assertTrue(captured.filter(call_site__contains='in calculate_period_costs').exists())
+        self.assertFalse(captured.filter(plan__startswith='EXPLAIN failed').exists())
+
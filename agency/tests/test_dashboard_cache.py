@@ -0,0 +1,80 @@
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from agency import tenancy
+from agency.fragments import bump_data_version, data_version
+from agency.models import Company, Cost, UserProfile
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Later tests must not be handed this company, or its cached figures
+        self.addCleanup(cache.clear)
+        self.addCleanup(tenancy.clear_cache)
+        self.company = Company.objects.create(name='Agency', code='AG')
+        admin = User.objects.create_superuser('cache.admin', 'cache@example.com', None)
+        UserProfile.objects.create(user=admin, company=self.company, hourly_rate=Decimal('50'), status='contractor')
+        self.cost = Cost.objects.create(
+            company=self.company, name='Office', cost_type='rent', amount=Decimal('1234'),
+            frequency='monthly', start_date=date(2020, 1, 1),
+        )
+        self.client.force_login(admin)
+
+    def test_figures_are_cached_until_the_data_changes(self):
+        self.assertContains(self.client.get('/agency/dashboard/'), 'id="otherCostsAmount">1234<')
+
+        # Queryset updates skip save(), so nothing tells the cache
+        Cost.objects.filter(pk=self.cost.pk).update(amount=Decimal('2000'))
+        with self.assertNumQueries(2):  # Session and user
+            self.assertContains(self.client.get('/agency/dashboard/'), 'id="otherCostsAmount">1234<')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cost.amount = Decimal('3000')
+            self.cost.save()
+        self.assertContains(self.client.get('/agency/dashboard/'), 'id="otherCostsAmount">3000<')
+
+    def test_months_are_cached_separately(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Cost.objects.create(
+                company=self.company, name='Licence', cost_type='software', amount=Decimal('100'),
+                frequency='monthly', start_date=date(date.today().year + 1, 1, 1),
+            )
+        self.assertContains(self.client.get('/agency/dashboard/'), 'id="otherCostsAmount">1234<')
+
+        class NextYear(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return cls(date.today().year + 1, 1, 15)
+
+        with mock.patch('agency.views.datetime', NextYear):
+            self.assertContains(self.client.get('/agency/dashboard/'), 'id="otherCostsAmount">1334<')
+
+    @override_settings(DASHBOARD_CACHE_SECONDS=0)
+    def test_nothing_is_cached_without_cache_seconds(self):
+        self.client.get('/agency/dashboard/')
+        Cost.objects.filter(pk=self.cost.pk).update(amount=Decimal('2000'))
+        self.assertContains(self.client.get('/agency/dashboard/'), 'id="otherCostsAmount">2000<')
+
+
+class DataVersionTests(TestCase):
+    def test_bumped_after_commit(self):
+        version = data_version('company')
+        self.assertEqual(data_version('company'), version)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            bump_data_version('company')
+        self.assertEqual(data_version('company'), version)
+        callbacks[0]()
+        self.assertNotEqual(data_version('company'), version)
+
+    def test_evicted_version_is_replaced_with_a_new_one(self):
+        version = data_version('company')
+        cache.delete('agency:data_version:company')
+        self.assertNotEqual(data_version('company'), version)
+
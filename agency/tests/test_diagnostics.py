@@ -0,0 +1,49 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from agency import diagnostics
+
+
+class MissingIndexTests(TestCase):
+    def test_reports_filters_without_full_index(self):
+        filters = [
+            ('agency.Project', ['status'], 'test'),
+            ('agency.Project', ['company', 'status'], 'test'),
+            ('agency.ProjectAllocation', ['project', 'year', 'month'], 'test'),
+        ]
+        with mock.patch.object(diagnostics, 'HOT_FILTERS', filters):
+            missing = diagnostics.missing_indexes()
+
+        self.assertEqual([index['columns'] for index in missing], [['status'], ['company_id', 'status']])
+        self.assertIsNone(missing[0]['partial'])
+        # The foreign key index narrows by company before status is checked
+        self.assertIn('1 of 2 columns', missing[1]['partial'])
+
+
+class HotFilterIndexTests(TestCase):
+    def test_date_range_and_status_filters_are_indexed(self):
+        missing = [
+            (index['table'], index['columns']) for index in diagnostics.missing_indexes()
+            if 'start_date' in index['columns'] or 'status' in index['columns']
+        ]
+
+        self.assertEqual(missing, [])
+
+
+class PerfDiagnoseCommandTests(TestCase):
+    def test_report(self):
+        User.objects.create_superuser('diagnose.admin', 'diagnose@example.com', None)
+        output = StringIO()
+        call_command('perf_diagnose', '--repeat', '1', stdout=output)
+
+        report = output.getvalue()
+        self.assertIn('agency_project', report)
+        self.assertIn('CONN_MAX_AGE', report)
+        self.assertIn('InstrumentedLocMemCache', report)
+        self.assertRegex(report, r'dashboard_data_api +[\d.]+ ms +\d+ queries')
+        # Everything the endpoints wrote was rolled back
+        self.assertEqual(User.objects.get(username='diagnose.admin').last_login, None)
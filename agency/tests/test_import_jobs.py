@@ -0,0 +1,155 @@
+import functools
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from agency import tenancy
+from agency.importers import ImportRunner, claim_next_job, requeue_failed_jobs, run_job
+from agency.models import Company, ImportCheckpoint, ImportJob, MonthlyRevenue, UserProfile
+
+REVENUE_CSV = (
+    'Client,,Status,M1\n'
+    'Acme,,Open,100\n'
+    'Beta,,Open,200\n'
+    'Gamma,,Open,300\n'   # In the second batch of two, which fails the first time
+    'Delta,,Open,400\n'
+    'Echo,,Open,500\n'
+)
+
+
+class ImportJobTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(tenancy.clear_cache)
+
+        self.company = Company.objects.create(name='Agency', code='AG')
+        self.admin = User.objects.create_superuser('jobs.admin', 'jobs@example.com', None)
+        UserProfile.objects.create(user=self.admin, company=self.company, hourly_rate=Decimal('50'), status='contractor')
+        self.client.force_login(self.admin)
+
+    def upload(self):
+        response = self.client.post('/agency/import/', {'file': SimpleUploadedFile('revenue.csv', REVENUE_CSV.encode())})
+        self.assertEqual(response.status_code, 202)
+        return ImportJob.objects.get(pk=response.json()['id'])
+
+    def status(self, job):
+        return self.client.get(f'/agency/api/import-jobs/{job.pk}/').json()
+
+
+class ClaimTests(ImportJobTestCase):
+    def test_jobs_are_claimed_once_in_upload_order(self):
+        first, second = self.upload(), self.upload()
+        self.assertEqual(self.status(first)['status'], 'queued')
+
+        claimed = claim_next_job('worker-1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker, claimed.attempts),
+                         (first.pk, 'running', 'worker-1', 1))
+        self.assertEqual(claim_next_job('worker-2').pk, second.pk)
+        self.assertIsNone(claim_next_job('worker-3'))
+
+    def test_stale_running_jobs_are_claimed_again(self):
+        job = self.upload()
+        claim_next_job('worker-1')
+        self.assertIsNone(claim_next_job('worker-2', stale_after=timedelta(minutes=5)))
+
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=10))
+        claimed = claim_next_job('worker-2', stale_after=timedelta(minutes=5))
+        self.assertEqual((claimed.pk, claimed.worker, claimed.attempts), (job.pk, 'worker-2', 2))
+
+    def test_finished_jobs_are_not_claimed(self):
+        job = self.upload()
+        ImportJob.objects.filter(pk=job.pk).update(status='failed', updated_at=timezone.now() - timedelta(days=1))
+        self.assertIsNone(claim_next_job('worker-1', stale_after=timedelta(minutes=5)))
+
+
+class RunTests(ImportJobTestCase):
+    def test_run_records_counts_and_status(self):
+        job = self.upload()
+        run_job(claim_next_job('worker-1'))
+
+        status = self.status(job)
+        self.assertEqual((status['status'], status['rows_processed'], status['errors']), ('completed', 5, []))
+        self.assertEqual(status['counts']['rows_inserted'], 5)
+        self.assertIsNotNone(status['finished_at'])
+        self.assertEqual(MonthlyRevenue.objects.filter(company=self.company).count(), 5)
+
+    def test_missing_file_fails_the_job(self):
+        job = self.upload()
+        job.file.delete(save=False)
+        run_job(claim_next_job('worker-1'))
+
+        status = self.status(job)
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(len(status['errors']), 1)
+
+    def test_other_companies_jobs_are_not_shown(self):
+        job = self.upload()
+        ImportJob.objects.filter(pk=job.pk).update(company=Company.objects.create(name='Other', code='OT'))
+        self.assertEqual(self.client.get(f'/agency/api/import-jobs/{job.pk}/').status_code, 404)
+
+
+@mock.patch('agency.importers.jobs.ImportRunner', functools.partial(ImportRunner, batch_size=2))
+class RetryTests(ImportJobTestCase):
+    def fail_once(self):
+        import_batch = ImportRunner.import_batch
+
+        def failing(runner, sheet, batch, hashes, plan):
+            if any(record.client_name == 'Gamma' for record in batch):
+                raise ValueError('bad row')
+            return import_batch(runner, sheet, batch, hashes, plan)
+
+        return mock.patch.object(ImportRunner, 'import_batch', failing)
+
+    def test_failed_job_is_retried_from_its_checkpoints(self):
+        job = self.upload()
+        with self.fail_once():
+            run_job(claim_next_job('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('bad row', job.errors[0])
+        self.assertIsNone(claim_next_job('worker-1'))
+
+        self.assertEqual(requeue_failed_jobs(ImportJob.objects.all()), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.errors, job.finished_at), ('queued', [], None))
+
+        run_job(claim_next_job('worker-2'))
+        status = self.status(job)
+        self.assertEqual((status['status'], status['attempts'], status['errors']), ('completed', 2, []))
+        self.assertEqual((status['counts']['rows_resumed'], status['counts']['rows_inserted']), (3, 2))
+        self.assertEqual(set(ImportCheckpoint.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(MonthlyRevenue.objects.filter(company=self.company).count(), 5)
+
+    def test_only_failed_jobs_are_requeued(self):
+        completed = self.upload()
+        run_job(claim_next_job('worker-1'))
+        running = self.upload()
+        claim_next_job('worker-1')
+
+        self.assertEqual(requeue_failed_jobs(ImportJob.objects.all()), 0)
+        self.assertEqual(ImportJob.objects.get(pk=completed.pk).status, 'completed')
+        self.assertEqual(ImportJob.objects.get(pk=running.pk).status, 'running')
+
+    def test_admin_action(self):
+        job = self.upload()
+        with self.fail_once():
+            run_job(claim_next_job('worker-1'))
+
+        request = RequestFactory().post('/admin/agency/importjob/')
+        request.user = self.admin
+        modeladmin = site._registry[ImportJob]
+        with mock.patch.object(modeladmin, 'message_user') as message_user:
+            modeladmin.retry_failed(request, ImportJob.objects.all())
+        self.assertIn('1 import(s) queued again', message_user.call_args[0][1])
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, 'queued')
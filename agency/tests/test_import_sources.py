@@ -0,0 +1,97 @@
+import csv
+import tempfile
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+import openpyxl
+from django.test import SimpleTestCase
+
+from agency.importers import PARQUET_AVAILABLE, iter_record_batches, open_source
+
+if PARQUET_AVAILABLE:
+    import pyarrow
+    import pyarrow.parquet
+
+REVENUE_HEADER = ['Client', '', 'Status'] + [f'M{month}' for month in range(1, 13)]
+REVENUE_ROWS = [
+    ['Acme', '', 'Open', '1000', '1,250.50', None, None, None, None, None, None, None, None, None, '99'],
+    [None] * 15,  # Blank rows are dropped
+    ['Beta', '', 'Closed', None, 'n/a', '300', None, None, None, None, None, None, None, None, None],
+    ['Gamma', '', None] + [None] * 12,
+]
+PAYROLL_HEADER = ['Name', 'Annual Salary']
+PAYROLL_ROWS = [
+    ['Ada Lovelace', '104,000'],
+    ['Grace Hopper', None],
+]
+
+
+class SourceTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+        workbook = openpyxl.Workbook()
+        workbook.remove(workbook.active)
+        for sheet, header, rows in (('Revenue', REVENUE_HEADER, REVENUE_ROWS),
+                                    ('Payroll', PAYROLL_HEADER, PAYROLL_ROWS)):
+            worksheet = workbook.create_sheet(sheet)
+            worksheet.append(header)
+            for row in rows:
+                worksheet.append(row)
+        workbook.save(self.directory / 'workbook.xlsx')
+
+    def records(self, path, sheet, batch_size=2):
+        source = open_source(path, batch_size=batch_size)
+        try:
+            return [
+                record[1:]  # Without the row number - Parquet files have no header row
+                for batch in iter_record_batches(source, sheet, batch_size)
+                for record in batch
+            ]
+        finally:
+            source.close()
+
+    def test_workbook_records(self):
+        revenue = self.records(self.directory / 'workbook.xlsx', 'Revenue')
+        self.assertEqual([record[0] for record in revenue], ['Acme', 'Beta', 'Gamma'])
+        self.assertEqual(revenue[0][2][:3], (Decimal('1000'), Decimal('1250.50'), None))
+        self.assertEqual(revenue[0][2][11], Decimal('99'))
+        self.assertEqual(revenue[1][1], 'Closed')
+        self.assertEqual(len(revenue[1][3]), 1)  # 'n/a' is a warning, not an error
+        self.assertEqual(revenue[2][1], 'Open')
+
+        payroll = self.records(self.directory / 'workbook.xlsx', 'Payroll')
+        self.assertEqual(payroll, [('Ada Lovelace', Decimal('104000')), ('Grace Hopper', Decimal('0'))])
+
+    def test_csv_maps_to_the_workbook_rows(self):
+        for name, header, rows in (('revenue.csv', REVENUE_HEADER, REVENUE_ROWS),
+                                   ('team_payroll.csv', PAYROLL_HEADER, PAYROLL_ROWS)):
+            with open(self.directory / name, 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(header)
+                writer.writerows(rows)
+
+        self.assertEqual(self.records(self.directory / 'revenue.csv', 'Revenue'),
+                         self.records(self.directory / 'workbook.xlsx', 'Revenue'))
+        self.assertEqual(self.records(self.directory / 'team_payroll.csv', 'Payroll'),
+                         self.records(self.directory / 'workbook.xlsx', 'Payroll'))
+
+        # The layout is taken from the file name unless given
+        self.assertEqual(open_source(self.directory / 'team_payroll.csv').sheets, ['Payroll'])
+        self.assertEqual(open_source(self.directory / 'team_payroll.csv', sheet='Revenue').sheets, ['Revenue'])
+
+    @unittest.skipUnless(PARQUET_AVAILABLE, 'pyarrow is not installed')
+    def test_parquet_maps_to_the_workbook_rows(self):
+        columns = list(zip(*REVENUE_ROWS))
+        table = pyarrow.table({f'c{index}': list(column) for index, column in enumerate(columns)})
+        pyarrow.parquet.write_table(table, self.directory / 'revenue.parquet')
+
+        self.assertEqual(self.records(self.directory / 'revenue.parquet', 'Revenue'),
+                         self.records(self.directory / 'workbook.xlsx', 'Revenue'))
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            open_source(self.directory / 'missing.csv')
@@ -0,0 +1,192 @@
+import csv
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from agency.importers import ImportRunner
+from agency.models import Company, ImportCheckpoint, MonthlyRevenue, Project, UserProfile
+
+REVENUE_HEADER = ['Client', '', 'Status'] + [f'M{month}' for month in range(1, 13)]
+
+
+class ImportTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.company = Company.objects.create(name='Agency', code='AG')
+
+    def revenue_file(self, name, rows):
+        """A Revenue CSV with one row per (client, [Jan..Dec amounts])"""
+        path = self.directory / name
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(REVENUE_HEADER)
+            for client, amounts in rows:
+                writer.writerow([client, '', 'Open'] + list(amounts) + [''] * (12 - len(amounts)))
+        return path
+
+    def payroll_file(self, name, rows):
+        path = self.directory / name
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['Name', 'Annual Salary'])
+            writer.writerows(rows)
+        return path
+
+    def run_import(self, path, **options):
+        results = ImportRunner(self.company, **options).run(path)
+        self.assertEqual(results['errors'], [])
+        return results['counts']
+
+    def revenue(self, client):
+        return sorted(MonthlyRevenue.objects.filter(company=self.company, client__name=client)
+                      .values_list('month', 'revenue'))
+
+
+class ReimportTests(ImportTestCase):
+    def test_unchanged_rows_are_skipped_and_changed_rows_written(self):
+        path = self.revenue_file('revenue.csv', [('Acme', [100, 200]), ('Beta', [300])])
+        counts = self.run_import(path)
+        self.assertEqual((counts['rows_inserted'], counts['revenue_created']), (2, 3))
+
+        counts = self.run_import(path)
+        self.assertEqual((counts['rows_skipped'], counts['rows_inserted'], counts['rows_updated']), (2, 0, 0))
+        self.assertEqual(counts['revenue_created'] + counts['revenue_updated'], 0)
+
+        # Acme's February is cleared and March added
+        path = self.revenue_file('revenue.csv', [('Acme', [150, '', 50]), ('Beta', [300])])
+        counts = self.run_import(path)
+        self.assertEqual((counts['rows_skipped'], counts['rows_updated']), (1, 1))
+        self.assertEqual(
+            (counts['revenue_created'], counts['revenue_updated'], counts['revenue_deleted']), (1, 1, 1)
+        )
+        self.assertEqual(self.revenue('Acme'), [(1, Decimal('150')), (3, Decimal('50'))])
+        self.assertEqual(Project.objects.get(client__name='Acme').total_revenue, Decimal('200'))
+
+    def test_rows_missing_from_another_file_are_kept(self):
+        self.run_import(self.revenue_file('revenue_a.csv', [('Acme', [100] * 12)]))
+        counts = self.run_import(self.revenue_file('revenue_b.csv', [('Beta', [300])]))
+
+        self.assertEqual((counts['rows_inserted'], counts['rows_missing'], counts['rows_deleted']), (1, 1, 0))
+        self.assertEqual(len(self.revenue('Acme')), 12)
+        self.assertEqual(Project.objects.get(client__name='Acme').total_revenue, Decimal('1200'))
+
+        # A dry run of the first file plans nothing for Beta either
+        output = StringIO()
+        call_command('import_spreadsheet', str(self.directory / 'revenue_a.csv'), 'AG', '--dry-run', stdout=output)
+        self.assertNotIn('- revenue "Beta"', output.getvalue())
+        self.assertIn('missing from this file: 1 (kept', output.getvalue())
+
+    def test_prune_removes_rows_missing_from_the_source(self):
+        self.run_import(self.revenue_file('revenue.csv', [('Acme', [100, 200]), ('Beta', [300])]))
+        counts = self.run_import(self.revenue_file('revenue.csv', [('Beta', [300])]), prune=True)
+
+        self.assertEqual((counts['rows_skipped'], counts['rows_deleted'], counts['revenue_deleted']), (1, 1, 2))
+        self.assertEqual(self.revenue('Acme'), [])
+        self.assertEqual(Project.objects.get(client__name='Acme').total_revenue, Decimal('0'))
+
+        # Forgotten, so it is not reported again
+        counts = self.run_import(self.revenue_file('revenue.csv', [('Beta', [300])]))
+        self.assertEqual((counts['rows_skipped'], counts['rows_missing']), (1, 0))
+
+
+class DryRunTests(ImportTestCase):
+    def snapshot(self):
+        return (
+            sorted(MonthlyRevenue.objects.values_list('client__name', 'month', 'revenue')),
+            sorted(Project.objects.values_list('name', 'total_revenue')),
+            sorted(UserProfile.objects.values_list('user__username', 'hourly_rate', 'annual_salary', 'status')),
+        )
+
+    def plan(self, path, dry_run):
+        lines = []
+        results = ImportRunner(self.company, dry_run=dry_run, verbosity=2, log=lines.append).run(path)
+        self.assertEqual(results['errors'], [])
+        return results['counts'], lines
+
+    def test_dry_run_plans_exactly_what_the_import_writes(self):
+        self.run_import(self.revenue_file('revenue.csv', [('Acme', [100, 200]), ('Beta', [300])]))
+        self.run_import(self.payroll_file('payroll.csv', [('Ada Lovelace', '104000')]))
+        revenue = self.revenue_file('revenue.csv', [('Acme', [100, '', 250]), ('Beta', [300]), ('Gamma', [50])])
+        payroll = self.payroll_file('payroll.csv', [('Ada Lovelace', '110000'), ('Grace Hopper', '90000')])
+
+        for path in (revenue, payroll):
+            with self.subTest(path=path.name):
+                before = self.snapshot()
+                planned_counts, planned = self.plan(path, dry_run=True)
+                self.assertEqual(self.snapshot(), before)
+                self.assertTrue(planned)
+
+                counts, applied = self.plan(path, dry_run=False)
+                self.assertEqual(counts, planned_counts)
+                self.assertEqual(applied, planned)
+                self.assertNotEqual(self.snapshot(), before)
+
+                # Applied, so there is nothing left to plan
+                counts, lines = self.plan(path, dry_run=True)
+                self.assertEqual(lines, [])
+
+
+class ResumeTests(ImportTestCase):
+    def test_resume_retries_only_the_failed_chunk(self):
+        path = self.revenue_file('revenue.csv', [
+            ('Acme', [100]), ('Beta', [200]),   # Chunk 0
+            ('Gamma', [300]), ('Delta', [400]),  # Chunk 1 - fails the first time
+            ('Echo', [500]),                     # Chunk 2
+        ])
+        import_batch = ImportRunner.import_batch
+
+        def failing(runner, sheet, batch, hashes, plan):
+            if any(record.client_name == 'Gamma' for record in batch):
+                raise ValueError('bad row')
+            return import_batch(runner, sheet, batch, hashes, plan)
+
+        with mock.patch.object(ImportRunner, 'import_batch', failing):
+            results = ImportRunner(self.company, batch_size=2, parallel=True).run(path)
+        self.assertEqual(len(results['failed_chunks']), 1)
+        self.assertIn('chunk 1 (rows 4-5): bad row', results['failed_chunks'][0])
+        self.assertEqual(
+            sorted(ImportCheckpoint.objects.values_list('chunk_index', 'status')),
+            [(0, 'done'), (1, 'failed'), (2, 'done')],
+        )
+        self.assertEqual(self.revenue('Gamma'), [])
+        self.assertEqual(len(self.revenue('Echo')), 1)
+
+        results = ImportRunner(self.company, batch_size=2, parallel=True, resume=True).run(path)
+        self.assertEqual(results['failed_chunks'], [])
+        self.assertEqual((results['counts']['rows_resumed'], results['counts']['rows_inserted']), (3, 2))
+        self.assertEqual(set(ImportCheckpoint.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(MonthlyRevenue.objects.filter(company=self.company).count(), 5)
+
+        # Without --resume the checkpoints are discarded and every row is classified again
+        results = ImportRunner(self.company, batch_size=2, parallel=True).run(path)
+        self.assertEqual((results['counts']['rows_resumed'], results['counts']['rows_skipped']), (0, 5))
+
+    def test_row_from_a_failed_chunk_repeated_later_is_inserted(self):
+        path = self.revenue_file('revenue.csv', [
+            ('Acme', [100]), ('Gamma', [300]),  # Chunk 0 - fails
+            ('Beta', [200]), ('Gamma', [350]),  # Chunk 1 - repeats Gamma
+        ])
+        import_batch = ImportRunner.import_batch
+
+        def failing(runner, sheet, batch, hashes, plan):
+            def failing_plan(changed, replaced):
+                # Fails after the chunk's rows have been classified
+                if any(record.client_name == 'Acme' for record in changed):
+                    raise ValueError('bad row')
+                return plan(changed, replaced)
+            return import_batch(runner, sheet, batch, hashes, failing_plan)
+
+        with mock.patch.object(ImportRunner, 'import_batch', failing):
+            results = ImportRunner(self.company, batch_size=2, parallel=True).run(path)
+        self.assertEqual(len(results['failed_chunks']), 1)
+        self.assertIn('chunk 0 (rows 2-3): bad row', results['failed_chunks'][0])
+        self.assertEqual(results['counts']['rows_inserted'], 2)
+        self.assertEqual(len(self.revenue('Gamma')), 1)
+        self.assertEqual(self.revenue('Acme'), [])
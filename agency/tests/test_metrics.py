@@ -0,0 +1,79 @@
+import multiprocessing
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from agency.metrics import Counter, FileStore, Histogram, MemoryStore, Registry
+
+
+def _increment_in_child(directory):
+    registry = Registry()
+    registry._store = FileStore(directory)
+    Counter(registry, 'jobs', 'Jobs.').inc(2)
+
+
+class RegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.registry._store = MemoryStore()
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = Histogram(self.registry, 'latency', 'Latency.', (0.1, 1), ['view'])
+        latency.observe(0.05, view='a')
+        latency.observe(0.5, view='a')
+        latency.observe(5, view='a')
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('# TYPE latency histogram', lines)
+        self.assertIn('latency_bucket{view="a",le="0.1"} 1', lines)
+        self.assertIn('latency_bucket{view="a",le="1"} 2', lines)
+        self.assertIn('latency_bucket{view="a",le="+Inf"} 3', lines)
+        self.assertIn('latency_sum{view="a"} 5.55', lines)
+        self.assertIn('latency_count{view="a"} 3', lines)
+
+    def test_counter_labels_are_escaped(self):
+        Counter(self.registry, 'hits', 'Hits.', ['view']).inc(view='say "hi"')
+
+        self.assertIn('hits_total{view="say \\"hi\\""} 1', self.registry.render().splitlines())
+
+
+class FileStoreTests(SimpleTestCase):
+    def test_sums_samples_across_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = Registry()
+            registry._store = FileStore(directory)
+            jobs = Counter(registry, 'jobs', 'Jobs.')
+            jobs.inc(1)
+
+            child = multiprocessing.get_context('fork').Process(target=_increment_in_child, args=(directory,))
+            child.start()
+            child.join()
+
+            self.assertIn('jobs_total 3', registry.render().splitlines())
+
+            # Folding the exited child's file into the archive keeps its samples
+            registry.store.mark_process_dead(child.pid)
+            self.assertIn('jobs_total 3', registry.render().splitlines())
+
+
+class MetricsEndpointTests(TestCase):
+    def test_exposes_request_metrics(self):
+        self.client.get('/agency/api/health/')
+        self.client.force_login(User.objects.create_user('metrics.staff', is_staff=True))
+        response = self.client.get('/agency/api/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('agency_request_duration_seconds_count{view="agency:health_check"}', response.content.decode())
+
+    def test_staff_only_without_a_token(self):
+        self.assertEqual(self.client.get('/agency/api/metrics/').status_code, 401)
+        self.client.force_login(User.objects.create_user('metrics.user'))
+        self.assertEqual(self.client.get('/agency/api/metrics/').status_code, 401)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/agency/api/metrics/').status_code, 401)
+        response = self.client.get('/agency/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,79 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template import engines
+from django.test import TestCase, override_settings
+
+from agency import perf
+from agency.models import Company
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        # The dashboard's first run on an empty database creates a company, over its query budget
+        Company.objects.create(name='Agency', code='AG')
+        self.user = User.objects.create_superuser('perf.admin', 'perf@example.com', None)
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/agency/dashboard/')
+
+        metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(metrics), {'db', 'tpl', 'cache', 'view', 'total'})
+        self.assertRegex(metrics['db'], r'^db;dur=\d+\.\d;desc="\d+ queries"$')
+
+    @override_settings(PERF_QUERY_BUDGETS={})
+    def test_logs_one_json_line_per_request(self):
+        with self.assertLogs('agency.perf', 'INFO') as logs:
+            self.client.get('/agency/dashboard/')
+
+        self.assertEqual(len(logs.records), 1)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'agency:dashboard')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    @override_settings(PERF_QUERY_BUDGETS={'agency:dashboard': 1})
+    def test_warns_when_a_view_exceeds_its_query_budget(self):
+        with self.assertLogs('agency.perf', 'WARNING') as logs:
+            self.client.get('/agency/dashboard/')
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'query_budget_exceeded')
+        self.assertEqual(record['budget'], 1)
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_disabled(self):
+        response = self.client.get('/agency/api/health/')
+
+        self.assertNotIn('Server-Timing', response)
+
+
+class RequestStatsHooksTests(TestCase):
+    def test_cache_hits_and_misses(self):
+        stats, token = perf.start_request()
+        try:
+            cache.set('perf-test', 1)
+            cache.get('perf-test')
+            cache.get('perf-test-missing')
+        finally:
+            perf.end_request(token)
+            cache.delete('perf-test')
+
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (1, 1))
+
+    def test_template_time(self):
+        template = engines['django'].from_string('{{ value }}')
+        stats, token = perf.start_request()
+        try:
+            self.assertEqual(template.render({'value': 'ok'}), 'ok')
+        finally:
+            perf.end_request(token)
+
+        self.assertGreater(stats.template_ms, 0)
+
+    def test_hooks_are_inert_outside_a_request(self):
+        self.assertIsNone(perf.current_stats())
+        self.assertIsNone(cache.get('perf-test-missing'))
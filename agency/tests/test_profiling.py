@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from agency.models import Company, ProfileReport, UserProfile
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        # So the dashboard computes its figures rather than reading them from the cache
+        cache.clear()
+        self.admin = User.objects.create_superuser('profile.admin', 'profile@example.com', None)
+        # So the profiled dashboard runs the queries of an ordinary request, plus the report's INSERT
+        UserProfile.objects.create(
+            user=self.admin, company=Company.objects.create(name='Agency', code='AG'),
+            hourly_rate=Decimal('50'), status='contractor',
+        )
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/agency/dashboard/', {'_profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        report = ProfileReport.objects.get()
+        self.assertEqual(response['X-Profile-Report'], f'/admin/agency/profilereport/{report.pk}/change/')
+        self.assertEqual(report.view_name, 'agency:dashboard')
+        self.assertEqual(report.query_count, sum(site['count'] for site in report.sql))
+        self.assertTrue(report.functions)
+        # Queries are attributed to the lines of views.py that ran them
+        self.assertTrue(any(site['site'].startswith('views.py:') and 'in dashboard' in site['site']
+                            for site in report.sql))
+
+        page = self.client.get(response['X-Profile-Report'])
+        self.assertContains(page, 'SQL by call site')
+
+    def test_header_switch(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/agency/api/health/', HTTP_X_PROFILE='1')
+
+        self.assertIn('X-Profile-Report', response)
+
+    def test_non_staff_requests_are_not_profiled(self):
+        self.client.force_login(User.objects.create_user('profile.user'))
+        response = self.client.get('/agency/api/health/', {'_profile': '1'})
+
+        self.assertNotIn('X-Profile-Report', response)
+        self.assertFalse(ProfileReport.objects.exists())
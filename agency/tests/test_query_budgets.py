@@ -0,0 +1,94 @@
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from agency import tenancy
+from agency.benchmarks import BenchmarkSuite, QueryRecorder, explain
+
+# Generator counts for the two dataset sizes
+SMALL = {'companies': 1, 'clients': 4, 'projects_per_client': 2, 'profiles': 6}
+LARGER = {'companies': 2, 'clients': 15, 'projects_per_client': 4, 'profiles': 20}
+
+# The plan of each scenario's slowest SELECT is written to this directory for
+# review when it is set, and to a temporary directory otherwise
+QUERY_PLAN_DIR = os.environ.get('AGENCY_QUERY_PLAN_DIR')
+
+
+class QueryBudgetTests(TestCase):
+    """Every hot view stays within its PERF_QUERY_BUDGETS entry at two dataset sizes
+
+    The budgets hold at every dataset size, so a count that grows with the
+    data (an N+1) fails the smaller of them. Each scenario runs first on a
+    cold worker - empty caches, as after a deploy - and then warm; both
+    must stay within the budget the PerformanceMiddleware warns about.
+    """
+
+    def test_small_dataset(self):
+        self.assertWithinBudgets('small', SMALL)
+
+    def test_larger_dataset(self):
+        self.assertWithinBudgets('larger', LARGER)
+
+    def assertWithinBudgets(self, size, sizes):
+        suite = BenchmarkSuite(sizes=sizes)
+        suite.load()
+        checked = set()
+
+        with tempfile.TemporaryDirectory() as directory:
+            plan_dir = Path(QUERY_PLAN_DIR or directory)
+            plan_dir.mkdir(parents=True, exist_ok=True)
+            for name, run in suite.scenarios(directory):
+                with self.subTest(scenario=name, size=size):
+                    cache.clear()
+                    tenancy.clear_cache()
+                    runs = {}
+                    for attempt in ('cold', 'warm'):
+                        runs[attempt] = queries = QueryRecorder()
+                        with connection.execute_wrapper(queries):
+                            result = run()
+                    if name == 'import_spreadsheet':
+                        # Its first run loads the file, in INSERT batches that grow with
+                        # the data; the budget is for re-importing it
+                        del runs['cold']
+
+                    budget_name, budget = self.budget(name, result)
+                    checked.add(budget_name)
+                    for attempt, queries in runs.items():
+                        self.assertLessEqual(
+                            len(queries), budget,
+                            f'{name} ({attempt}) ran {len(queries)} queries, {budget_name} allows {budget}:\n'
+                            + '\n'.join(query['sql'] for query in queries.queries)
+                        )
+                    self.write_plan(plan_dir / f'{size}-{name}.txt', runs['warm'])
+
+        # Every budget is checked by some scenario
+        self.assertEqual(checked - {None}, set(settings.PERF_QUERY_BUDGETS))
+
+    def budget(self, name, result):
+        """(PERF_QUERY_BUDGETS key, budget) for a scenario's result"""
+        if isinstance(result, str):
+            # A template rendered from a context built beforehand - a query here
+            # is a lazy queryset left in the context
+            return None, 0
+        view_name = result.resolver_match.view_name if hasattr(result, 'resolver_match') else name
+        return view_name, settings.PERF_QUERY_BUDGETS[view_name]
+
+    def write_plan(self, path, queries):
+        selects = [
+            query for query in queries.queries
+            if not query['many'] and query['sql'].lstrip().upper().startswith(('SELECT', 'WITH'))
+        ]
+        if not selects:
+            path.write_text('No SELECT queries\n')
+            return
+        heaviest = max(selects, key=lambda query: query['time_ms'])
+        path.write_text(
+            f"{heaviest['time_ms']:.2f} ms of {len(queries)} queries\n\n"
+            f"{heaviest['sql']}\n\n"
+            f"{explain(heaviest)}\n"
+        )
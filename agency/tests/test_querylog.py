@@ -0,0 +1,82 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from agency.models import Company, SlowQuery, UserProfile
+from agency.querylog import capture_slow_queries
+
+
+@override_settings(SLOW_QUERY_MS=0)
+class SlowQueryCaptureTests(TestCase):
+    def test_request_queries_are_stored_with_plan(self):
+        # So the dashboard computes its figures rather than reading them from the cache
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('slow.admin', 'slow@example.com', None))
+        with self.assertLogs('agency.perf', 'WARNING') as logs:
+            self.client.get('/agency/dashboard/')
+        self.assertTrue(any('Slow query' in line for line in logs.output))
+
+        captures = SlowQuery.objects.filter(view_name='agency:dashboard')
+        self.assertTrue(captures.exists())
+        from_view = [query for query in captures if query.call_site.startswith('views.py:')]
+        self.assertTrue(from_view)
+        self.assertTrue(all(query.plan and not query.plan.startswith('EXPLAIN failed') for query in from_view))
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_capture_does_not_need_instrumentation(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('slow.admin', 'slow@example.com', None))
+        with self.assertLogs('agency.perf', 'WARNING'):
+            response = self.client.get('/agency/dashboard/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertTrue(SlowQuery.objects.filter(view_name='agency:dashboard').exists())
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_instrumentation_does_not_need_capture(self):
+        admin = User.objects.create_superuser('slow.admin', 'slow@example.com', None)
+        UserProfile.objects.create(user=admin, company=Company.objects.create(name='Agency', code='AG'),
+                                   hourly_rate=Decimal('50'))
+        self.client.force_login(admin)
+        response = self.client.get('/agency/dashboard/')
+        self.assertIn('Server-Timing', response)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_capture_block_and_command(self):
+        with self.assertLogs('agency.perf', 'WARNING'), capture_slow_queries('test_block'):
+            list(User.objects.filter(username__contains='x'))
+
+        query = SlowQuery.objects.get(view_name='test_block')
+        self.assertTrue(query.has_full_scan)
+
+        output = StringIO()
+        call_command('slow_queries', '--scans', '--view', 'test_block', stdout=output)
+        self.assertIn(f'--id {query.pk}', output.getvalue())
+
+        output = StringIO()
+        call_command('slow_queries', '--id', str(query.pk), stdout=output)
+        self.assertIn(query.plan, output.getvalue())
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        with capture_slow_queries('test_block') as log:
+            list(User.objects.all())
+
+        self.assertIsNone(log)
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class FullScanTests(TestCase):
+    def test_plan_lines(self):
+        for plan, full_scan in [
+            ('SCAN agency_project', True),
+            ('Seq Scan on agency_cost  (cost=0.00..35.50 rows=10 width=4)', True),
+            ('SEARCH agency_project USING INDEX agency_proj_company_id (company_id=?)', False),
+            ('SCAN agency_project USING COVERING INDEX agency_proj_dates', False),
+            ('Index Scan using agency_cost_pkey on agency_cost', False),
+        ]:
+            with self.subTest(plan=plan):
+                self.assertEqual(SlowQuery(plan=plan).has_full_scan, full_scan)
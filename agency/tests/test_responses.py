@@ -0,0 +1,63 @@
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+from uuid import UUID
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from agency import responses
+from agency.responses import FastJsonResponse, dumps
+
+PAYLOAD = {
+    'hours': Decimal('12.50'),
+    'start': date(2025, 3, 1),
+    'at': datetime(2025, 3, 1, 9, 30),
+    'id': UUID('12345678-1234-5678-1234-567812345678'),
+    'months': {1: [Decimal('1.5'), 2]},
+}
+EXPECTED = {
+    'hours': 12.5,
+    'start': '2025-03-01',
+    'at': '2025-03-01T09:30:00',
+    'id': '12345678-1234-5678-1234-567812345678',
+    'months': {'1': [1.5, 2]},
+}
+
+
+class DumpsTests(SimpleTestCase):
+    def test_types(self):
+        self.assertEqual(json.loads(dumps(PAYLOAD)), EXPECTED)
+
+    def test_without_orjson(self):
+        with mock.patch.object(responses, 'orjson', None):
+            self.assertEqual(json.loads(dumps(PAYLOAD)), EXPECTED)
+
+    def test_unknown_types_raise(self):
+        with self.assertRaises(TypeError):
+            dumps({'value': object()})
+
+
+@override_settings(JSON_GZIP_MIN_BYTES=100)
+class CompressionTests(SimpleTestCase):
+    def request(self, **headers):
+        return RequestFactory().get('/', headers=headers)
+
+    def test_large_payloads_are_gzipped_for_clients_that_accept_it(self):
+        data = {'rows': list(range(100))}
+        response = FastJsonResponse(data, request=self.request(accept_encoding='gzip, deflate'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), data)
+
+        response = FastJsonResponse(data, request=self.request())
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_small_payloads_are_sent_as_they_are(self):
+        response = FastJsonResponse({'ok': True}, request=self.request(accept_encoding='gzip'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{"ok":true}')
@@ -0,0 +1,150 @@
+import json
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from agency.models import Client, Company, Project, ProjectAllocation, UserProfile
+from agency.rollups import refresh_project_rollups
+
+
+class ProjectRollupTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Agency', code='AG')
+        client = Client.objects.create(name='Acme', company=self.company)
+        self.project = Project.objects.create(
+            name='Website', client=client, company=self.company,
+            start_date=date(2025, 1, 1), end_date=date(2025, 6, 30),
+            total_revenue=Decimal('10000'), total_hours=Decimal('100'),
+        )
+        self.profiles = [
+            UserProfile.objects.create(
+                user=User.objects.create_user(f'rollup.{number}'), company=self.company,
+                hourly_rate=Decimal('50'),
+            )
+            for number in range(2)
+        ]
+        self.client.force_login(User.objects.create_superuser('rollup.admin', 'rollup@example.com', None))
+
+    def save_grid(self, allocations):
+        response = self.client.post(
+            f'/admin/agency/project/{self.project.pk}/save-allocations/',
+            json.dumps({'allocations': allocations}), content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+        self.project.refresh_from_db()
+
+    def test_grid_save_and_member_removal_update_rollups(self):
+        self.save_grid([
+            {'member_id': str(self.profiles[0].pk), 'year': 2025, 'month': 2, 'hours': 20},
+            {'member_id': str(self.profiles[1].pk), 'year': 2025, 'month': 3, 'hours': 40},
+        ])
+
+        self.assertEqual(self.project.allocated_hours, Decimal('60'))
+        self.assertEqual(self.project.allocated_value, Decimal('3000'))
+        self.assertEqual(self.project.team_size, 2)
+        self.assertEqual(self.project.first_allocated_month, date(2025, 2, 1))
+        self.assertEqual(self.project.last_allocated_month, date(2025, 3, 1))
+        self.assertEqual(self.project.allocation_percentage, 60)
+
+        self.client.post(
+            f'/admin/agency/project/{self.project.pk}/remove-member/',
+            json.dumps({'member_id': str(self.profiles[1].pk)}), content_type='application/json',
+        )
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.allocated_hours, Decimal('20'))
+        self.assertEqual(self.project.team_size, 1)
+        self.assertEqual(self.project.last_allocated_month, date(2025, 2, 1))
+
+        self.save_grid([])
+        self.assertEqual(self.project.allocated_hours, 0)
+        self.assertEqual(self.project.team_size, 0)
+        self.assertIsNone(self.project.first_allocated_month)
+
+    def test_grid_save_skips_cells_for_unknown_members(self):
+        outsider = UserProfile.objects.create(
+            user=User.objects.create_user('rollup.outsider'), hourly_rate=Decimal('50'),
+            company=Company.objects.create(name='Other', code='OT'),
+        )
+        self.save_grid([
+            {'member_id': str(self.profiles[0].pk), 'year': 2025, 'month': 2, 'hours': 20},
+            {'member_id': 'abc', 'year': 2025, 'month': 2, 'hours': 10},
+            {'member_id': str(outsider.pk), 'year': 2025, 'month': 2, 'hours': 10},
+            {'year': 2025, 'month': 2, 'hours': 10},
+        ])
+
+        self.assertEqual(list(self.project.allocations.values_list('user_profile', 'allocated_hours')),
+                         [(self.profiles[0].pk, Decimal('20'))])
+        self.assertEqual(self.project.allocated_hours, Decimal('20'))
+
+    def test_deleting_a_profile_or_its_user_updates_rollups(self):
+        self.save_grid([
+            {'member_id': str(self.profiles[0].pk), 'year': 2025, 'month': 2, 'hours': 20},
+            {'member_id': str(self.profiles[1].pk), 'year': 2025, 'month': 3, 'hours': 40},
+        ])
+
+        # The profile's allocations go with it
+        self.profiles[1].user.delete()
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.allocated_hours, self.project.team_size), (Decimal('20'), 1))
+        self.assertEqual(self.project.last_allocated_month, date(2025, 2, 1))
+
+        UserProfile.objects.filter(pk=self.profiles[0].pk).delete()
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.allocated_hours, self.project.team_size), (0, 0))
+        self.assertEqual(refresh_project_rollups(), 0)
+
+    def test_saving_a_project_keeps_its_rollups(self):
+        stale = Project.objects.get(pk=self.project.pk)
+        self.save_grid([{'member_id': str(self.profiles[0].pk), 'year': 2025, 'month': 2, 'hours': 20}])
+
+        stale.name = 'Website Relaunch'
+        stale.save()
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.name, 'Website Relaunch')
+        self.assertEqual((self.project.allocated_hours, self.project.team_size), (Decimal('20'), 1))
+
+        # Admin edits too - the rollups are not on the form
+        response = self.client.post(f'/admin/agency/project/{self.project.pk}/change/', {
+            'name': 'Website', 'client': self.project.client_id, 'company': self.company.pk,
+            'start_date': '2025-01-01', 'end_date': '2025-06-30', 'total_revenue': '10000',
+            'total_hours': '100', 'project_type': 'project', 'revenue_type': 'booked', 'status': 'active',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.name, self.project.status), ('Website', 'active'))
+        self.assertEqual(self.project.allocated_hours, Decimal('20'))
+
+    def test_repair_command(self):
+        ProjectAllocation.objects.create(
+            project=self.project, user_profile=self.profiles[0], year=2025, month=4,
+            allocated_hours=Decimal('12.5'), hourly_rate=Decimal('50'),
+        )
+        # Written behind the write paths' back, so the stored rollups are stale
+        with self.assertRaisesMessage(CommandError, '1 projects have out of date rollups'):
+            call_command('refresh_project_rollups', '--check', stdout=StringIO())
+
+        output = StringIO()
+        call_command('refresh_project_rollups', '--batch-size', '1', stdout=output)
+        self.assertIn('Refreshed 1 projects', output.getvalue())
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.allocated_hours, Decimal('12.5'))
+        self.assertEqual(self.project.allocated_value, Decimal('625'))
+
+        self.assertEqual(refresh_project_rollups(), 0)
+
+    def test_listings_read_the_stored_rollups(self):
+        Project.objects.filter(pk=self.project.pk).update(allocated_hours=Decimal('25'), team_size=3)
+
+        self.client.get('/agency/projects/')  # Caches the first company
+        # session, user, the profile the superuser lacks (looked up each time), projects
+        with self.assertNumQueries(4):
+            response = self.client.get('/agency/projects/')
+        self.assertContains(response, '25% allocated, 3 members')
+
+        response = self.client.get('/admin/agency/project/')
+        self.assertContains(response, '3 members')
+        self.assertContains(response, '25%')
@@ -0,0 +1,65 @@
+import json
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from agency.models import Client, Company, Project, ProjectAllocation, UserProfile
+
+
+@override_settings(REPLICA_DATABASE='replica', REPLICA_PIN_SECONDS=15)
+class ReplicaRouterTests(TestCase):
+    # Two separate test databases, so a read shows which one it came from
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('replica.admin', 'replica@example.com', None)
+        company = Company.objects.create(name='Agency', code='AG')
+        client = Client.objects.create(name='Acme', company=company)
+        self.project = Project.objects.create(
+            name='Website', client=client, company=company,
+            start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+            total_revenue=Decimal('10000'), total_hours=Decimal('100'),
+        )
+        self.profile = UserProfile.objects.create(user=self.admin, company=company, hourly_rate=Decimal('50'))
+        # The same rows on the replica, which has not caught up with the primary's allocation
+        for obj in (User.objects.get(pk=self.admin.pk), company, client, self.project, self.profile):
+            obj.save(using='replica')
+        self.project = Project.objects.get(pk=self.project.pk)
+        ProjectAllocation.objects.create(
+            project=self.project, user_profile=self.profile, year=2025, month=3,
+            allocated_hours=Decimal('10'), hourly_rate=Decimal('50'),
+        )
+        self.client.force_login(self.admin)
+
+    def allocated_hours(self):
+        response = self.client.get('/agency/api/allocation-values/', {'group': 'project', 'year': 2025})
+        return sum(row['hours'] for row in response.json()['rows'])
+
+    def test_analytic_views_read_from_the_replica(self):
+        self.assertEqual(self.allocated_hours(), 0)
+
+        # Not in REPLICA_VIEWS
+        response = self.client.get(f'/agency/projects/{self.project.pk}/')
+        self.assertContains(response, 'Website')
+
+    def test_session_reads_its_writes_until_the_pin_expires(self):
+        response = self.client.post(
+            f'/admin/agency/project/{self.project.pk}/save-allocations/',
+            json.dumps({'allocations': [
+                {'member_id': str(self.profile.pk), 'year': 2025, 'month': 4, 'hours': 30},
+            ]}), content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(ProjectAllocation.objects.using('replica').exists())
+
+        self.assertEqual(self.allocated_hours(), 30)
+        with mock.patch('agency.middleware.time.time', return_value=time.time() + 16):
+            self.assertEqual(self.allocated_hours(), 0)
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_everything_reads_from_the_primary_without_a_replica(self):
+        self.assertEqual(self.allocated_hours(), 10)
@@ -0,0 +1,54 @@
+import tempfile
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from agency.models import Company
+from agency.sqlite import performance_options, write_transaction
+
+
+class PerformanceOptionsTests(TestCase):
+    def test_pragmas_are_set_on_connect(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': str(Path(directory) / 'tuned.sqlite3'),
+                'OPTIONS': performance_options(busy_timeout_ms=1500),
+            })
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {}
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {pragma}')
+                        values[pragma] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+
+        # synchronous=NORMAL is 1
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 1500})
+
+
+class WriteTransactionTests(TransactionTestCase):
+    def begin_statements(self):
+        with CaptureQueriesContext(connection) as queries:
+            with write_transaction():
+                Company.objects.create(name='Agency', code='AG')
+        return [query['sql'] for query in queries if query['sql'].startswith('BEGIN')]
+
+    @override_settings(SQLITE_PERFORMANCE_MODE=True)
+    def test_begins_immediate_in_performance_mode(self):
+        self.assertEqual(self.begin_statements(), ['BEGIN IMMEDIATE'])
+        # Other transactions stay deferred
+        self.assertIsNone(connection.transaction_mode)
+
+    @override_settings(SQLITE_PERFORMANCE_MODE=True)
+    def test_nested_blocks_use_a_savepoint(self):
+        with transaction.atomic():
+            self.assertEqual(self.begin_statements(), [])
+
+    @override_settings(SQLITE_PERFORMANCE_MODE=False)
+    def test_plain_atomic_otherwise(self):
+        self.assertEqual(self.begin_statements(), ['BEGIN'])
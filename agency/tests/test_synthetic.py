@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+
+from agency.models import Client, Company, Cost, MonthlyRevenue, Project, ProjectAllocation, UserProfile
+from agency.rollups import refresh_project_rollups
+from agency.synthetic import COMPANY_CODE_PREFIX, USERNAME_PREFIX, SyntheticDataGenerator
+
+SIZES = {'companies': 2, 'clients': 4, 'projects_per_client': 2, 'profiles': 6}
+
+
+def snapshot():
+    """Every generated row, with users by name - their keys depend on what was deleted before"""
+    return {
+        'companies': sorted(Company.objects.values_list('id', 'code', 'name')),
+        'profiles': sorted(UserProfile.objects.values_list(
+            'user__username', 'company_id', 'role', 'hourly_rate', 'status', 'is_project_manager')),
+        'clients': sorted(Client.objects.values_list('id', 'name', 'company_id', 'status')),
+        'costs': sorted(Cost.objects.values_list('id', 'company_id', 'name', 'amount', 'start_date')),
+        'projects': sorted(Project.objects.values_list(
+            'id', 'name', 'client_id', 'status', 'project_manager__username', 'start_date', 'end_date',
+            'total_revenue', 'allocated_hours', 'allocated_value', 'team_size')),
+        'allocations': sorted(ProjectAllocation.objects.values_list(
+            'id', 'project_id', 'user_profile__user__username', 'year', 'month', 'allocated_hours', 'hourly_rate')),
+        'revenue': sorted(MonthlyRevenue.objects.values_list('id', 'project_id', 'year', 'month', 'revenue')),
+    }
+
+
+def indexes(model):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {name: info['columns'] for name, info in constraints.items() if info['index']}
+
+
+class SyntheticDataTests(TransactionTestCase):
+    def generate(self, seed=42):
+        generator = SyntheticDataGenerator(seed=seed, years=(2024, 2025), **SIZES)
+        generator.generate()
+        return generator
+
+    def clear(self):
+        Company.objects.filter(code__startswith=COMPANY_CODE_PREFIX).delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def test_same_seed_generates_the_same_rows(self):
+        generator = self.generate()
+        first = snapshot()
+        self.assertEqual(len(first['companies']), 2)
+        self.assertEqual(len(first['projects']), 16)
+        self.assertEqual(generator.counts['ProjectAllocation'], len(first['allocations']))
+
+        self.clear()
+        self.generate()
+        self.assertEqual(snapshot(), first)
+
+        self.clear()
+        self.generate(seed=7)
+        other = snapshot()
+        self.assertNotEqual(other['projects'], first['projects'])
+        self.assertNotEqual(other['allocations'], first['allocations'])
+
+    def test_rollups_match_the_generated_rows(self):
+        self.generate()
+        self.assertEqual(refresh_project_rollups(dry_run=True), 0)
+
+    def test_dropped_indexes_are_restored(self):
+        before = {model: indexes(model) for model in SyntheticDataGenerator.DEFERRED_INDEX_MODELS}
+        self.assertTrue(all(before.values()))
+
+        generator = self.generate()
+        self.assertTrue(generator.deferred_indexes)
+        for model, expected in before.items():
+            self.assertEqual(indexes(model), expected)
+
+        # Also when the load fails part way
+        self.clear()
+        with mock.patch.object(SyntheticDataGenerator, 'insert_chunk', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                SyntheticDataGenerator(seed=1, years=(2025,), **SIZES).generate()
+        for model, expected in before.items():
+            self.assertEqual(indexes(model), expected)
+
+    def test_existing_company_is_refused(self):
+        self.generate()
+        with self.assertRaisesMessage(ValueError, 'already exists - clear synthetic data first'):
+            self.generate()
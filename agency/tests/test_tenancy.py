@@ -0,0 +1,117 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from agency import tenancy
+from agency.models import Client, Company, Project, UserProfile
+
+
+class CompanyResolutionTests(TestCase):
+    def setUp(self):
+        self.projects = {}
+        for code in ('AAA', 'BBB'):
+            company = Company.objects.create(name=f'Agency {code}', code=code)
+            client = Client.objects.create(name=f'Client {code}', company=company)
+            self.projects[code] = Project.objects.create(
+                name=f'Project {code}', client=client, company=company,
+                start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+                total_revenue=Decimal('1000'), total_hours=Decimal('10'),
+            )
+        self.member = User.objects.create_user('tenant.member')
+        self.profile = UserProfile.objects.create(user=self.member, company=self.projects['BBB'].company)
+
+    def test_views_are_scoped_to_the_profile_company(self):
+        self.client.force_login(self.member)
+
+        response = self.client.get('/agency/projects/')
+        self.assertContains(response, 'Project BBB')
+        self.assertNotContains(response, 'Project AAA')
+
+        response = self.client.get(f"/agency/projects/{self.projects['AAA'].pk}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_superuser_works_in_the_company_of_the_user_viewed_as(self):
+        self.client.force_login(User.objects.create_superuser('tenant.admin', 'tenant@example.com', None))
+        first = Company.objects.order_by('pk').first()
+
+        response = self.client.get('/agency/projects/')
+        self.assertEqual(response.context['company'], first)
+
+        session = self.client.session
+        session['viewing_as_user'] = str(self.member.pk)
+        session.save()
+        response = self.client.get('/agency/projects/')
+        self.assertEqual(response.context['company'].code, 'BBB')
+
+    def test_company_is_cached_until_a_profile_changes(self):
+        self.client.force_login(self.member)
+        self.client.get('/agency/projects/')
+
+        with self.assertNumQueries(3):  # session, user, projects
+            self.client.get('/agency/projects/')
+
+        self.profile.company = self.projects['AAA'].company
+        self.profile.save()
+        response = self.client.get('/agency/projects/')
+        self.assertContains(response, 'Project AAA')
+
+    def test_user_without_profile_sees_no_company(self):
+        outsider = User.objects.create_user('tenant.outsider')
+        self.client.force_login(outsider)
+
+        response = self.client.get('/agency/projects/')
+
+        self.assertIsNone(response.context['company'])
+        self.assertNotContains(response, 'Project AAA')
+
+        # Not remembered - here the profile is added without save(), as another worker's would be
+        UserProfile.objects.bulk_create([UserProfile(user=outsider, company=self.projects['AAA'].company)])
+        response = self.client.get('/agency/projects/')
+        self.assertContains(response, 'Project AAA')
+
+    def test_requests_get_their_own_company_instance(self):
+        first = tenancy.get_company(self.projects['AAA'].company_id)
+        first.name = 'Changed by one request'
+        second = tenancy.get_company(self.projects['AAA'].company_id)
+
+        self.assertIsNot(second, first)
+        self.assertEqual(second.name, 'Agency AAA')
+        self.assertIsNone(tenancy.get_company(None))
+
+
+class ViewingUserTests(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name='Agency', code='AG')
+        self.member = User.objects.create_user('viewed.member')
+        UserProfile.objects.create(user=self.member, company=company)
+        self.admin = User.objects.create_superuser('viewing.admin', 'viewing@example.com', None)
+
+    def count_queries(self, url):
+        self.client.get(url)  # Warm-up, so per-worker caches do not count
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_viewing_as_costs_no_extra_queries(self):
+        self.client.force_login(self.member)
+        own = self.count_queries('/agency/employee-dashboard/')
+
+        self.client.force_login(self.admin)
+        response = self.client.get('/agency/switch-user/', {'user_id': self.member.pk})
+        self.assertRedirects(response, '/agency/', fetch_redirect_response=False)
+        self.assertRedirects(self.client.get('/agency/'), '/agency/employee-dashboard/')
+
+        self.assertEqual(self.count_queries('/agency/employee-dashboard/'), own)
+
+    def test_switching_back(self):
+        self.client.force_login(self.admin)
+        self.client.get('/agency/switch-user/', {'user_id': self.member.pk})
+        self.client.get('/agency/switch-back/')
+
+        self.assertNotIn('viewing_as_user', self.client.session)
+        self.assertRedirects(self.client.get('/agency/'), '/agency/dashboard/', fetch_redirect_response=False)
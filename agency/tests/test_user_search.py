@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from agency import views
+from agency.models import Company, UserProfile
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Agency', code='AG')
+        other = Company.objects.create(name='Other', code='OT')
+        for first, last, company in [
+            ('Anna', 'Smith', self.company), ('Ann', 'Jones', self.company), ('Bob', 'Anderson', self.company),
+            ('Carl', 'Brown', self.company), ('Anne', 'Other', other),
+        ]:
+            user = User.objects.create_user(f'{first}.{last}'.lower(), first_name=first, last_name=last)
+            UserProfile.objects.create(user=user, company=company)
+        self.admin = User.objects.create_superuser('search.admin', 'search@example.com', None)
+        UserProfile.objects.create(user=self.admin, company=self.company)
+        self.client.force_login(self.admin)
+
+    def search(self, **params):
+        response = self.client.get('/agency/api/user-search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_of_any_name_in_the_company(self):
+        names = [user['name'] for user in self.search(q='an')['results']]
+
+        # By last name; the other company's Anne is left out
+        self.assertEqual(names, ['Bob Anderson', 'Ann Jones', 'Anna Smith'])
+        self.assertEqual([user['name'] for user in self.search(q='ANN SM')['results']], ['Anna Smith'])
+        self.assertEqual([user['name'] for user in self.search(q='carl.')['results']], ['Carl Brown'])
+
+    def test_pages(self):
+        with mock.patch.object(views, 'USER_SEARCH_PAGE_SIZE', 2):
+            pages = [self.search(page=page) for page in (1, 2, 3)]
+
+        self.assertEqual([page['has_more'] for page in pages], [True, True, False])
+        # The four profiles plus the admin's own
+        self.assertEqual(sum(len(page['results']) for page in pages), 5)
+
+    def test_superusers_only(self):
+        self.client.force_login(User.objects.get(username='anna.smith'))
+
+        response = self.client.get('/agency/api/user-search/', {'q': 'an'})
+
+        self.assertEqual(response.status_code, 403)
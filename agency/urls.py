@@ -2,7 +2,7 @@
 
 # agency/urls.py - Updated URLs
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'agency'
 
@@ -30,6 +30,14 @@ urlpatterns = [
     # API endpoints
     path('api/revenue-chart/', views.revenue_chart_data, name='revenue_chart_data'),
     path('api/capacity-chart/', views.capacity_chart_data, name='capacity_chart_data'),
+    path('api/allocation-values/', views.allocation_values, name='allocation_values'),
+    path('api/user-search/', views.user_search, name='user_search'),
     path('api/dashboard-data/', views.dashboard_data_api, name='dashboard_data_api'),  # NEW ENDPOINT
     path('api/health/', views.health_check, name='health_check'),
+    path('api/metrics/', views.metrics, name='metrics'),
+    path('api/import-jobs/<uuid:job_id>/', views.import_job_status, name='import_job_status'),
+
+    # The analytics APIs with their independent parts computed concurrently (agency.async_views)
+    path('api/async/revenue-chart/', async_views.revenue_chart_data, name='revenue_chart_data_async'),
+    path('api/async/dashboard-data/', async_views.dashboard_data_api, name='dashboard_data_api_async'),
 ]
\ No newline at end of file
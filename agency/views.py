@@ -1,14 +1,19 @@
 # agency/views.py - Complete updated views with proper detail pages
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import reverse
 from django.db.models import Sum, Q, Count, F, Avg
+from django.db.models.functions import Lower
+from django.core.cache import cache
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 import json
 import calendar
+import hashlib
+import secrets
 
 # Import all models
 from .models import (
@@ -22,6 +27,12 @@ from .models import (
     Company, UserProfile, Client, Project, ProjectAllocation, 
     MonthlyRevenue, Expense, ContractorExpense, Cost, CapacitySnapshot
 )
+from .models import ImportJob
+from .forms import ImportUploadForm
+from .fragments import cache_seconds as fragment_cache_seconds, data_version, month_key
+from .metrics import REGISTRY, CONTENT_TYPE
+from .responses import FastJsonResponse
+from .tenancy import get_viewing_user, set_viewing_as
 
 def calculate_monthly_operating_costs(company, year, month):
     """Calculate total operating costs for a specific month"""
@@ -86,24 +97,13 @@ def calculate_monthly_operating_costs(company, year, month):
 @login_required
 def dashboard_router(request):
     """Route to appropriate dashboard based on user role"""
-    # Check if superadmin is viewing as another user
-    if request.user.is_superuser and 'viewing_as_user' in request.session:
-        try:
-            view_as_user = User.objects.get(id=request.session['viewing_as_user'])
-            if hasattr(view_as_user, 'profile'):
-                if view_as_user.profile.is_project_manager:
-                    return redirect('agency:pm_dashboard')
-                else:
-                    return redirect('agency:employee_dashboard')
-        except:
-            pass
-    
-    # Normal routing
-    if request.user.is_superuser:
+    # A superadmin viewing as another user gets that user's dashboard
+    viewing_user = get_viewing_user(request)
+    if request.user.is_superuser and viewing_user == request.user:
         return redirect('agency:dashboard')
     
     try:
-        profile = request.user.profile
+        profile = viewing_user.profile
         if profile.is_project_manager:
             return redirect('agency:pm_dashboard')
         else:
@@ -111,215 +111,226 @@ def dashboard_router(request):
     except:
         return redirect('agency:dashboard')
 
-def get_viewing_user(request):
-    """Get the user we should display data for"""
-    if request.user.is_superuser and 'viewing_as_user' in request.session:
-        try:
-            return User.objects.get(id=request.session['viewing_as_user'])
-        except:
-            pass
-    return request.user
+def dashboard_metrics(company, current_year, current_month):
+    """The dashboard's KPI figures for a company in a month"""
+    # Basic metrics
+    total_clients = Client.objects.filter(company=company, status='active').count()
+    total_projects = Project.objects.filter(company=company).count()
+    
+    # Check if revenue_type field exists on Project model
+    try:
+        booked_projects = Project.objects.filter(company=company, revenue_type='booked').count()
+        forecast_projects = Project.objects.filter(company=company, revenue_type='forecast').count()
+    except:
+        # If revenue_type doesn't exist yet, just count all projects
+        booked_projects = total_projects
+        forecast_projects = 0
+    
+    total_team_members = UserProfile.objects.filter(company=company, status='full_time').count()
+    
+    # Current month revenue - calculate from both sources
+    current_revenue = Decimal('0')
+    
+    # First try MonthlyRevenue table
+    monthly_rev = MonthlyRevenue.objects.filter(
+        company=company,
+        year=current_year,
+        month=current_month,
+        revenue_type='booked'
+    ).aggregate(total=Sum('revenue'))['total'] or Decimal('0')
+    
+    if monthly_rev > 0:
+        current_revenue = monthly_rev
+    else:
+        # Calculate from projects if no monthly revenue
+        projects = Project.objects.filter(
+            company=company,
+            revenue_type='booked',
+            start_date__lte=date(current_year, current_month, 28),
+            end_date__gte=date(current_year, current_month, 1)
+        )
+        for project in projects:
+            # Simple calculation - divide total by project duration in months
+            duration_months = ((project.end_date.year - project.start_date.year) * 12 + 
+                             project.end_date.month - project.start_date.month + 1)
+            if duration_months > 0:
+                current_revenue += project.total_revenue / duration_months
+    
+    # Annual revenue - properly calculate from both booked and forecast
+    annual_booked_revenue = Decimal('0')
+    annual_forecast_revenue = Decimal('0')
+    
+    # Try MonthlyRevenue first
+    monthly_booked = MonthlyRevenue.objects.filter(
+        company=company,
+        year=current_year,
+        revenue_type='booked'
+    ).aggregate(total=Sum('revenue'))['total'] or Decimal('0')
+    
+    monthly_forecast = MonthlyRevenue.objects.filter(
+        company=company,
+        year=current_year,
+        revenue_type='forecast'
+    ).aggregate(total=Sum('revenue'))['total'] or Decimal('0')
+    
+    if monthly_booked > 0 or monthly_forecast > 0:
+        annual_booked_revenue = monthly_booked
+        annual_forecast_revenue = monthly_forecast
+    else:
+        # Calculate from Projects
+        for project in Project.objects.filter(company=company):
+            try:
+                revenue_type = getattr(project, 'revenue_type', 'booked')
+            except:
+                revenue_type = 'booked'
+            
+            # Calculate how much of this project falls in current year
+            year_start = date(current_year, 1, 1)
+            year_end = date(current_year, 12, 31)
+            
+            project_start = max(project.start_date, year_start)
+            project_end = min(project.end_date, year_end)
+            
+            if project_start <= project_end:
+                # Project overlaps with current year
+                total_project_days = (project.end_date - project.start_date).days + 1
+                year_project_days = (project_end - project_start).days + 1
+                
+                if total_project_days > 0:
+                    year_revenue = project.total_revenue * Decimal(year_project_days) / Decimal(total_project_days)
+                    
+                    if revenue_type == 'forecast':
+                        annual_forecast_revenue += year_revenue
+                    else:
+                        annual_booked_revenue += year_revenue
+    
+    total_annual_revenue = annual_booked_revenue + annual_forecast_revenue
+    
+    # Monthly costs calculation
+    payroll_costs = Decimal('0')
+    contractor_costs = Decimal('0')
+    other_costs = Decimal('0')
+    
+    # Calculate payroll costs from team members
+    team_members = UserProfile.objects.filter(company=company, status='full_time')
+    for member in team_members:
+        payroll_costs += member.monthly_salary_cost
+    
+    # Try to get costs from Cost model if it exists
+    try:
+        costs_this_month = Cost.objects.filter(
+            company=company,
+            start_date__lte=date(current_year, current_month, 1),
+            is_active=True
+        ).filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=date(current_year, current_month, 1))
+        )
+        
+        for cost in costs_this_month:
+            cost_amount = cost.monthly_amount
+            if cost.is_contractor:
+                contractor_costs += cost_amount
+            elif cost.cost_type != 'payroll':
+                other_costs += cost_amount
+    except:
+        # If Cost model doesn't exist, use legacy models
+        expenses = Expense.objects.filter(company=company, is_active=True)
+        for expense in expenses:
+            other_costs += expense.monthly_amount
+        
+        contractor_expenses = ContractorExpense.objects.filter(
+            company=company, year=current_year, month=current_month
+        )
+        for expense in contractor_expenses:
+            contractor_costs += expense.amount
+    
+    current_month_costs = payroll_costs + contractor_costs + other_costs
+    
+    # Annual costs
+    total_annual_costs = current_month_costs * 12  # Simplified calculation
+    
+    # Profit calculations
+    monthly_profit = current_revenue - current_month_costs
+    monthly_profit_margin = (monthly_profit / current_revenue * 100) if current_revenue > 0 else Decimal('0')
+    
+    annual_profit = total_annual_revenue - total_annual_costs
+    annual_profit_margin = (annual_profit / total_annual_revenue * 100) if total_annual_revenue > 0 else Decimal('0')
+
+    return {
+        'total_clients': total_clients,
+        'total_projects': total_projects,
+        'booked_projects': booked_projects,
+        'forecast_projects': forecast_projects,
+        'total_team_members': total_team_members,
+        
+        # Revenue metrics
+        'current_revenue': current_revenue,
+        'annual_booked_revenue': annual_booked_revenue,
+        'annual_forecast_revenue': annual_forecast_revenue,
+        'total_annual_revenue': total_annual_revenue,
+        
+        # Cost metrics
+        'current_month_costs': current_month_costs,
+        'payroll_costs': payroll_costs,
+        'contractor_costs': contractor_costs,
+        'other_costs': other_costs,
+        'total_annual_costs': total_annual_costs,
+        
+        # Profit metrics
+        'monthly_profit': monthly_profit,
+        'monthly_profit_margin': monthly_profit_margin,
+        'annual_profit': annual_profit,
+        'annual_profit_margin': annual_profit_margin,
+    }
+
+def dashboard_context(company, current_year, current_month):
+    """Template context of the dashboard
+
+    The figures and the rendered KPI fragments are both cached under the
+    company's data version and the month, until that data changes.
+    """
+    company_id = company.pk if company else None
+    version = data_version(company_id)
+    month = month_key(current_year, current_month)
+    key = f'agency:dashboard:{company_id}:{version}:{month}'
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = dashboard_metrics(company, current_year, current_month)
+        cache.set(key, metrics, fragment_cache_seconds())
+    
+    return {
+        'company': company,
+        **metrics,
+        'current_year': current_year,
+        'current_month': current_month,
+        
+        # Keys of the {% cache %} fragments
+        'data_version': version,
+        'month_key': month,
+        'fragment_cache_seconds': fragment_cache_seconds(),
+        
+        # Add initial chart data for current year
+        'months': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+        'booked': [0] * 12,
+        'forecast': [0] * 12,
+        'combined': [0] * 12,
+        'expenses': [0] * 12,
+    }
 
 @login_required
 def dashboard(request):
     """Enhanced dashboard with comprehensive metrics"""
     try:
-        company = Company.objects.first()
-        if not company:
+        company = request.company
+        if not company and not Company.objects.exists():
             # Create default company if none exists
             company = Company.objects.create(name="Default Company", code="DC")
         
         current_year = datetime.now().year
         current_month = datetime.now().month
         
-        # Basic metrics
-        total_clients = Client.objects.filter(company=company, status='active').count()
-        total_projects = Project.objects.filter(company=company).count()
-        
-        # Check if revenue_type field exists on Project model
-        try:
-            booked_projects = Project.objects.filter(company=company, revenue_type='booked').count()
-            forecast_projects = Project.objects.filter(company=company, revenue_type='forecast').count()
-        except:
-            # If revenue_type doesn't exist yet, just count all projects
-            booked_projects = total_projects
-            forecast_projects = 0
-        
-        total_team_members = UserProfile.objects.filter(company=company, status='full_time').count()
-        
-        # Current month revenue - calculate from both sources
-        current_revenue = Decimal('0')
-        
-        # First try MonthlyRevenue table
-        monthly_rev = MonthlyRevenue.objects.filter(
-            company=company,
-            year=current_year,
-            month=current_month,
-            revenue_type='booked'
-        ).aggregate(total=Sum('revenue'))['total'] or Decimal('0')
-        
-        if monthly_rev > 0:
-            current_revenue = monthly_rev
-        else:
-            # Calculate from projects if no monthly revenue
-            projects = Project.objects.filter(
-                company=company,
-                revenue_type='booked',
-                start_date__lte=date(current_year, current_month, 28),
-                end_date__gte=date(current_year, current_month, 1)
-            )
-            for project in projects:
-                # Simple calculation - divide total by project duration in months
-                duration_months = ((project.end_date.year - project.start_date.year) * 12 + 
-                                 project.end_date.month - project.start_date.month + 1)
-                if duration_months > 0:
-                    current_revenue += project.total_revenue / duration_months
-        
-        # Annual revenue - properly calculate from both booked and forecast
-        annual_booked_revenue = Decimal('0')
-        annual_forecast_revenue = Decimal('0')
-        
-        # Try MonthlyRevenue first
-        monthly_booked = MonthlyRevenue.objects.filter(
-            company=company,
-            year=current_year,
-            revenue_type='booked'
-        ).aggregate(total=Sum('revenue'))['total'] or Decimal('0')
-        
-        monthly_forecast = MonthlyRevenue.objects.filter(
-            company=company,
-            year=current_year,
-            revenue_type='forecast'
-        ).aggregate(total=Sum('revenue'))['total'] or Decimal('0')
-        
-        if monthly_booked > 0 or monthly_forecast > 0:
-            annual_booked_revenue = monthly_booked
-            annual_forecast_revenue = monthly_forecast
-        else:
-            # Calculate from Projects
-            for project in Project.objects.filter(company=company):
-                try:
-                    revenue_type = getattr(project, 'revenue_type', 'booked')
-                except:
-                    revenue_type = 'booked'
-                
-                # Calculate how much of this project falls in current year
-                year_start = date(current_year, 1, 1)
-                year_end = date(current_year, 12, 31)
-                
-                project_start = max(project.start_date, year_start)
-                project_end = min(project.end_date, year_end)
-                
-                if project_start <= project_end:
-                    # Project overlaps with current year
-                    total_project_days = (project.end_date - project.start_date).days + 1
-                    year_project_days = (project_end - project_start).days + 1
-                    
-                    if total_project_days > 0:
-                        year_revenue = project.total_revenue * Decimal(year_project_days) / Decimal(total_project_days)
-                        
-                        if revenue_type == 'forecast':
-                            annual_forecast_revenue += year_revenue
-                        else:
-                            annual_booked_revenue += year_revenue
-        
-        total_annual_revenue = annual_booked_revenue + annual_forecast_revenue
-        
-        # Monthly costs calculation
-        payroll_costs = Decimal('0')
-        contractor_costs = Decimal('0')
-        other_costs = Decimal('0')
-        
-        # Calculate payroll costs from team members
-        team_members = UserProfile.objects.filter(company=company, status='full_time')
-        for member in team_members:
-            payroll_costs += member.monthly_salary_cost
+        context = dashboard_context(company, current_year, current_month)
         
-        # Try to get costs from Cost model if it exists
-        try:
-            costs_this_month = Cost.objects.filter(
-                company=company,
-                start_date__lte=date(current_year, current_month, 1),
-                is_active=True
-            ).filter(
-                Q(end_date__isnull=True) | Q(end_date__gte=date(current_year, current_month, 1))
-            )
-            
-            for cost in costs_this_month:
-                cost_amount = cost.monthly_amount
-                if cost.is_contractor:
-                    contractor_costs += cost_amount
-                elif cost.cost_type != 'payroll':
-                    other_costs += cost_amount
-        except:
-            # If Cost model doesn't exist, use legacy models
-            expenses = Expense.objects.filter(company=company, is_active=True)
-            for expense in expenses:
-                other_costs += expense.monthly_amount
-            
-            contractor_expenses = ContractorExpense.objects.filter(
-                company=company, year=current_year, month=current_month
-            )
-            for expense in contractor_expenses:
-                contractor_costs += expense.amount
-        
-        current_month_costs = payroll_costs + contractor_costs + other_costs
-        
-        # Annual costs
-        total_annual_costs = current_month_costs * 12  # Simplified calculation
-        
-        # Profit calculations
-        monthly_profit = current_revenue - current_month_costs
-        monthly_profit_margin = (monthly_profit / current_revenue * 100) if current_revenue > 0 else Decimal('0')
-        
-        annual_profit = total_annual_revenue - total_annual_costs
-        annual_profit_margin = (annual_profit / total_annual_revenue * 100) if total_annual_revenue > 0 else Decimal('0')
-        
-        context = {
-            'company': company,
-            'total_clients': total_clients,
-            'total_projects': total_projects,
-            'booked_projects': booked_projects,
-            'forecast_projects': forecast_projects,
-            'total_team_members': total_team_members,
-            
-            # Revenue metrics
-            'current_revenue': current_revenue,
-            'annual_booked_revenue': annual_booked_revenue,
-            'annual_forecast_revenue': annual_forecast_revenue,
-            'total_annual_revenue': total_annual_revenue,
-            
-            # Cost metrics
-            'current_month_costs': current_month_costs,
-            'payroll_costs': payroll_costs,
-            'contractor_costs': contractor_costs,
-            'other_costs': other_costs,
-            'total_annual_costs': total_annual_costs,
-            
-            # Profit metrics
-            'monthly_profit': monthly_profit,
-            'monthly_profit_margin': monthly_profit_margin,
-            'annual_profit': annual_profit,
-            'annual_profit_margin': annual_profit_margin,
-            
-            'current_year': current_year,
-            'current_month': current_month,
-        
-            
-            # Add initial chart data for current year
-            'months': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
-            'booked': [0] * 12,
-            'forecast': [0] * 12,
-            'combined': [0] * 12,
-            'expenses': [0] * 12,
-        }
-        
-        # Add all profiles for user switcher if superuser
-        if request.user.is_superuser:
-            context["all_profiles"] = UserProfile.objects.filter(
-                company=company
-            ).select_related("user").order_by("user__last_name", "user__first_name")
-
         return render(request, 'dashboard.html', context)
     
     except Exception as e:
@@ -332,18 +343,9 @@ def dashboard(request):
             'total_annual_revenue': Decimal('0'),
             'current_month_costs': Decimal('0'),
             'monthly_profit': Decimal('0'),
+            # Not cached, so the figures show again once the error is gone
+            'fragment_cache_seconds': 0,
         }
-        # Add all profiles for user switcher if superuser
-        if request.user.is_superuser:
-            try:
-                company = Company.objects.first()
-                if company:
-                    context["all_profiles"] = UserProfile.objects.filter(
-                        company=company
-                    ).select_related("user").order_by("user__last_name", "user__first_name")
-            except:
-                pass
-
         return render(request, 'dashboard.html', context)
 
 @login_required
@@ -353,7 +355,7 @@ def pm_dashboard(request):
     
     try:
         user_profile = viewing_user.profile
-        company = user_profile.company
+        company = request.company
         current_year = datetime.now().year
         current_month = datetime.now().month
         
@@ -385,27 +387,20 @@ def pm_dashboard(request):
         
         # Project details with allocation status
         projects_data = []
+        # Allocated hours and team size are stored on the project - see agency.rollups
         for project in managed_projects.filter(status__in=['active', 'planning']):
-            allocated = project.allocations.aggregate(
-                total=Sum('allocated_hours')
-            )['total'] or Decimal('0')
-            
-            total_hours = project.total_hours or Decimal('0')
-            utilization = (float(allocated) / float(total_hours) * 100) if total_hours > 0 else 0
-            
-            # Get team members for this project
-            if hasattr(project, 'team_members'):
-                team_size = project.team_members.count()
-            else:
-                team_size = project.allocations.values('user_profile').distinct().count()
+            utilization = project.allocation_percentage or 0
             
             projects_data.append({
                 'project': project,
-                'allocated_hours': allocated,
+                'allocated_hours': project.allocated_hours,
                 'utilization': utilization,
-                'team_size': team_size,
+                'team_size': project.team_size,
                 'health': 'good' if utilization >= 80 else 'warning' if utilization >= 50 else 'critical'
             })
+        health_counts = {health: 0 for health in ('good', 'warning', 'critical')}
+        for project_data in projects_data:
+            health_counts[project_data['health']] += 1
         
         context = {
             'user': viewing_user,
@@ -417,6 +412,7 @@ def pm_dashboard(request):
             'team_members': team_members_count,
             'total_allocated_hours': current_allocations,
             'projects_data': projects_data,
+            'health_counts': health_counts,
             'current_year': current_year,
             'current_month': current_month,
         }
@@ -434,7 +430,7 @@ def employee_dashboard(request):
     
     try:
         user_profile = viewing_user.profile
-        company = user_profile.company
+        company = request.company
         current_year = datetime.now().year
         current_month = datetime.now().month
         
@@ -465,7 +461,7 @@ def employee_dashboard(request):
                 'project': allocation.project,
                 'client': allocation.project.client,
                 'hours': allocation.allocated_hours,
-                'value': allocation.allocated_hours * allocation.hourly_rate
+                'value': allocation.value
             })
         
         # Historical data (last 6 months)
@@ -525,11 +521,11 @@ def employee_dashboard(request):
 def switch_user_view(request):
     """Allow superadmin to switch to another user's view"""
     if not request.user.is_superuser:
-        return JsonResponse({'error': 'Unauthorized'}, status=403)
+        return FastJsonResponse({'error': 'Unauthorized'}, status=403)
     
     user_id = request.GET.get('user_id')
     if user_id:
-        request.session['viewing_as_user'] = user_id
+        set_viewing_as(request, user_id)
         return redirect('agency:dashboard_router')
     
     return redirect('agency:dashboard')
@@ -537,10 +533,74 @@ def switch_user_view(request):
 @login_required
 def switch_back_to_admin(request):
     """Switch back to admin view"""
-    if 'viewing_as_user' in request.session:
-        del request.session['viewing_as_user']
+    set_viewing_as(request, None)
     return redirect('agency:dashboard')
 
+# Results per page of user_search
+USER_SEARCH_PAGE_SIZE = 20
+
+def _name_prefix(field, term):
+    """Q matching term as a case-insensitive prefix of field
+
+    A range on LOWER(field) rather than LIKE, so the expression indexes
+    migration 0023 adds on auth_user serve it on SQLite and PostgreSQL.
+    """
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term[:-1] + chr(ord(term[-1]) + 1)})
+
+@login_required
+def user_search(request):
+    """API endpoint for the dashboard's user switcher - superusers only
+
+    Profiles of the company whose first name, last name or username starts
+    with each word of ?q=, by name, a page (?page=, from 1) at a time.
+    Pages are cached for USER_SEARCH_CACHE_SECONDS.
+    """
+    if not request.user.is_superuser:
+        return FastJsonResponse({'error': 'Unauthorized'}, status=403)
+    company = request.company
+    if not company:
+        return FastJsonResponse({'error': 'No company found'}, status=404)
+
+    terms = request.GET.get('q', '').lower().split()[:3]
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return FastJsonResponse({'error': 'Invalid page'}, status=400)
+
+    key = 'agency:user_search:{}:{}:{}'.format(
+        company.pk, page, hashlib.md5(' '.join(terms).encode()).hexdigest()
+    )
+    data = cache.get(key)
+    if data is None:
+        profiles = UserProfile.objects.filter(company=company).alias(
+            first=Lower('user__first_name'), last=Lower('user__last_name'), login=Lower('user__username'),
+        )
+        for term in terms:
+            profiles = profiles.filter(
+                _name_prefix('first', term) | _name_prefix('last', term) | _name_prefix('login', term)
+            )
+        start = (page - 1) * USER_SEARCH_PAGE_SIZE
+        # One row past the page tells whether there is another, without a COUNT
+        rows = list(profiles.order_by('user__last_name', 'user__first_name', 'user_id').values(
+            'user_id', 'user__first_name', 'user__last_name', 'user__username', 'role', 'is_project_manager',
+        )[start:start + USER_SEARCH_PAGE_SIZE + 1])
+        data = {
+            'page': page,
+            'has_more': len(rows) > USER_SEARCH_PAGE_SIZE,
+            'results': [
+                {
+                    'id': row['user_id'],
+                    'name': f"{row['user__first_name']} {row['user__last_name']}".strip() or row['user__username'],
+                    'username': row['user__username'],
+                    'role': dict(UserProfile.ROLE_CHOICES).get(row['role'], row['role']),
+                    'is_project_manager': row['is_project_manager'],
+                }
+                for row in rows[:USER_SEARCH_PAGE_SIZE]
+            ],
+        }
+        cache.set(key, data, getattr(settings, 'USER_SEARCH_CACHE_SECONDS', 60))
+    return FastJsonResponse(data, request=request)
+
 @login_required
 def admin_dashboard(request):
     """Admin dashboard with user switching (alias for main dashboard)"""
@@ -549,27 +609,34 @@ def admin_dashboard(request):
 @login_required
 def revenue_chart_data(request):
     """API endpoint for revenue chart data - FIXED FORECAST CALCULATION"""
-    company = Company.objects.first()
+    company = request.company
     if not company:
-        return JsonResponse({
-            'months': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
-            'booked': [0] * 12,
-            'forecast': [0] * 12,
-            'combined': [0] * 12,
-            'expenses': [0] * 12,
-            'year': 2025,
-            'error': 'No company found'
-        })
+        return FastJsonResponse(EMPTY_REVENUE_CHART)
     
     year = int(request.GET.get('year', datetime.now().year))
-    
-    # Initialize monthly data
+    revenue = revenue_chart_revenue(company, year)
+    expenses = revenue_chart_expenses(company, year)
+    return FastJsonResponse(revenue_chart_payload(company, year, revenue, expenses), request=request)
+
+
+EMPTY_REVENUE_CHART = {
+    'months': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+    'booked': [0] * 12,
+    'forecast': [0] * 12,
+    'combined': [0] * 12,
+    'expenses': [0] * 12,
+    'year': 2025,
+    'error': 'No company found'
+}
+
+
+def revenue_chart_revenue(company, year):
+    """Booked and forecast revenue by month (1-12) of year, from MonthlyRevenue and projects"""
     monthly_data = {}
     for month in range(1, 13):
         monthly_data[month] = {
             'booked': 0, 
             'forecast': 0,
-            'expenses': 0
         }
     
     try:
@@ -579,12 +646,10 @@ def revenue_chart_data(request):
             year=year
         ).values('month', 'revenue_type').annotate(total=Sum('revenue'))
         
-        monthly_revenue_data_found = False
         for revenue in monthly_revenues:
-            monthly_revenue_data_found = True
             month = revenue['month']
             revenue_type = revenue['revenue_type']
-            total = float(revenue['total'])
+            total = revenue['total']
             if month in monthly_data and revenue_type in ['booked', 'forecast']:
                 monthly_data[month][revenue_type] = total
         
@@ -625,7 +690,7 @@ def revenue_chart_data(request):
                             current_date = current_date.replace(month=current_date.month + 1)
                     
                     if total_project_months > 0:
-                        monthly_amount = float(project.total_revenue) / total_project_months
+                        monthly_amount = project.total_revenue / total_project_months
                         
                         # Now add this amount to each month in the overlap period
                         current_month = overlap_start.replace(day=1)
@@ -640,28 +705,39 @@ def revenue_chart_data(request):
                             else:
                                 current_month = current_month.replace(month=current_month.month + 1)
                         
-            except Exception as e:
+            except Exception:
                 continue
         
-        # Calculate operating expenses for each month
-        for month in range(1, 13):
-            monthly_data[month]['expenses'] = float(
-                calculate_monthly_operating_costs(company, year, month)
-            )
-        
-    except Exception as e:
+    except Exception:
         import traceback
         traceback.print_exc()
     
+    return monthly_data
+
+
+def revenue_chart_expenses(company, year):
+    """Operating expenses by month (1-12) of year"""
+    expenses = {month: 0 for month in range(1, 13)}
+    try:
+        for month in range(1, 13):
+            expenses[month] = calculate_monthly_operating_costs(company, year, month)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+    return expenses
+
+
+def revenue_chart_payload(company, year, monthly_data, expenses):
+    """The revenue chart's response from revenue_chart_revenue() and revenue_chart_expenses()"""
     # Convert to lists for chart
     months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
     booked_data = [monthly_data[i+1]['booked'] for i in range(12)]
     forecast_data = [monthly_data[i+1]['forecast'] for i in range(12)]
     combined_data = [monthly_data[i+1]['booked'] + monthly_data[i+1]['forecast'] for i in range(12)]
-    expenses_data = [monthly_data[i+1]['expenses'] for i in range(12)]
+    expenses_data = [expenses[i+1] for i in range(12)]
     
-    response_data = {
+    return {
         'months': months,
         'booked': booked_data,
         'forecast': forecast_data,
@@ -677,13 +753,11 @@ def revenue_chart_data(request):
             'data_source': 'combined'  # We now always combine both sources
         }
     }
-    
-    return JsonResponse(response_data)
 
 @login_required
 def projects_list(request):
     """List all projects with revenue type filter"""
-    company = Company.objects.first()
+    company = request.company
     revenue_type = request.GET.get('revenue_type', 'all')
     
     projects = Project.objects.filter(company=company).select_related('client')
@@ -708,7 +782,7 @@ def projects_list(request):
 @login_required
 def clients_list(request):
     """List all clients"""
-    company = Company.objects.first()
+    company = request.company
     clients = Client.objects.filter(company=company).order_by('name')
     
     context = {
@@ -721,7 +795,7 @@ def clients_list(request):
 @login_required
 def team_list(request):
     """List all team members"""
-    company = Company.objects.first()
+    company = request.company
     team_members = UserProfile.objects.filter(company=company).select_related('user').order_by('user__last_name')
     
     context = {
@@ -734,7 +808,7 @@ def team_list(request):
 @login_required
 def capacity_dashboard(request):
     """Capacity planning dashboard"""
-    company = Company.objects.first()
+    company = request.company
     
     # Calculate current month utilization
     current_year = datetime.now().year
@@ -768,13 +842,32 @@ def capacity_dashboard(request):
 
 def health_check(request):
     """Simple health check endpoint"""
-    return JsonResponse({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+    return FastJsonResponse({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+
+def metrics(request):
+    """Prometheus scrape endpoint - needs the METRICS_TOKEN bearer token, or staff without one"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        allowed = secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        # Never public, even when nobody has set a token
+        allowed = request.user.is_staff
+    if not allowed:
+        return FastJsonResponse({'error': 'Unauthorized'}, status=401)
+
+    # Queue depth is read from the database at scrape time
+    job_counts = ImportJob.objects.values('status').annotate(count=Count('id')).order_by('status')
+    queue = [({'status': row['status']}, row['count']) for row in job_counts]
+    body = REGISTRY.render(extra=[
+        ('agency_import_jobs_current', 'gauge', 'Import jobs by current status.', queue),
+    ])
+    return HttpResponse(body, content_type=CONTENT_TYPE)
 
 # Detail view implementations
 @login_required
 def client_detail(request, client_id):
     """Client detail view with projects"""
-    client = get_object_or_404(Client, id=client_id)
+    client = get_object_or_404(Client, id=client_id, company=request.company)
     projects = client.projects.all().order_by('-created_at')
     
     context = {
@@ -787,42 +880,138 @@ def client_detail(request, client_id):
 @login_required
 def project_detail(request, project_id):
     """Project detail view with allocations"""
-    project = get_object_or_404(Project, id=project_id)
+    project = get_object_or_404(Project, id=project_id, company=request.company)
     allocations = ProjectAllocation.objects.filter(project=project).select_related(
         'user_profile', 'user_profile__user'
     ).order_by('year', 'month', 'user_profile__user__last_name')
     
-    # Calculate team size
-    if hasattr(project, 'team_members'):
-        team_size = project.team_members.count()
-    else:
-        team_size = allocations.values('user_profile').distinct().count()
-    
     context = {
         'project': project,
         'allocations': allocations,
-        'team_size': team_size,
+        'team_size': project.team_size,
     }
     
     return render(request, 'projects/detail.html', context)
 
+def _import_job_data(job):
+    return {
+        'id': str(job.id),
+        'file': job.original_name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'rows_processed': job.rows_processed,
+        'rows_per_second': job.rows_per_second,
+        'counts': job.counts,
+        'errors': job.errors,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('agency:import_job_status', args=[job.id]),
+    }
+
 @login_required
 def import_data(request):
-    """Import data from spreadsheet"""
-    return JsonResponse({'error': 'Not implemented yet'})
+    """Upload a spreadsheet and queue it for the run_import_jobs worker"""
+    if not request.user.is_staff:
+        return FastJsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    company = request.company
+    if request.method == 'POST':
+        if not company:
+            return FastJsonResponse({'error': 'No company found'}, status=404)
+        form = ImportUploadForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return FastJsonResponse({'errors': form.errors}, status=400)
+        
+        upload = form.cleaned_data['file']
+        job = ImportJob.objects.create(
+            company=company,
+            uploaded_by=request.user,
+            file=upload,
+            original_name=upload.name,
+            sheet=form.cleaned_data['sheet'],
+        )
+        # The worker does the import - respond straight away with the job to poll
+        return FastJsonResponse(_import_job_data(job), status=202)
+    
+    context = {
+        'form': ImportUploadForm(),
+        'jobs': ImportJob.objects.filter(company=company)[:20] if company else [],
+    }
+    return render(request, 'import.html', context)
+
+@login_required
+def import_job_status(request, job_id):
+    """API endpoint polled for the progress of a background import"""
+    if not request.user.is_staff:
+        return FastJsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    job = get_object_or_404(ImportJob, id=job_id, company=request.company)
+    return FastJsonResponse(_import_job_data(job))
+
+# Grouping keys of allocation_values: the columns grouped by, in output order
+ALLOCATION_VALUE_GROUPS = {
+    'project': ['project_id', 'project__name'],
+    'person': ['user_profile_id', 'user_profile__user__first_name', 'user_profile__user__last_name'],
+    'client': ['project__client_id', 'project__client__name'],
+    'month': ['year', 'month'],
+}
+
+@login_required
+def allocation_values(request):
+    """Allocated hours and value per project, person, client or month of a year
+
+    One grouped query over the stored ProjectAllocation.value column;
+    ?month= narrows the year to one month.
+    """
+    company = request.company
+    if not company:
+        return FastJsonResponse({'error': 'No company found'}, status=404)
+
+    group = request.GET.get('group', 'month')
+    if group not in ALLOCATION_VALUE_GROUPS:
+        return FastJsonResponse({'error': f"group must be one of {', '.join(ALLOCATION_VALUE_GROUPS)}"}, status=400)
+    try:
+        year = int(request.GET.get('year', datetime.now().year))
+        month = int(request.GET['month']) if request.GET.get('month') else None
+    except ValueError:
+        return FastJsonResponse({'error': 'Invalid year or month'}, status=400)
+
+    allocations = ProjectAllocation.objects.filter(project__company=company, year=year)
+    if month:
+        allocations = allocations.filter(month=month)
+    columns = ALLOCATION_VALUE_GROUPS[group]
+    rows = allocations.values(*columns).annotate(
+        hours=Sum('allocated_hours'), total_value=Sum('value')
+    ).order_by(*columns)
+
+    # The Decimal sums are serialized as numbers as they are
+    return FastJsonResponse({
+        'group': group,
+        'year': year,
+        'month': month,
+        'rows': [
+            {
+                **{column: row[column] for column in columns},
+                'hours': row['hours'],
+                'value': row['total_value'],
+            }
+            for row in rows
+        ],
+    }, request=request)
 
 def capacity_chart_data(request):
     """API endpoint for capacity chart data"""
-    return JsonResponse({'error': 'Not implemented yet'})
+    return FastJsonResponse({'error': 'Not implemented yet'})
 
 # Enhanced Dashboard Data API
 @login_required
 def dashboard_data(request):
     """API endpoint for dynamic dashboard data based on date range"""
     try:
-        company = Company.objects.first()
+        company = request.company
         if not company:
-            return JsonResponse({'error': 'No company found'}, status=404)
+            return FastJsonResponse({'error': 'No company found'}, status=404)
         
         # Get date range parameters
         start_date_str = request.GET.get('start_date')
@@ -830,7 +1019,7 @@ def dashboard_data(request):
         aggregation = request.GET.get('aggregation', 'monthly')
         
         if not start_date_str or not end_date_str:
-            return JsonResponse({'error': 'Start and end dates required'}, status=400)
+            return FastJsonResponse({'error': 'Start and end dates required'}, status=400)
         
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
@@ -838,10 +1027,10 @@ def dashboard_data(request):
         # Calculate metrics for the date range
         data = calculate_period_metrics(company, start_date, end_date, aggregation)
         
-        return JsonResponse(data)
+        return FastJsonResponse(data)
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 def calculate_period_metrics(company, start_date, end_date, aggregation='monthly'):
     """Calculate comprehensive metrics for a given period"""
@@ -1073,9 +1262,9 @@ def calculate_monthly_capacity(company, year, month):
 def dashboard_data_api(request):
     """API endpoint for dynamic dashboard data based on date range"""
     try:
-        company = Company.objects.first()
+        company = request.company
         if not company:
-            return JsonResponse({'error': 'No company found'}, status=404)
+            return FastJsonResponse({'error': 'No company found'}, status=404)
         
         # Get date range from request
         start_date = request.GET.get('start_date')
@@ -1083,7 +1272,7 @@ def dashboard_data_api(request):
         aggregation = request.GET.get('aggregation', 'monthly')
         
         if not start_date or not end_date:
-            return JsonResponse({'error': 'Missing date parameters'}, status=400)
+            return FastJsonResponse({'error': 'Missing date parameters'}, status=400)
         
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
@@ -1093,10 +1282,6 @@ def dashboard_data_api(request):
         costs_data = calculate_period_costs(company, start_date, end_date)
         capacity_data = calculate_period_capacity(company, start_date, end_date)
         
-        # Calculate profit
-        profit = revenue_data['total'] - costs_data['total']
-        profit_margin = (profit / revenue_data['total'] * 100) if revenue_data['total'] > 0 else 0
-        
         # Calculate average project value
         projects_in_period = Project.objects.filter(
             company=company,
@@ -1109,33 +1294,43 @@ def dashboard_data_api(request):
             total_value = projects_in_period.aggregate(Sum('total_revenue'))['total_revenue__sum'] or 0
             avg_project_value = float(total_value) / projects_in_period.count()
         
-        response_data = {
-            'revenue': float(revenue_data['total']),
-            'booked_revenue': float(revenue_data['booked']),
-            'forecast_revenue': float(revenue_data['forecast']),
-            'costs': float(costs_data['total']),
-            'payroll_costs': float(costs_data['payroll']),
-            'contractor_costs': float(costs_data['contractor']),
-            'other_costs': float(costs_data['other']),
-            'profit': float(profit),
-            'profit_margin': float(profit_margin),
-            'capacity': float(capacity_data['total_capacity']),
-            'allocated_hours': float(capacity_data['allocated_hours']),
-            'utilization_rate': float(capacity_data['utilization_rate']),
-            'avg_project_value': float(avg_project_value),
-            'period': {
-                'start': start_date.isoformat(),
-                'end': end_date.isoformat(),
-                'aggregation': aggregation
-            }
-        }
-        
-        return JsonResponse(response_data)
+        return FastJsonResponse(dashboard_data_payload(
+            start_date, end_date, aggregation, revenue_data, costs_data, capacity_data, avg_project_value
+        ), request=request)
         
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+
+def dashboard_data_payload(start_date, end_date, aggregation, revenue_data, costs_data, capacity_data,
+                           avg_project_value):
+    """dashboard_data_api's response from the calculate_period_* results"""
+    # Calculate profit
+    profit = revenue_data['total'] - costs_data['total']
+    profit_margin = (profit / revenue_data['total'] * 100) if revenue_data['total'] > 0 else 0
+    
+    return {
+        'revenue': float(revenue_data['total']),
+        'booked_revenue': float(revenue_data['booked']),
+        'forecast_revenue': float(revenue_data['forecast']),
+        'costs': float(costs_data['total']),
+        'payroll_costs': float(costs_data['payroll']),
+        'contractor_costs': float(costs_data['contractor']),
+        'other_costs': float(costs_data['other']),
+        'profit': float(profit),
+        'profit_margin': float(profit_margin),
+        'capacity': float(capacity_data['total_capacity']),
+        'allocated_hours': float(capacity_data['allocated_hours']),
+        'utilization_rate': float(capacity_data['utilization_rate']),
+        'avg_project_value': float(avg_project_value),
+        'period': {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'aggregation': aggregation
+        }
+    }
 
 
 def calculate_period_revenue(company, start_date, end_date):
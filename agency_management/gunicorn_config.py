@@ -1,3 +1,6 @@
+import os
+import shutil
+
 bind = "0.0.0.0:8000"
 workers = 3
 worker_class = "sync"
@@ -9,3 +12,17 @@ preload_app = True
 accesslog = "-"
 errorlog = "-"
 log_level = "info"
+
+# Workers share Prometheus metrics through per-process files (METRICS_DIR in
+# settings_production.py); keep this default in step with it
+metrics_dir = os.getenv("METRICS_DIR", "/tmp/agency-metrics")
+
+
+def on_starting(server):
+    # Samples of a previous server run would otherwise be summed in
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def child_exit(server, worker):
+    from agency.metrics import FileStore
+    FileStore(metrics_dir).mark_process_dead(worker.pid)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,20 +41,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'agency.middleware.SlowQueryMiddleware',
+    'agency.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'agency.middleware.CompanyMiddleware',
+    'agency.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'agency.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'agency_management.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'agency.perf.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],  
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,6 +87,40 @@ DATABASES = {
     }
 }
 
+# Read replica for the analytic views (agency.routers). The alias is not read until
+# REPLICA_DATABASE names it - settings_production does with DB_REPLICA_HOST set
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db.sqlite3',
+}
+REPLICA_DATABASE = None
+DATABASE_ROUTERS = ['agency.routers.ReplicaRouter']
+
+# Views whose GET requests read from the replica, by URL name
+REPLICA_VIEWS = [
+    'agency:dashboard',
+    'agency:admin_dashboard',
+    'agency:pm_dashboard',
+    'agency:employee_dashboard',
+    'agency:capacity_dashboard',
+    'agency:revenue_chart_data',
+    'agency:dashboard_data_api',
+    'agency:dashboard_data_api_async',
+    'agency:revenue_chart_data_async',
+    'agency:allocation_values',
+]
+# After a request writes, its session reads from the primary for this many seconds
+REPLICA_PIN_SECONDS = 15
+
+# Single-node deployments on SQLite: WAL, synchronous=NORMAL, mmap, cache and busy
+# timeout on every connection, and IMMEDIATE transactions where the app writes
+# (agency.sqlite), so concurrent allocation saves wait for each other instead of
+# failing with "database is locked"
+SQLITE_PERFORMANCE_MODE = os.getenv('SQLITE_PERFORMANCE_MODE', 'False') == 'True'
+if SQLITE_PERFORMANCE_MODE:
+    from agency.sqlite import performance_options
+    DATABASES['default']['OPTIONS'] = performance_options()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,7 +171,90 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Uploaded files (spreadsheets queued for import)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Authentication settings
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
+
+# Cache (hits and misses are counted per request by PerformanceMiddleware)
+CACHES = {
+    'default': {
+        'BACKEND': 'agency.perf.InstrumentedLocMemCache',
+    }
+}
+
+# Seconds each worker caches the company of a user (agency.middleware.CompanyMiddleware);
+# changes made in another process show up after this long
+COMPANY_CACHE_SECONDS = 300
+
+# JSON API responses (agency.responses.FastJsonResponse) this large or larger are
+# gzipped for clients that accept it
+JSON_GZIP_MIN_BYTES = 8192
+
+# Seconds a page of the dashboard user switcher's search results is cached
+USER_SEARCH_CACHE_SECONDS = 60
+
+# Seconds the dashboard's figures and rendered KPI fragments are cached (agency.fragments);
+# saves in the same cache show at once, changes made through another cache after this long
+DASHBOARD_CACHE_SECONDS = 300
+
+# Per-request performance instrumentation (agency.middleware.PerformanceMiddleware):
+# Server-Timing header plus one JSON line per request on the agency.perf logger
+PERF_INSTRUMENTATION = True
+
+# Most queries a view should run, by URL name; more logs a warning on agency.perf.
+# Counted with empty caches, as on a fresh worker. agency/tests/test_query_budgets.py
+# checks every entry (import_spreadsheet is the command) at two dataset sizes
+PERF_QUERY_BUDGETS = {
+    'agency:dashboard': 17,
+    'agency:pm_dashboard': 11,
+    'agency:employee_dashboard': 15,
+    'agency:revenue_chart_data': 31,
+    'agency:dashboard_data_api': 15,
+    'agency:allocation_values': 6,
+    'agency:user_search': 6,
+    'admin:agency_project_changelist': 11,
+    'admin:agency_project_get_allocation_data': 8,
+    'admin:agency_project_available_members': 8,
+    'admin:agency_project_auto_allocate': 7,
+    'admin:agency_project_save_allocations': 16,
+    'import_spreadsheet': 8,
+}
+
+# Staff can profile a request with ?_profile=1 (agency.middleware.ProfilingMiddleware);
+# reports are listed under Profile reports in the admin
+PROFILING_ENABLED = True
+
+# Statements slower than this many ms are stored with their EXPLAIN plan
+# (agency.middleware.SlowQueryMiddleware, agency.querylog; see manage.py slow_queries).
+# None turns capture off, independently of PERF_INSTRUMENTATION.
+SLOW_QUERY_MS = 200
+# Store EXPLAIN ANALYZE instead on PostgreSQL; runs each captured SELECT again
+SLOW_QUERY_ANALYZE = False
+
+# Prometheus metrics at /agency/api/metrics/ (agency.metrics). With several worker
+# processes set METRICS_DIR so every process shares samples through files there.
+METRICS_DIR = None
+# Scrapes must send "Authorization: Bearer <token>"; while unset only staff can read them
+METRICS_TOKEN = None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'agency.perf': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
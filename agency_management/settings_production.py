@@ -16,9 +16,66 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Each gunicorn worker keeps its connection for this many seconds instead of
+        # connecting for every request; 0 closes it after each request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Reused connections are checked before a request uses them, pooled ones as they leave the pool
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Or borrow a connection from a per-worker psycopg pool for each request (needs psycopg[pool]).
+# Size it so workers x DB_POOL_MAX_SIZE stays under the server's max_connections.
+if os.getenv('DB_POOL', 'False') == 'True':
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # The pool keeps connections open, not Django
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '4')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+
+# A streaming replica of the primary for the dashboards and reports (REPLICA_VIEWS);
+# same credentials and connection settings, other host. Tests mirror it onto the primary.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '15'))
+
+# gunicorn runs several workers - aggregate metrics through per-process files
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/agency-metrics')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Slow-query capture; EXPLAIN ANALYZE re-runs captured SELECTs, so it is opt-in
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_ANALYZE = os.getenv('SLOW_QUERY_ANALYZE', 'False') == 'True'
+
+# How stale another worker's view of a changed company or profile may get
+COMPANY_CACHE_SECONDS = int(os.getenv('COMPANY_CACHE_SECONDS', '300'))
+DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', '300'))
+
+# Parse each template once per worker, whatever DEBUG says - templates only change on deploy
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
@@ -33,6 +90,8 @@ if not DEBUG:
     SECURE_CONTENT_TYPE_NOSNIFF = True
     X_FRAME_OPTIONS = 'DENY'
 
-# Whitenoise for static files
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+# Whitenoise for static files, directly after SecurityMiddleware so static
+# responses still get the SSL redirect and security headers
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                  'whitenoise.middleware.WhiteNoiseMiddleware')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'